@@ -0,0 +1,254 @@
+# Constraint-aware package-to-truck assignment for WGUPS
+
+from collections import namedtuple
+
+from utils import str_to_minutes
+
+START_OF_DAY = str_to_minutes("08:00")
+
+# Extra miles charged per unit of deadline risk already on a truck, so tight
+# deadlines spread across the fleet instead of piling onto the closest truck
+DEADLINE_RISK_MILES = 1.5
+MAX_MEDOID_ITERATIONS = 50
+
+# Per-truck hard limits beyond package count: max_weight is total weight per
+# trip (None: no limit) over up to max_trips trips, and shift_end (minutes,
+# None: open-ended) is when the truck stops taking packages that arrive later
+TruckLimits = namedtuple('TruckLimits', ['max_weight', 'max_trips', 'shift_end'], defaults=(None, 1, None))
+
+
+class AssignmentUnit:
+    """
+    Packages that must travel together (a grouping component, or a single
+    package), with the constraints that apply to the unit as a whole.
+    """
+
+    __slots__ = ('package_ids', 'address_indices', 'allowed_trucks', 'available_time', 'deadline',
+                 'weight', 'heaviest')
+
+    def __init__(self, package_ids, address_indices, allowed_trucks, available_time, deadline,
+                 weight=0.0, heaviest=0.0):
+        self.package_ids = package_ids
+        self.address_indices = address_indices
+        self.allowed_trucks = allowed_trucks  # None means any truck
+        self.available_time = available_time  # minutes since midnight
+        self.deadline = deadline  # earliest member deadline in minutes, or None
+        self.weight = weight  # total weight of the members
+        self.heaviest = heaviest  # weight of the heaviest member
+
+    def fits(self, limits, weight_loaded=0.0):
+        """
+        True if the unit may go on a truck with TruckLimits limits (None: no
+        limits) that already carries weight_loaded: every member fits in one
+        trip, the day's weight stays within max_weight * max_trips and the
+        unit reaches the hub before the truck's shift ends
+        """
+        if limits is None:
+            return True
+        if limits.shift_end is not None and self.available_time >= limits.shift_end:
+            return False
+        if limits.max_weight is None:
+            return True
+        return (self.heaviest <= limits.max_weight
+                and weight_loaded + self.weight <= limits.max_weight * limits.max_trips)
+
+    def __len__(self):
+        return len(self.package_ids)
+
+    def risk(self):
+        """Deadline risk: 0 for end-of-day units, growing as the slack after availability shrinks"""
+        if self.deadline is None:
+            return 0.0
+        slack = max(self.deadline - self.available_time, 15)
+        return 60.0 / slack
+
+
+def grouping_components(packages, groups):
+    """
+    Return lists of package IDs that must be delivered together, via
+    union-find over groups (package_id -> IDs it must travel with)
+    """
+    parent = {}
+
+    def find(package_id):
+        parent.setdefault(package_id, package_id)
+        while parent[package_id] != package_id:
+            parent[package_id] = parent[parent[package_id]]
+            package_id = parent[package_id]
+        return package_id
+
+    ids = set()
+    for package in packages:
+        ids.add(package.id)
+        find(package.id)
+        for other_id in groups.get(package.id, ()):
+            parent[find(other_id)] = find(package.id)
+
+    components = {}
+    for package_id in sorted(parent):
+        if package_id in ids:
+            components.setdefault(find(package_id), []).append(package_id)
+    return sorted(components.values(), key=lambda component: component[0])
+
+
+def build_units(packages, address_index_of, rules, start_time=START_OF_DAY):
+    """
+    Collapse packages into AssignmentUnits, merging constraints from the
+    rules.RuleBook across each grouping component. Returns (units, undeliverable)
+    where undeliverable lists components that can never leave the hub.
+    """
+    by_id = {package.id: package for package in packages}
+    units = []
+    undeliverable = []
+    for component in grouping_components(packages, rules.groups):
+        members = [by_id[package_id] for package_id in component]
+        allowed = None
+        available_time = start_time
+        deadline = None
+        deliverable = True
+        weights = [float(package.weight or 0) for package in members]
+        for package in members:
+            restriction = rules.allowed_trucks(package.id)
+            if restriction is not None:
+                allowed = restriction if allowed is None else allowed & restriction
+            package_available = rules.available_time(package.id, start_time)
+            if package_available is None:
+                deliverable = False
+                break
+            available_time = max(available_time, package_available)
+            if package.due is not None:
+                deadline = package.due if deadline is None else min(deadline, package.due)
+        if not deliverable:
+            undeliverable.append(tuple(component))
+            continue
+        units.append(AssignmentUnit(tuple(component),
+                                    tuple(address_index_of(package) for package in members),
+                                    allowed, available_time, deadline, sum(weights), max(weights)))
+    return units, undeliverable
+
+
+def k_medoids(points, weights, distances, k, max_iterations=MAX_MEDOID_ITERATIONS):
+    """
+    Cluster address indices into k groups on the distance matrix.
+    Initial medoids are chosen deterministically (the most central point,
+    then repeatedly the point farthest from every chosen medoid), then
+    assignment and medoid updates alternate until nothing changes.
+    Returns (medoids, labels) where labels[i] is the cluster of points[i].
+    """
+    dist = distances.distance
+    k = min(k, len(points))
+    if k == 0:
+        return [], []
+
+    central = min(points, key=lambda p: sum(w * dist(p, q) for q, w in zip(points, weights)))
+    medoids = [central]
+    while len(medoids) < k:
+        medoids.append(max((p for p in points if p not in medoids),
+                           key=lambda p: min(dist(p, m) for m in medoids)))
+
+    labels = []
+    for _ in range(max_iterations):
+        labels = [min(range(k), key=lambda c: dist(p, medoids[c])) for p in points]
+        updated = []
+        for cluster in range(k):
+            members = [(p, w) for p, w, label in zip(points, weights, labels) if label == cluster]
+            if not members:
+                updated.append(medoids[cluster])
+                continue
+            updated.append(min((p for p, _ in members),
+                               key=lambda c: sum(w * dist(c, q) for q, w in members)))
+        if updated == medoids:
+            break
+        medoids = updated
+    return medoids, labels
+
+
+def _match_clusters_to_trucks(units, unit_clusters, truck_ids, k):
+    """
+    Pair clusters with trucks so clusters holding truck-restricted units go
+    to the truck they are restricted to. Returns {truck_id: cluster}.
+    """
+    demand = {}
+    for unit, cluster in zip(units, unit_clusters):
+        if unit.allowed_trucks is not None:
+            for truck_id in unit.allowed_trucks:
+                demand[(truck_id, cluster)] = demand.get((truck_id, cluster), 0) + len(unit)
+
+    mapping = {}
+    free_clusters = list(range(k))
+    for (truck_id, cluster), _ in sorted(demand.items(), key=lambda item: -item[1]):
+        if truck_id in truck_ids and truck_id not in mapping and cluster in free_clusters:
+            mapping[truck_id] = cluster
+            free_clusters.remove(cluster)
+    for truck_id in truck_ids:
+        if truck_id not in mapping and free_clusters:
+            mapping[truck_id] = free_clusters.pop(0)
+    return mapping
+
+
+def solve_assignment(packages, truck_ids, capacities, distances, address_index_of, rules, start_time=START_OF_DAY,
+                     limits=None):
+    """
+    Assign packages to trucks.
+
+    Packages are collapsed into grouping units, the units' addresses are
+    clustered with k-medoids (one cluster per truck), and units are then
+    placed most-constrained first on the feasible truck whose medoid is
+    closest, plus a penalty for deadline risk the truck already carries.
+    Capacity, grouping, truck restrictions and any TruckLimits (weight,
+    arrival before the shift ends) are hard constraints.
+
+    capacities maps truck_id -> max packages, limits optionally maps
+    truck_id -> TruckLimits and rules is a rules.RuleBook.
+    Returns (assignment, unassigned) where assignment maps truck_id ->
+    [package_ids] and unassigned lists tuples of package IDs that fit on no
+    truck or can never be delivered.
+    """
+    units, unassigned = build_units(packages, address_index_of, rules, start_time)
+    dist = distances.distance
+
+    # Cluster distinct addresses, weighted by how many packages go there
+    address_weights = {}
+    for unit in units:
+        for address_index in unit.address_indices:
+            address_weights[address_index] = address_weights.get(address_index, 0) + 1
+    points = sorted(address_weights)
+    medoids, labels = k_medoids(points, [address_weights[p] for p in points], distances, len(truck_ids))
+    point_cluster = dict(zip(points, labels))
+
+    # A unit belongs to the cluster most of its addresses fall in
+    unit_clusters = []
+    for unit in units:
+        votes = [point_cluster[a] for a in unit.address_indices]
+        unit_clusters.append(max(sorted(set(votes)), key=votes.count))
+    truck_cluster = _match_clusters_to_trucks(units, unit_clusters, truck_ids, len(medoids))
+
+    def unit_miles(unit, truck_id):
+        cluster = truck_cluster.get(truck_id)
+        if cluster is None:
+            return 0.0
+        medoid = medoids[cluster]
+        return sum(dist(a, medoid) for a in unit.address_indices) / len(unit)
+
+    limits = limits or {}
+    assignment = {truck_id: [] for truck_id in truck_ids}
+    risk = {truck_id: 0.0 for truck_id in truck_ids}
+    weight = {truck_id: 0.0 for truck_id in truck_ids}
+
+    # Most constrained first: restricted, then larger groups, then tighter deadlines
+    order = sorted(units, key=lambda u: (u.allowed_trucks is None, -len(u), -u.risk(), u.package_ids[0]))
+    for unit in order:
+        candidates = [truck_id for truck_id in truck_ids
+                      if (unit.allowed_trucks is None or truck_id in unit.allowed_trucks)
+                      and len(assignment[truck_id]) + len(unit) <= capacities[truck_id]
+                      and unit.fits(limits.get(truck_id), weight[truck_id])]
+        if not candidates:
+            unassigned.append(unit.package_ids)
+            continue
+        unit_risk = unit.risk()
+        best = min(candidates, key=lambda t: (unit_miles(unit, t) + DEADLINE_RISK_MILES * risk[t] * unit_risk,
+                                              truck_ids.index(t)))
+        assignment[best].extend(unit.package_ids)
+        risk[best] += unit_risk
+        weight[best] += unit.weight
+    return assignment, unassigned
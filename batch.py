@@ -0,0 +1,79 @@
+# Non-interactive bulk status lookups over a simulated day
+
+import csv
+import json
+import sys
+from collections import namedtuple
+
+from status import status_record
+from utils import minutes_to_str, parse_clock
+
+FORMATS = ('csv', 'jsonl')
+
+# time is minutes since midnight; line is the 1-based input line number
+StatusQuery = namedtuple('StatusQuery', ['time', 'package_id', 'line'])
+FIELDS = ('time', 'package_id', 'status', 'delivery_time', 'truck', 'address', 'city', 'zip_code', 'deadline')
+
+
+def parse_query(text):
+    """
+    Parse '9:15 AM,12', '9:15 AM 12' or a bare '9:15 AM' into
+    (minutes, package_id or None). Raises ValueError if it is neither.
+    """
+    text = text.strip()
+    if ',' in text:
+        clock, _, package = text.rpartition(',')
+        return parse_clock(clock), int(package)
+    head, _, last = text.rpartition(' ')
+    if head and last.isdigit():
+        return parse_clock(head), int(last)
+    return parse_clock(text), None
+
+
+def read_queries(stream, errors=sys.stderr):
+    """Yield StatusQuery records from lines of 'time,package_id'; bad lines are reported and skipped"""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        try:
+            query_time, package_id = parse_query(line)
+            if package_id is None:
+                raise ValueError("missing package ID")
+        except ValueError as error:
+            print(f"line {line_number}: skipped ({error}): {line.strip()!r}", file=errors)
+            continue
+        yield StatusQuery(query_time, package_id, line_number)
+
+
+def answer_queries(queries, package_table, timeline, rules):
+    """
+    Answer queries in time order with a single sweep of the timeline.
+    Yields one dict per query with FIELDS as keys; unknown package IDs get
+    status 'Not Found'. Queries at the same time keep their input order.
+    """
+    ordered = sorted(queries, key=lambda query: (query.time, query.line))
+    for query, event in timeline.sweep(ordered):
+        pkg = package_table.lookup(query.package_id)
+        if pkg is None:
+            yield dict.fromkeys(FIELDS, '') | {'time': minutes_to_str(query.time),
+                                               'package_id': query.package_id, 'status': 'Not Found'}
+            continue
+        yield status_record(pkg, event, timeline, rules, query.time)
+
+
+def write_results(rows, output, fmt='csv'):
+    """Stream result rows to output as CSV (with a header) or JSON Lines; returns the row count"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format: {fmt!r}")
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(output, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            output.write(json.dumps(row) + '\n')
+            count += 1
+    return count
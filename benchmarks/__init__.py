@@ -0,0 +1 @@
+# Benchmarks for the WGUPS routing program (run from the repository root)
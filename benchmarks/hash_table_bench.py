@@ -0,0 +1,63 @@
+# Lookup latency benchmark for the package hash table
+#
+# Usage: python -m benchmarks.hash_table_bench [sizes...]
+
+import random
+import sys
+import time
+
+from hash_table import HashTable
+
+DEFAULT_SIZES = [40, 10_000, 1_000_000]
+LOOKUPS = 200_000
+
+
+def _chained_table(size, buckets=40):
+    # The original fixed 40-bucket chained layout, for comparison
+    table = [[] for _ in range(buckets)]
+    for key in range(1, size + 1):
+        table[key % buckets].append((key, key))
+    return table
+
+
+def _chained_lookup(table, key):
+    for k, v in table[key % len(table)]:
+        if k == key:
+            return v
+    return None
+
+
+def bench_lookups(lookup, keys):
+    """Return mean nanoseconds per lookup over keys"""
+    start = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+
+def run(sizes=DEFAULT_SIZES, lookups=LOOKUPS, seed=0):
+    rng = random.Random(seed)
+    print(f"{'Packages':>10} {'Insert s':>10} {'Open ns':>10} {'Miss ns':>10} {'Chained ns':>11}")
+    for size in sizes:
+        start = time.perf_counter()
+        table = HashTable()
+        for key in range(1, size + 1):
+            table.insert(key, key)
+        insert_seconds = time.perf_counter() - start
+
+        hits = [rng.randint(1, size) for _ in range(lookups)]
+        misses = [size + rng.randint(1, size) for _ in range(lookups)]
+        open_ns = bench_lookups(table.lookup, hits)
+        miss_ns = bench_lookups(table.lookup, misses)
+
+        # Chained lookups are O(n / 40); only measure sizes that finish quickly
+        if size <= 10_000:
+            chained = _chained_table(size)
+            chained_ns = f"{bench_lookups(lambda key: _chained_lookup(chained, key), hits):11.0f}"
+        else:
+            chained_ns = f"{'skipped':>11}"
+        print(f"{size:>10} {insert_seconds:>10.3f} {open_ns:>10.0f} {miss_ns:>10.0f} {chained_ns}")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,119 @@
+# Concurrent load test for the status service
+#
+# Usage: python -m benchmarks.load_test [--start] [--host H] [--port P]
+#                                       [--clients N] [--requests N]
+#
+# --start launches service.py in a subprocess first; otherwise a running
+# service is expected at host:port.
+
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+
+from service import DEFAULT_HOST, DEFAULT_PORT
+
+DEFAULT_CLIENTS = 50
+DEFAULT_REQUESTS = 200
+STARTUP_SECONDS = 15
+
+
+def random_target(rng):
+    """A mix of dashboard reads, mostly single-package polls"""
+    clock = f"{rng.randint(8, 12)}:{rng.randint(0, 59):02d}%20{'AM' if rng.random() < 0.7 else 'PM'}"
+    roll = rng.random()
+    if roll < 0.7:
+        return f"/packages/{rng.randint(1, 40)}?time={clock}"
+    if roll < 0.85:
+        return f"/trucks/{rng.randint(1, 3)}?time={clock}"
+    if roll < 0.9:
+        return f"/packages?time={clock}"
+    if roll < 0.95:
+        return f"/snapshot?time={clock}"
+    return "/summary"
+
+
+async def client(host, port, requests, seed, latencies, failures):
+    """One keep-alive connection issuing requests back to back"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            target = random_target(rng)
+            start = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append((target, status))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def wait_for_service(host, port, timeout=STARTUP_SECONDS):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            await writer.wait_closed()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run(host, port, clients, requests):
+    await wait_for_service(host, port)
+    latencies = []
+    failures = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, requests, seed, latencies, failures) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:,.0f} req/s)")
+    print(f"latency ms: p50 {percentile(0.5):.2f}  p95 {percentile(0.95):.2f}  "
+          f"p99 {percentile(0.99):.2f}  max {latencies[-1] * 1000:.2f}")
+    for target, status in failures[:10]:
+        print(f"FAILED {status} {target}")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the WGUPS status service")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="requests per client")
+    parser.add_argument('--start', action='store_true', help="start service.py for the duration of the test")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.start:
+        server = subprocess.Popen([sys.executable, 'service.py', '--host', args.host, '--port', str(args.port)])
+    try:
+        return asyncio.run(run(args.host, args.port, args.clients, args.requests))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
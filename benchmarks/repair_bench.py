@@ -0,0 +1,78 @@
+# Repair latency benchmark for live re-routing events
+#
+# Usage: python -m benchmarks.repair_bench [events]
+
+import random
+import sys
+import time
+
+import main
+from dispatch import AddressChanged, ArrivalDelayed, LivePlanner, PackageAdded, TruckBrokeDown
+from fleet import FleetPlanner
+from loader import load_packages
+
+DEFAULT_EVENTS = 300
+
+
+def plan_day():
+    """Plan the real manifest once; returns (router, jobs, plans)"""
+    package_table = main.PackageHashTable()
+    load_packages(main.PACKAGE_FILE, package_table)
+    trucks = [main.Truck(1), main.Truck(2), main.Truck(3)]
+    router = main.RoutingEngine.from_csv(main.DISTANCE_FILE, main.ADDRESS_FILE, main.TRUCK_SPEED_MPH)
+    rules = main.RuleBook.from_packages(package_table, main.load_address_changes(main.ADDRESS_CHANGES_FILE))
+    main.assign_packages_to_trucks(package_table, trucks, router, rules)
+    jobs = main.build_truck_jobs(package_table, trucks, router, rules)
+    planner = FleetPlanner(router, workers=1, drivers=main.DRIVER_COUNT, reload_minutes=main.RELOAD_MINUTES)
+    start = time.perf_counter()
+    plans = planner.plan(jobs)
+    return router, jobs, plans, time.perf_counter() - start
+
+
+def random_events(count, package_ids, truck_ids, addresses, rng):
+    """A time-ordered stream of live events between 8:00 AM and 2:00 PM"""
+    times = sorted(rng.uniform(main.START_TIME, main.START_TIME + 360) for _ in range(count))
+    next_id = max(package_ids) + 1
+    events = []
+    for clock in times:
+        kind = rng.random()
+        if kind < 0.4:
+            events.append(AddressChanged(clock, rng.choice(package_ids), rng.randrange(1, addresses)))
+        elif kind < 0.8:
+            deadline = clock + rng.choice((120, 240)) if rng.random() < 0.3 else None
+            events.append(PackageAdded(clock, next_id, rng.randrange(1, addresses), clock, deadline))
+            package_ids.append(next_id)
+            next_id += 1
+        elif kind < 0.995:
+            events.append(ArrivalDelayed(clock, rng.choice(package_ids), clock + rng.uniform(15, 90)))
+        else:
+            events.append(TruckBrokeDown(clock, rng.choice(truck_ids)))
+    return events
+
+
+def run(count=DEFAULT_EVENTS, seed=0):
+    rng = random.Random(seed)
+    router, jobs, plans, replan_seconds = plan_day()
+    live = LivePlanner.from_plans(router, jobs, plans)
+    package_ids = sorted(live.package_truck)
+    events = random_events(count, package_ids, sorted(live.trips), router.distances.size, rng)
+
+    latencies = {}
+    unplaced = 0
+    for event in events:
+        result = live.apply(event)
+        latencies.setdefault(type(event).__name__, []).append(result.seconds * 1000)
+        unplaced += len(result.unplaced)
+
+    print(f"Full fleet replan: {replan_seconds * 1000:.1f} ms")
+    print(f"{'Event':<16} {'Count':>6} {'p50 ms':>8} {'p95 ms':>8} {'Max ms':>8}")
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        p50 = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{name:<16} {len(values):>6} {p50:>8.2f} {p95:>8.2f} {values[-1]:>8.2f}")
+    print(f"Planned miles after {len(events)} events: {live.total_miles():.1f} ({unplaced} unplaced)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS)
@@ -0,0 +1,209 @@
+# End-to-end scaling benchmarks on synthetic manifests, with stored baselines
+#
+# Usage: python -m benchmarks.suite [scenario ...] [--save-baseline] [--tolerance 0.25]
+#                                   [--mix deadline=0.3,...] [--queries N] [--memory-limit-mb N]
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is then not reported
+    resource = None
+
+from benchmarks.synthetic import DEFAULT_MIX, parse_mix, write_manifest
+
+Scenario = namedtuple('Scenario', ['name', 'packages', 'addresses'])
+SCENARIOS = {
+    'tiny': Scenario('tiny', 100, 50),
+    'small': Scenario('small', 1_000, 200),
+    'medium': Scenario('medium', 10_000, 1_000),
+    'large': Scenario('large', 100_000, 5_000),
+    'huge': Scenario('huge', 1_000_000, 50_000),
+}
+DEFAULT_SCENARIOS = ('tiny', 'small')
+PHASES = ('load', 'assignment', 'routing', 'queries')
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_TOLERANCE = 0.25
+# Millisecond phases jitter by more than the tolerance; ignore slowdowns below this
+NOISE_FLOOR_SECONDS = 0.01
+DEFAULT_QUERIES = 10_000
+# The packed float32 matrix needs about 2 * n^2 bytes; larger scenarios are skipped
+DEFAULT_MEMORY_LIMIT_MB = 2048
+PACKAGES_PER_TRUCK_DAY = 48
+
+
+def matrix_megabytes(addresses):
+    return 4 * addresses * (addresses + 1) / 2 / 2**20
+
+
+def run_scenario(scenario, mix=DEFAULT_MIX, queries=DEFAULT_QUERIES, seed=0):
+    """
+    Generate a manifest and time each phase of a day on it. Runs in a fresh
+    process (see measure) so peak memory belongs to this scenario alone.
+    Returns {'phases': {phase: seconds}, 'throughput': {...}, 'peak_mb': ...}.
+    """
+    import main
+    from distance import load_address_indices
+    from fleet import FleetPlanner
+    from loader import load_packages
+    from routing import RoutingEngine
+    from status import package_status_at_time
+
+    trucks_needed = max(3, math.ceil(scenario.packages / PACKAGES_PER_TRUCK_DAY))
+    phases = {}
+    throughput = {}
+    with tempfile.TemporaryDirectory() as directory:
+        matrix, paths = write_manifest(directory, scenario.packages, scenario.addresses, trucks_needed,
+                                       mix, seed, with_distances=False)
+        router = RoutingEngine(matrix, load_address_indices(paths['addresses']), main.TRUCK_SPEED_MPH)
+
+        table = main.PackageHashTable()
+        start = time.perf_counter()
+        load_packages(paths['packages'], table)
+        phases['load'] = time.perf_counter() - start
+        throughput['load rows/s'] = scenario.packages / phases['load']
+
+        rules = main.RuleBook.from_packages(table, main.load_address_changes(paths['corrections']))
+        trucks = [main.Truck(truck_id) for truck_id in range(1, trucks_needed + 1)]
+
+        # The CLI helpers print warnings per unassigned package to stderr; keep them out of the report
+        with contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            main.assign_packages_to_trucks(table, trucks, router, rules)
+            phases['assignment'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            timeline = main.simulate_delivery(table, trucks, router, rules, FleetPlanner(router))
+            phases['routing'] = time.perf_counter() - start
+        delivered = sum(1 for package in table if timeline.delivery_time(package.id) is not None)
+        throughput['routed packages/s'] = delivered / phases['routing']
+
+        rng = random.Random(seed)
+        package_ids = [package.id for package in table]
+        probes = [(table.lookup(rng.choice(package_ids)), rng.uniform(main.START_TIME, main.START_TIME + 600))
+                  for _ in range(queries)]
+        start = time.perf_counter()
+        for package, query_time in probes:
+            package_status_at_time(package, timeline, rules, query_time)
+        phases['queries'] = time.perf_counter() - start
+        throughput['queries/s'] = queries / phases['queries']
+
+    peak_mb = None
+    if resource is not None:
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        scale = 2**20 if sys.platform == 'darwin' else 2**10
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return {'phases': phases, 'throughput': throughput, 'peak_mb': peak_mb,
+            'trucks': trucks_needed, 'delivered': delivered}
+
+
+def measure(scenario, mix=DEFAULT_MIX, queries=DEFAULT_QUERIES, seed=0):
+    """run_scenario in a spawned process so each scenario's peak memory is its own"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_scenario, (scenario, mix, queries, seed))
+
+
+def load_baselines(path=BASELINE_FILE):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    baselines = load_baselines(path)
+    for name, result in results.items():
+        baselines[name] = result['phases']
+    with open(path, 'w') as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def regressions(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    """
+    (scenario, phase, baseline seconds, seconds) for every phase slower than
+    baseline * (1 + tolerance) by more than the noise floor
+    """
+    slower = []
+    for name, result in results.items():
+        for phase, seconds in result['phases'].items():
+            baseline = baselines.get(name, {}).get(phase)
+            if baseline is not None and seconds > baseline * (1 + tolerance) + NOISE_FLOOR_SECONDS:
+                slower.append((name, phase, baseline, seconds))
+    return slower
+
+
+def print_report(results, baselines):
+    print(f"{'Scenario':<8} {'Packages':>9} {'Addrs':>6} {'Trucks':>6} "
+          + " ".join(f"{phase + ' s':>12}" for phase in PHASES) + f" {'Peak MB':>8}")
+    for name, result in results.items():
+        scenario = SCENARIOS[name]
+        cells = []
+        for phase in PHASES:
+            seconds = result['phases'][phase]
+            baseline = baselines.get(name, {}).get(phase)
+            change = f"{(seconds / baseline - 1) * 100:+.0f}%" if baseline else ""
+            cells.append(f"{seconds:>7.3f}{change:>5}")
+        peak = f"{result['peak_mb']:>8.0f}" if result['peak_mb'] is not None else f"{'n/a':>8}"
+        print(f"{name:<8} {scenario.packages:>9} {scenario.addresses:>6} {result['trucks']:>6} "
+              + " ".join(cells) + f" {peak}")
+    print()
+    for name, result in results.items():
+        rates = ", ".join(f"{value:,.0f} {unit}" for unit, value in result['throughput'].items())
+        print(f"{name:<8} {rates}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark WGUPS planning on synthetic manifests")
+    parser.add_argument('scenarios', nargs='*', default=list(DEFAULT_SCENARIOS),
+                        help=f"any of {', '.join(SCENARIOS)} (default: {' '.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save-baseline', action='store_true', help="record these timings as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="fractional slowdown that counts as a regression")
+    parser.add_argument('--memory-limit-mb', type=float, default=DEFAULT_MEMORY_LIMIT_MB)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}'")
+        scenario = SCENARIOS[name]
+        needed = matrix_megabytes(scenario.addresses)
+        if needed > args.memory_limit_mb:
+            print(f"Skipping {name}: distance matrix needs {needed:,.0f} MB "
+                  f"(limit {args.memory_limit_mb:,.0f} MB; raise --memory-limit-mb)")
+            continue
+        results[name] = measure(scenario, args.mix, args.queries, args.seed)
+
+    baselines = load_baselines()
+    print_report(results, baselines)
+    if args.save_baseline:
+        save_baselines(results)
+        print(f"\nSaved baseline to {BASELINE_FILE}")
+        return 0
+
+    slower = regressions(results, baselines, args.tolerance)
+    for name, phase, baseline, seconds in slower:
+        print(f"REGRESSION {name} {phase}: {seconds:.3f}s vs baseline {baseline:.3f}s")
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# Reproducible synthetic manifests and distance matrices for benchmarking
+#
+# Usage: python -m benchmarks.synthetic PACKAGES ADDRESSES OUT_DIR [--seed N] [--trucks N]
+
+import argparse
+import csv
+import math
+import os
+import random
+from array import array
+from collections import namedtuple
+
+from distance import DistanceMatrix
+
+# Fraction of packages carrying each kind of special handling
+ConstraintMix = namedtuple('ConstraintMix', ['deadline', 'early_deadline', 'delayed', 'truck_only',
+                                             'grouped', 'wrong_address'],
+                           defaults=(0.25, 0.05, 0.1, 0.05, 0.05, 0.01))
+DEFAULT_MIX = ConstraintMix()
+
+# Addresses are scattered over a square service area around the hub; road
+# distance is the straight line times a detour factor, to 0.1 mile like the real table
+SERVICE_AREA_MILES = 12.0
+ROAD_FACTOR = 1.3
+GROUP_SIZE = 3
+FLIGHT_ARRIVAL = "9:05 am"
+CORRECTION_TIME = "10:20 AM"
+CITY = "Salt Lake City"
+STATE = "UT"
+ZIP_CODE = "84111"
+
+
+def parse_mix(text):
+    """Parse 'deadline=0.3,delayed=0.2' into a ConstraintMix over the defaults"""
+    values = DEFAULT_MIX._asdict()
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        key, _, value = item.partition('=')
+        if key not in values:
+            raise ValueError(f"Unknown constraint '{key}'; expected one of {', '.join(values)}")
+        values[key] = float(value)
+    return ConstraintMix(**values)
+
+
+def street_address(index):
+    return f"{index} Synthetic Way" if index else "4001 South 700 East"
+
+
+def synthetic_coordinates(addresses, rng):
+    """(x, y) miles for each address; index 0 is the hub at the center"""
+    half = SERVICE_AREA_MILES / 2
+    return [(0.0, 0.0)] + [(rng.uniform(-half, half), rng.uniform(-half, half)) for _ in range(addresses - 1)]
+
+
+def synthetic_matrix(coordinates):
+    """Build a packed DistanceMatrix directly from coordinates (no CSV round trip)"""
+    packed = array('f')
+    for i, (xi, yi) in enumerate(coordinates):
+        packed.extend(round(math.hypot(xi - xj, yi - yj) * ROAD_FACTOR, 1)
+                      for xj, yj in coordinates[:i + 1])
+    return DistanceMatrix(len(coordinates), packed)
+
+
+def synthetic_rows(packages, addresses, trucks, mix=DEFAULT_MIX, rng=None):
+    """
+    Manifest rows in the csv/packages.csv layout plus address corrections
+    for the wrong-address packages. Returns (rows, corrections).
+    """
+    rng = rng or random.Random(0)
+    rows = []
+    corrections = []
+    # Cumulative thresholds: one random draw picks at most one note per package
+    delayed_below = mix.delayed
+    truck_below = delayed_below + mix.truck_only
+    grouped_below = truck_below + mix.grouped
+    wrong_below = grouped_below + mix.wrong_address
+    for package_id in range(1, packages + 1):
+        address = rng.randrange(1, addresses)
+        roll = rng.random()
+        deadline = "EOD"
+        if roll < mix.early_deadline:
+            deadline = "9:00 AM"
+        elif roll < mix.early_deadline + mix.deadline:
+            deadline = "10:30 AM"
+
+        note = ""
+        roll = rng.random()
+        if roll < delayed_below:
+            note = f"Delayed on flight---will not arrive to depot until {FLIGHT_ARRIVAL}"
+        elif roll < truck_below:
+            note = f"Can only be on truck {rng.randint(1, trucks)}"
+        elif roll < grouped_below:
+            if package_id + GROUP_SIZE - 1 <= packages:
+                others = [package_id + offset for offset in range(1, GROUP_SIZE)]
+                note = "Must be delivered with " + ", ".join(str(other) for other in others)
+        elif roll < wrong_below:
+            note = "Wrong address listed"
+            corrections.append([str(package_id), CORRECTION_TIME, street_address(rng.randrange(1, addresses)),
+                                CITY, ZIP_CODE])
+
+        rows.append([str(package_id), street_address(address), CITY, STATE, ZIP_CODE, deadline,
+                     str(rng.randint(1, 88)), note])
+    return rows, corrections
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as file:
+        csv.writer(file).writerows(rows)
+
+
+def write_distance_csv(path, matrix):
+    """Write a lower-triangular distance CSV readable by DistanceMatrix.from_csv"""
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        for i in range(matrix.size):
+            writer.writerow([f"{matrix.distance(i, j):.1f}" for j in range(i + 1)])
+
+
+def write_manifest(directory, packages, addresses, trucks, mix=DEFAULT_MIX, seed=0, with_distances=True):
+    """
+    Write packages.csv, address_corrections.csv, Address_File.csv and
+    (optionally) Distance_File.csv into directory. Returns the DistanceMatrix
+    and a dict of the file paths.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    coordinates = synthetic_coordinates(addresses, rng)
+    matrix = synthetic_matrix(coordinates)
+    rows, corrections = synthetic_rows(packages, addresses, trucks, mix, rng)
+
+    paths = {
+        'packages': os.path.join(directory, 'packages.csv'),
+        'corrections': os.path.join(directory, 'address_corrections.csv'),
+        'addresses': os.path.join(directory, 'Address_File.csv'),
+        'distances': os.path.join(directory, 'Distance_File.csv'),
+    }
+    write_csv(paths['packages'], rows)
+    write_csv(paths['corrections'], corrections)
+    write_csv(paths['addresses'], [[str(i), f"Stop {i}", street_address(i)] for i in range(addresses)])
+    if with_distances:
+        write_distance_csv(paths['distances'], matrix)
+    return matrix, paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic WGUPS manifest")
+    parser.add_argument('packages', type=int)
+    parser.add_argument('addresses', type=int)
+    parser.add_argument('out_dir')
+    parser.add_argument('--trucks', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="constraint fractions, e.g. 'deadline=0.3,delayed=0.1'")
+    args = parser.parse_args(argv)
+    _, paths = write_manifest(args.out_dir, args.packages, args.addresses, args.trucks, args.mix, args.seed)
+    for name, path in paths.items():
+        print(f"{name:<12} {path}")
+
+
+if __name__ == "__main__":
+    main()
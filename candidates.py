@@ -0,0 +1,45 @@
+# k-nearest-neighbor candidate lists for routing decisions
+
+import heapq
+
+DEFAULT_CANDIDATES = 10
+
+
+class CandidateIndex:
+    """
+    For every address, its k nearest other addresses presorted by distance
+    (ties by index), built once from a DistanceMatrix. Routing decisions
+    that only need "the closest eligible address" or "addresses worth
+    connecting to" scan these short lists instead of every stop, cutting
+    each decision from O(n) to about O(k).
+    """
+
+    def __init__(self, matrix, k=DEFAULT_CANDIDATES):
+        self.matrix = matrix
+        self.k = max(0, min(k, matrix.size - 1))
+        everyone = range(matrix.size)
+        neighbors = []
+        for origin in everyone:
+            row = matrix.distances_from(origin, everyone)
+            # nsmallest is stable, so equal distances stay in index order
+            nearest = heapq.nsmallest(self.k + 1, everyone, key=row.__getitem__)
+            neighbors.append(tuple(index for index in nearest if index != origin)[:self.k])
+        self._neighbors = neighbors
+
+    def neighbors(self, origin):
+        """The k nearest addresses to origin, closest first"""
+        return self._neighbors[origin]
+
+    def nearest(self, origin, members):
+        """
+        Return (index, distance) of the member address closest to origin,
+        where members is a set (or dict) of address indices. Falls back to a
+        full scan only when none of origin's candidates is a member.
+        Returns (None, None) if members is empty.
+        """
+        if origin in members:
+            return origin, 0.0
+        for index in self._neighbors[origin]:
+            if index in members:
+                return index, self.matrix.distance(origin, index)
+        return self.matrix.nearest(origin, sorted(members))
@@ -0,0 +1,155 @@
+# Multi-depot fleet configuration and manifest partitioning
+
+import json
+from collections import namedtuple
+
+from assignment import TruckLimits, build_units, solve_assignment
+from utils import parse_clock
+
+# drivers caps how many of the depot's trucks are on the road at once (None: one per truck)
+Depot = namedtuple('Depot', ['depot_id', 'address', 'drivers'])
+# capacity is packages per trip and max_weight is total weight per trip (None: no limit);
+# shift_start and shift_end are minutes since midnight (shift_end None: open-ended)
+TruckSpec = namedtuple('TruckSpec', ['truck_id', 'depot_id', 'capacity', 'max_trips', 'speed_mph',
+                                     'max_weight', 'shift_start', 'shift_end'])
+FleetConfig = namedtuple('FleetConfig', ['depots', 'trucks'])
+# One depot's planning subproblem: hub is its address index, capacities
+# maps each of its truck IDs -> packages the truck can carry over the day and
+# limits maps truck IDs -> assignment.TruckLimits (None: counts only)
+DepotFleet = namedtuple('DepotFleet', ['depot_id', 'hub', 'capacities', 'limits'], defaults=(None,))
+
+TRUCK_FIELDS = {'capacity', 'max_trips', 'speed_mph', 'max_weight', 'shift_start', 'shift_end'}
+
+
+def _clock(value):
+    """Shift times may be given as '8:00 AM' / '17:30' or as minutes since midnight"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return parse_clock(value)
+
+
+def depot_fleets(trucks):
+    """
+    Group trucks (anything with the TruckSpec fields plus hub) into a
+    DepotFleet per depot, in first-seen order
+    """
+    fleets = {}
+    for truck in trucks:
+        fleet = fleets.setdefault(truck.depot_id, DepotFleet(truck.depot_id, truck.hub, {}, {}))
+        fleet.capacities[truck.truck_id] = truck.capacity * truck.max_trips
+        fleet.limits[truck.truck_id] = TruckLimits(truck.max_weight, truck.max_trips, truck.shift_end)
+    return list(fleets.values())
+
+
+def load_fleet_config(path, defaults):
+    """
+    Load depots and trucks from a JSON file of the form
+
+        {"depots": [{"id": "SLC", "address": "4001 South 700 East", "drivers": 2}],
+         "trucks": [{"id": 1, "depot": "SLC", "capacity": 16, "speed_mph": 18,
+                     "max_weight": 400, "shift_start": "8:00 AM", "shift_end": "5:00 PM"}]}
+
+    defaults is a TruckSpec supplying any per-truck field a truck omits.
+    Raises ValueError for unknown depots, duplicate IDs, unknown fields or
+    a driver count that is not a whole number of at least one.
+    """
+    with open(path) as file:
+        data = json.load(file)
+
+    depots = []
+    for entry in data.get('depots', ()):
+        drivers = entry.get('drivers')
+        if drivers is not None and (isinstance(drivers, bool) or not isinstance(drivers, int) or drivers < 1):
+            raise ValueError(f"{path}: depot {entry['id']} needs at least one driver, not {drivers!r}")
+        depots.append(Depot(str(entry['id']), entry['address'].strip(), drivers))
+    depot_ids = [depot.depot_id for depot in depots]
+    if not depots:
+        raise ValueError(f"{path}: no depots configured")
+    if len(set(depot_ids)) != len(depot_ids):
+        raise ValueError(f"{path}: duplicate depot IDs")
+
+    trucks = []
+    for entry in data.get('trucks', ()):
+        unknown = set(entry) - TRUCK_FIELDS - {'id', 'depot'}
+        if unknown:
+            raise ValueError(f"{path}: unknown truck fields {', '.join(sorted(unknown))}")
+        depot_id = str(entry.get('depot', depot_ids[0]))
+        if depot_id not in depot_ids:
+            raise ValueError(f"{path}: truck {entry['id']} references unknown depot {depot_id!r}")
+        fields = {name: entry.get(name, getattr(defaults, name)) for name in TRUCK_FIELDS}
+        fields['shift_start'] = _clock(fields['shift_start'])
+        fields['shift_end'] = _clock(fields['shift_end'])
+        trucks.append(TruckSpec(truck_id=int(entry['id']), depot_id=depot_id, **fields))
+    truck_ids = [truck.truck_id for truck in trucks]
+    if len(set(truck_ids)) != len(truck_ids):
+        raise ValueError(f"{path}: duplicate truck IDs")
+    return FleetConfig(depots, trucks)
+
+
+def partition_by_depot(packages, fleets, distances, address_index_of, rules, start_time):
+    """
+    Split the manifest across depots before routing. Grouping units stay
+    whole; each goes to the closest depot (mean miles from the depot to the
+    unit's addresses) that has a truck it may ride on (restrictions, weight
+    and shift end) and room left.
+    Units are placed truck-restricted first, then by regret (how much
+    farther their second-best depot is), so the units that lose most by
+    moving keep their nearest depot when space is short.
+
+    fleets is a list of DepotFleet. Returns (packages_by_depot, unassigned)
+    where packages_by_depot maps depot_id -> [Package] and unassigned lists
+    tuples of package IDs that fit no depot or can never be delivered.
+    """
+    units, unassigned = build_units(packages, address_index_of, rules, start_time)
+    dist = distances.distance
+    room = {fleet.depot_id: sum(fleet.capacities.values()) for fleet in fleets}
+
+    def eligible(unit, fleet):
+        limits = fleet.limits or {}
+        return any((unit.allowed_trucks is None or truck_id in unit.allowed_trucks)
+                   and unit.fits(limits.get(truck_id))
+                   for truck_id in fleet.capacities)
+
+    def miles(unit, fleet):
+        return sum(dist(fleet.hub, a) for a in unit.address_indices) / len(unit)
+
+    def regret(unit):
+        costs = sorted(miles(unit, fleet) for fleet in fleets if eligible(unit, fleet))
+        return costs[1] - costs[0] if len(costs) > 1 else float('inf')
+
+    chosen = {fleet.depot_id: [] for fleet in fleets}
+    order = sorted(units, key=lambda u: (u.allowed_trucks is None, -regret(u), u.package_ids[0]))
+    for unit in order:
+        candidates = [(miles(unit, fleet), position, fleet.depot_id) for position, fleet in enumerate(fleets)
+                      if eligible(unit, fleet) and len(unit) <= room[fleet.depot_id]]
+        if not candidates:
+            unassigned.append(unit.package_ids)
+            continue
+        depot_id = min(candidates)[2]
+        chosen[depot_id].extend(unit.package_ids)
+        room[depot_id] -= len(unit)
+
+    by_id = {package.id: package for package in packages}
+    return {depot_id: [by_id[package_id] for package_id in sorted(ids)] for depot_id, ids in chosen.items()}, unassigned
+
+
+def assign_fleet(packages, fleets, distances, address_index_of, rules, start_time):
+    """
+    Partition packages across depots, then assign each depot's share to
+    its own trucks with assignment.solve_assignment. Depot subproblems
+    share nothing after the split, so they are solved independently.
+    Returns (assignment, unassigned) like solve_assignment.
+    """
+    if len(fleets) == 1:
+        # Nothing to split; solve_assignment reports undeliverable packages itself
+        by_depot, unassigned = {fleets[0].depot_id: list(packages)}, []
+    else:
+        by_depot, unassigned = partition_by_depot(packages, fleets, distances, address_index_of, rules, start_time)
+    assignment = {}
+    for fleet in fleets:
+        depot_assignment, depot_unassigned = solve_assignment(
+            by_depot[fleet.depot_id], list(fleet.capacities), fleet.capacities,
+            distances, address_index_of, rules, start_time, fleet.limits)
+        assignment.update(depot_assignment)
+        unassigned.extend(depot_unassigned)
+    return assignment, unassigned
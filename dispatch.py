@@ -0,0 +1,470 @@
+# Incremental re-routing for events that arrive during the delivery day
+
+import time
+from collections import namedtuple
+
+from scheduler import DEFAULT_RELOAD_MINUTES, LATENESS_MILES_PER_MINUTE, Trip
+from time_windows import RouteSchedule
+from timeline import DeliveryTimeline
+
+# Live events. Times are minutes since midnight; deadline None means end of day.
+AddressChanged = namedtuple('AddressChanged', ['time', 'package_id', 'address_index'])
+PackageAdded = namedtuple('PackageAdded', ['time', 'package_id', 'address_index', 'available_time', 'deadline'])
+ArrivalDelayed = namedtuple('ArrivalDelayed', ['time', 'package_id', 'available_time'])
+TruckBrokeDown = namedtuple('TruckBrokeDown', ['time', 'truck_id'])
+
+# Outcome of one repair: trucks whose plans changed, wall-clock seconds the
+# repair took, change in planned miles, and package IDs that could not be placed
+RepairResult = namedtuple('RepairResult', ['event', 'trucks', 'seconds', 'miles_delta', 'unplaced'])
+
+
+class LivePlanner:
+    """
+    Keeps the day's plan (every truck's trips) and repairs it in place as
+    events arrive. A repair only touches what the event affects: the package
+    is removed from its current trip and re-inserted at the cheapest
+    position (miles plus lateness) on a trip that can still take it, and the
+    changed truck's later trips are re-timed. Stops a truck has already
+    made, and the load of a trip already on the road, are never changed.
+
+    Driver limits are applied when the day is planned; a repair keeps each
+    trip's departure slot and only pushes it later when its truck or its
+    packages are late getting back to the hub.
+
+    capacity is packages per trip, either one number for every truck or a
+    dict by truck ID. routers maps a truck ID to the RoutingEngine for its
+    depot and speed (trucks not in it use router), max_weights maps a truck
+    ID to its per-trip weight limit and weights maps a package ID to its
+    weight; a repair never loads a trip past either limit.
+
+    allowed maps a restricted package ID to the truck IDs it may ride on,
+    and groups maps a package ID to its co-delivery group key. A package is
+    never moved onto a truck it may not ride on, and a moved package takes
+    its group mates still waiting at the hub along as one unit.
+    """
+
+    def __init__(self, router, truck_trips, deadlines, available, capacity,
+                 reload_minutes=DEFAULT_RELOAD_MINUTES, routers=None, max_weights=None, weights=None,
+                 allowed=None, groups=None):
+        self.router = router
+        self.routers = dict(routers or {})
+        self.trips = {truck_id: list(trips) for truck_id, trips in truck_trips.items()}
+        self.deadlines = dict(deadlines)  # package_id -> minutes
+        self.available = dict(available)  # package_id -> minutes it reaches the hub
+        self.capacity = capacity
+        self.max_weights = {truck_id: limit for truck_id, limit in (max_weights or {}).items()
+                            if limit is not None}
+        self.weights = dict(weights or {})  # package_id -> weight
+        self.allowed = dict(allowed or {})  # package_id -> truck IDs it may ride on
+        self.groups = dict(groups or {})  # package_id -> co-delivery group key
+        self.group_members = {}
+        for package_id, group in self.groups.items():
+            self.group_members.setdefault(group, []).append(package_id)
+        self.reload_minutes = reload_minutes
+        self.out_of_service = set()
+        self.package_truck = {package_id: truck_id
+                              for truck_id, trips in self.trips.items()
+                              for trip in trips for package_id, _ in trip.route}
+        self.miles = {truck_id: self._truck_miles(truck_id) for truck_id in self.trips}
+
+    @classmethod
+    def from_plans(cls, router, jobs, plans):
+        """Build from the fleet.TruckJobs and fleet.TruckPlans of a planned day"""
+        deadlines = {}
+        available = {}
+        weights = {}
+        allowed = {}
+        groups = {}
+        for job in jobs:
+            deadlines.update(job.deadlines)
+            available.update((stop.package_id, stop.available_time) for stop in job.stops)
+            weights.update((stop.package_id, stop.weight) for stop in job.stops)
+            groups.update((stop.package_id, stop.group) for stop in job.stops if stop.group is not None)
+            allowed.update(job.allowed_trucks or {})
+        reload_times = {job.reload_minutes for job in jobs}
+        if len(reload_times) > 1:
+            raise ValueError(f"Trucks reload in different times {sorted(reload_times)}; "
+                             f"a live plan needs one reload time")
+        reload_minutes = reload_times.pop() if reload_times else DEFAULT_RELOAD_MINUTES
+        return cls(router, {plan.truck_id: plan.trips for plan in plans}, deadlines, available,
+                   {job.truck_id: job.capacity for job in jobs}, reload_minutes,
+                   routers={job.truck_id: router.variant(job.hub, job.speed_mph) for job in jobs},
+                   max_weights={job.truck_id: job.max_weight for job in jobs}, weights=weights,
+                   allowed=allowed, groups=groups)
+
+    # --- PLAN QUERIES ---
+
+    def _router(self, truck_id):
+        return self.routers.get(truck_id, self.router)
+
+    def _capacity(self, truck_id):
+        if isinstance(self.capacity, dict):
+            return self.capacity.get(truck_id, 0)
+        return self.capacity
+
+    def _weight(self, route):
+        return sum(self.weights.get(package_id, 0.0) for package_id, _ in route)
+
+    def _fits(self, truck_id, route, stops):
+        """Whether route can take stops within the truck's count and weight limits"""
+        if len(route) + len(stops) > self._capacity(truck_id):
+            return False
+        limit = self.max_weights.get(truck_id)
+        return limit is None or self._weight(route) + self._weight(stops) <= limit
+
+    def _can_ride(self, package_id, truck_id):
+        allowed = self.allowed.get(package_id)
+        return allowed is None or truck_id in allowed
+
+    def _truck_miles(self, truck_id):
+        router = self._router(truck_id)
+        return sum(router.route_miles(trip.route) for trip in self.trips[truck_id])
+
+    def total_miles(self):
+        return sum(self._truck_miles(truck_id) for truck_id in self.trips)
+
+    def timeline(self):
+        """Drive the current plan and return its DeliveryTimeline"""
+        events = []
+        for truck_id, trips in self.trips.items():
+            for trip in trips:
+                events.extend(self._router(truck_id).drive(truck_id, trip.departure_time, trip.route)[0])
+        return DeliveryTimeline(events)
+
+    def _arrivals(self, truck_id, trip):
+        """Arrival time at each stop of a trip"""
+        router = self._router(truck_id)
+        dist = router.distances.distance
+        clock = trip.departure_time
+        current = router.hub
+        arrivals = []
+        for _, address_index in trip.route:
+            clock += router.travel_time(dist(current, address_index))
+            current = address_index
+            arrivals.append(clock)
+        return arrivals
+
+    def _locked(self, truck_id, trip, now):
+        """Number of leading stops already made by now, or None if the trip has not left"""
+        if trip.departure_time > now:
+            return None
+        return sum(1 for arrival in self._arrivals(truck_id, trip) if arrival <= now)
+
+    def _find(self, package_id):
+        """(truck_id, trip index, stop index) of a planned package, or None"""
+        truck_id = self.package_truck.get(package_id)
+        if truck_id is None:
+            return None
+        for trip_index, trip in enumerate(self.trips[truck_id]):
+            for stop_index, (planned_id, _) in enumerate(trip.route):
+                if planned_id == package_id:
+                    return truck_id, trip_index, stop_index
+        return None
+
+    # --- LOCAL REPAIR ---
+
+    def _lateness(self, router, departure_time, route):
+        dist = router.distances.distance
+        clock = departure_time
+        current = router.hub
+        late = 0.0
+        for package_id, address_index in route:
+            clock += router.travel_time(dist(current, address_index))
+            current = address_index
+            deadline = self.deadlines.get(package_id)
+            if deadline is not None and clock > deadline:
+                late += clock - deadline
+        return late
+
+    def _schedule(self, truck_id, departure_time, route):
+        return RouteSchedule(self._router(truck_id), departure_time, route, self.deadlines)
+
+    def _insertion_cost(self, schedule, position, stop):
+        """
+        Added miles plus weighted added lateness of inserting stop before
+        route[position]. Insertions the schedule shows keep every deadline
+        add no lateness; only the others re-drive the candidate route.
+        """
+        router = schedule.router
+        dist = router.distances.distance
+        route = schedule.route
+        before = route[position - 1][1] if position else router.hub
+        after = route[position][1] if position < len(route) else router.hub
+        miles = dist(before, stop[1]) + dist(stop[1], after) - dist(before, after)
+        if schedule.can_insert(position, stop[1], self.deadlines.get(stop[0])):
+            return miles
+        departure_time = schedule.departure_time
+        candidate = route[:position] + [stop] + route[position:]
+        late = self._lateness(router, departure_time, candidate) - self._lateness(router, departure_time, route)
+        return miles + LATENESS_MILES_PER_MINUTE * late
+
+    def _retime(self, truck_id, first):
+        """Recompute return times from trip first on, pushing later departures back if needed"""
+        router = self._router(truck_id)
+        trips = self.trips[truck_id]
+        for index in range(first, len(trips)):
+            trip = trips[index]
+            departure_time = trip.departure_time
+            if index > first:
+                previous = trips[index - 1]
+                departure_time = max(departure_time, previous.return_time + self.reload_minutes)
+            if trip.route:
+                departure_time = max([departure_time] + [self.available.get(package_id, departure_time)
+                                                         for package_id, _ in trip.route])
+            miles = router.route_miles(trip.route)
+            trips[index] = Trip(departure_time, trip.route, departure_time + router.travel_time(miles))
+
+    def _remove(self, package_id, now):
+        """
+        Take a package off its trip if that stop is still ahead at now.
+        Returns (truck_id, trip_index, on_board) or None if it is not
+        planned or has already been delivered.
+        """
+        found = self._find(package_id)
+        if found is None:
+            return None
+        truck_id, trip_index, stop_index = found
+        trip = self.trips[truck_id][trip_index]
+        locked = self._locked(truck_id, trip, now)
+        if locked is not None and stop_index < locked:
+            return None
+        route = trip.route[:stop_index] + trip.route[stop_index + 1:]
+        self.trips[truck_id][trip_index] = Trip(trip.departure_time, route, trip.return_time)
+        del self.package_truck[package_id]
+        return truck_id, trip_index, locked is not None
+
+    def _drop_empty_trips(self, truck_id, now):
+        self.trips[truck_id] = [trip for trip in self.trips[truck_id]
+                                if trip.route or trip.departure_time <= now]
+
+    def _insert_all(self, truck_id, departure_time, route, stops, first_position=0):
+        """
+        Insert stops one after another, each at its cheapest position at or
+        after first_position. Returns (total cost, new route).
+        """
+        total = 0.0
+        for stop in stops:
+            schedule = self._schedule(truck_id, departure_time, route)
+            best = None
+            for position in range(first_position, len(route) + 1):
+                cost = self._insertion_cost(schedule, position, stop)
+                if best is None or cost < best[0]:
+                    best = (cost, position)
+            total += best[0]
+            route = route[:best[1]] + [stop] + route[best[1]:]
+        return total, route
+
+    def _insert_on_trip(self, truck_id, trip_index, stop, first_position):
+        """Cheapest insertion of stop into one trip at or after first_position"""
+        trip = self.trips[truck_id][trip_index]
+        _, route = self._insert_all(truck_id, trip.departure_time, trip.route, [stop], first_position)
+        self.trips[truck_id][trip_index] = Trip(trip.departure_time, route, trip.return_time)
+        self.package_truck[stop[0]] = truck_id
+        self._retime(truck_id, trip_index)
+
+    def _place(self, stops, now, trucks=None):
+        """
+        Insert packages waiting at the hub, as one unit, at their cheapest
+        positions on a trip that has not left yet, leaves after they are all
+        in and has room for their count and weight, or on a new trip at the
+        end of a truck's day. Only trucks every package may ride on are
+        tried. Returns the truck used, or None if no truck in service can
+        carry them.
+        """
+        ready = max([now] + [self.available.get(package_id, now) for package_id, _ in stops])
+        best = None
+        for truck_id in sorted(trucks if trucks is not None else self.trips):
+            if (truck_id in self.out_of_service or not self._fits(truck_id, [], stops)
+                    or not all(self._can_ride(package_id, truck_id) for package_id, _ in stops)):
+                continue
+            trips = self.trips[truck_id]
+            for trip_index, trip in enumerate(trips):
+                if (trip.departure_time <= now or trip.departure_time < ready
+                        or not self._fits(truck_id, trip.route, stops)):
+                    continue
+                cost, route = self._insert_all(truck_id, trip.departure_time, trip.route, stops)
+                if best is None or cost < best[0]:
+                    best = (cost, truck_id, trip_index, trip.departure_time, route)
+            # Or a new trip once the truck is back from its last one
+            last_return = trips[-1].return_time + self.reload_minutes if trips else now
+            departure_time = max(last_return, ready)
+            cost, route = self._insert_all(truck_id, departure_time, [], stops)
+            if best is None or cost < best[0]:
+                best = (cost, truck_id, None, departure_time, route)
+
+        if best is None:
+            return None
+        _, truck_id, trip_index, departure_time, route = best
+        trips = self.trips[truck_id]
+        if trip_index is None:
+            trips.append(Trip(departure_time, route, departure_time))
+            trip_index = len(trips) - 1
+        else:
+            trips[trip_index] = Trip(departure_time, route, trips[trip_index].return_time)
+        for package_id, _ in stops:
+            self.package_truck[package_id] = truck_id
+        self._retime(truck_id, trip_index)
+        return truck_id
+
+    def _lift_mates(self, package_id, now):
+        """
+        Take package_id's group mates that are still waiting at the hub off
+        their trips. Returns (their stops, trucks they were taken from).
+        """
+        group = self.groups.get(package_id)
+        stops = []
+        trucks = set()
+        for mate in self.group_members.get(group, ()):
+            found = self._find(mate) if mate != package_id else None
+            if found is None:
+                continue
+            truck_id, trip_index, stop_index = found
+            trip = self.trips[truck_id][trip_index]
+            if trip.departure_time <= now:
+                continue
+            stops.append(trip.route[stop_index])
+            self._remove(mate, now)
+            self._retime(truck_id, trip_index)
+            trucks.add(truck_id)
+        for truck_id in trucks:
+            self._drop_empty_trips(truck_id, now)
+        return stops, trucks
+
+    def _place_with_group(self, stop, now, trucks=None):
+        """
+        Place a package that was taken off its trip together with its group
+        mates still at the hub. If the group cannot ride together the mates
+        stay where they were and the package is placed on its own. Returns
+        (trucks changed, package IDs left unplaced).
+        """
+        saved = {truck_id: list(trips) for truck_id, trips in self.trips.items()}, dict(self.package_truck)
+        mates, lifted = self._lift_mates(stop[0], now)
+        if mates:
+            placed = self._place([stop] + mates, now, trucks)
+            if placed is not None:
+                return lifted | {placed}, ()
+            self.trips, self.package_truck = saved
+        placed = self._place([stop], now, trucks)
+        if placed is None:
+            return set(), (stop[0],)
+        return {placed}, ()
+
+    # --- EVENTS ---
+
+    def apply(self, event):
+        """Repair the plan for one live event and return a RepairResult"""
+        start = time.perf_counter()
+        if isinstance(event, AddressChanged):
+            trucks, unplaced = self._address_changed(event)
+        elif isinstance(event, PackageAdded):
+            trucks, unplaced = self._package_added(event)
+        elif isinstance(event, ArrivalDelayed):
+            trucks, unplaced = self._arrival_delayed(event)
+        elif isinstance(event, TruckBrokeDown):
+            trucks, unplaced = self._truck_broke_down(event)
+        else:
+            raise TypeError(f"Unknown event: {event!r}")
+        # Only the trucks a repair touched can have changed their miles
+        miles_delta = 0.0
+        for truck_id in trucks:
+            miles = self._truck_miles(truck_id)
+            miles_delta += miles - self.miles[truck_id]
+            self.miles[truck_id] = miles
+        return RepairResult(event, tuple(sorted(trucks)), time.perf_counter() - start, miles_delta, tuple(unplaced))
+
+    def _address_changed(self, event):
+        removed = self._remove(event.package_id, event.time)
+        if removed is None:
+            return (), ()
+        truck_id, trip_index, on_board = removed
+        stop = (event.package_id, event.address_index)
+        if on_board:
+            # Already loaded: it can only move within the rest of this trip
+            locked = self._locked(truck_id, self.trips[truck_id][trip_index], event.time)
+            self._insert_on_trip(truck_id, trip_index, stop, locked)
+            return (truck_id,), ()
+        self._retime(truck_id, trip_index)
+        self._drop_empty_trips(truck_id, event.time)
+        changed, unplaced = self._place_with_group(stop, event.time, trucks=(truck_id,))
+        return changed | {truck_id}, unplaced
+
+    def _package_added(self, event):
+        self.available[event.package_id] = max(event.time, event.available_time)
+        if event.deadline is not None:
+            self.deadlines[event.package_id] = event.deadline
+        placed = self._place([(event.package_id, event.address_index)], event.time)
+        if placed is None:
+            return (), (event.package_id,)
+        return (placed,), ()
+
+    def _arrival_delayed(self, event):
+        found = self._find(event.package_id)
+        if found is not None:
+            truck_id, trip_index, _ = found
+            if self.trips[truck_id][trip_index].departure_time <= event.time:
+                # Already loaded on a truck that has left
+                return (), ()
+        self.available[event.package_id] = event.available_time
+        if found is None:
+            return (), ()
+        trip = self.trips[truck_id][trip_index]
+        if trip.departure_time >= event.available_time:
+            return (), ()
+        stop = trip.route[found[2]]
+        self._remove(event.package_id, event.time)
+        self._retime(truck_id, trip_index)
+        self._drop_empty_trips(truck_id, event.time)
+        changed, unplaced = self._place_with_group(stop, event.time)
+        return changed | {truck_id}, unplaced
+
+    def _truck_broke_down(self, event):
+        truck_id = event.truck_id
+        if truck_id not in self.trips or truck_id in self.out_of_service:
+            return (), ()
+        self.out_of_service.add(truck_id)
+
+        stranded = []
+        kept = []
+        for trip in self.trips[truck_id]:
+            locked = self._locked(truck_id, trip, event.time)
+            if locked is None:
+                stranded.extend((stop, None) for stop in trip.route)
+                continue
+            # Undelivered packages ride back to the hub with the disabled truck
+            remaining = trip.route[locked:]
+            if remaining:
+                route = trip.route[:locked]
+                trip = Trip(trip.departure_time, route, trip.departure_time)
+                stranded.extend((stop, True) for stop in remaining)
+            kept.append(trip)
+        self.trips[truck_id] = kept
+        if kept:
+            self._retime(truck_id, len(kept) - 1)
+        back_at_hub = kept[-1].return_time if kept else event.time
+
+        # Group mates move as one unit; a group no truck can take whole is
+        # placed package by package rather than left behind
+        units = {}
+        for stop, on_board in stranded:
+            del self.package_truck[stop[0]]
+            if on_board:
+                self.available[stop[0]] = max(self.available.get(stop[0], back_at_hub), back_at_hub)
+            # A group's key is one of its members' IDs, so it cannot clash with a lone package
+            units.setdefault(self.groups.get(stop[0], stop[0]), []).append(stop)
+
+        affected = {truck_id}
+        unplaced = []
+        for unit in units.values():
+            placed = self._place(unit, event.time)
+            if placed is not None:
+                affected.add(placed)
+                continue
+            for stop in unit if len(unit) > 1 else ():
+                placed = self._place([stop], event.time)
+                if placed is None:
+                    unplaced.append(stop[0])
+                else:
+                    affected.add(placed)
+            if len(unit) == 1:
+                unplaced.append(unit[0][0])
+        return affected, unplaced
@@ -1,28 +1,118 @@
 # Distance matrix and address lookup utilities
 
 import csv
+from array import array
 
 def load_distance_data(file_path):
     """
-    Loads a symmetric distance matrix from a CSV file.
+    Loads a symmetric distance matrix from a lower-triangular CSV file.
+    Blank upper-triangle cells are mirrored from the lower triangle, so
+    distance_matrix[i][j] == distance_matrix[j][i] for every pair.
     Returns a 2D list of distances.
     """
     with open(file_path, 'r') as file:
         reader = csv.reader(file)
-        distance_matrix = [list(map(lambda x: float(x) if x else 0.0, row[1:])) for row in reader]
+        rows = [[float(x) if x.strip() else None for x in row] for row in reader]
+    size = len(rows)
+    distance_matrix = [[0.0] * size for _ in range(size)]
+    for i, row in enumerate(rows):
+        for j in range(min(len(row), size)):
+            if row[j] is not None:
+                distance_matrix[i][j] = row[j]
+                distance_matrix[j][i] = row[j]
     return distance_matrix
 
 def load_address_indices(file_path):
     """
     Loads addresses and maps each to a unique index (used for distance matrix lookups).
+    Rows are 'index,location name,street address'; packages reference the street address.
     Returns a dictionary {address_string: index}.
     """
     with open(file_path, 'r') as file:
         reader = csv.reader(file)
         address_dict = {}
-        index = 0
         for row in reader:
-            address = row[0].strip()
+            index = int(row[0])
+            address = row[2].strip()
             address_dict[address] = index
-            index += 1
     return address_dict
+
+class DistanceMatrix:
+    """
+    Symmetric distance matrix stored as a packed lower triangle of float32
+    values (array('f')), i.e. n*(n+1)/2 entries of 4 bytes each instead of
+    n*n Python float objects. Lookups are symmetric, so distance(i, j)
+    never falls into an empty upper half. packed may be any float32
+    sequence, e.g. a read-only memoryview over a memory-mapped snapshot.
+    """
+
+    def __init__(self, size, packed):
+        self.size = size
+        self._data = packed
+        # Offset of the start of each row in the packed triangle
+        self._offsets = tuple(i * (i + 1) // 2 for i in range(size))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from a square or lower-triangular 2D list of distances"""
+        size = len(rows)
+        packed = array('f', bytes(4 * (size * (size + 1) // 2)))
+        position = 0
+        for i in range(size):
+            for j in range(i + 1):
+                packed[position] = rows[i][j] if rows[i][j] is not None else rows[j][i]
+                position += 1
+        return cls(size, packed)
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """Build from a lower-triangular distance CSV, streaming row by row"""
+        packed = array('f')
+        size = 0
+        with open(file_path, 'r') as file:
+            for row in csv.reader(file):
+                packed.extend(float(row[j]) if row[j].strip() else 0.0 for j in range(size + 1))
+                size += 1
+        return cls(size, packed)
+
+    def __len__(self):
+        return self.size
+
+    def distance(self, i, j):
+        """Distance between address indices i and j"""
+        if i < j:
+            i, j = j, i
+        return self._data[self._offsets[i] + j]
+
+    def distances_from(self, origin, targets):
+        """Distances from one address index to many, in the order of targets"""
+        data = self._data
+        row = self._offsets[origin]
+        offsets = self._offsets
+        return [data[row + t] if t <= origin else data[offsets[t] + origin] for t in targets]
+
+    def nearest(self, origin, candidates):
+        """
+        Return (index, distance) of the candidate address closest to origin,
+        or (None, None) if there are no candidates. Ties go to the earliest candidate.
+        """
+        best_index = None
+        best_distance = None
+        data = self._data
+        row = self._offsets[origin]
+        offsets = self._offsets
+        for t in candidates:
+            d = data[row + t] if t <= origin else data[offsets[t] + origin]
+            if best_distance is None or d < best_distance:
+                best_index = t
+                best_distance = d
+        return best_index, best_distance
+
+    def tobytes(self):
+        """The packed float32 triangle as raw bytes (native byte order)"""
+        data = self._data
+        return data.tobytes() if hasattr(data, 'tobytes') else array('f', data).tobytes()
+
+    def to_rows(self):
+        """Expand into a full square 2D list (for display or export)"""
+        return [[self.distance(i, j) for j in range(self.size)] for i in range(self.size)]
@@ -0,0 +1,195 @@
+# Fleet-level route planning, optionally fanned out across a process pool
+
+import contextlib
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from assignment import grouping_components
+from distance import DistanceMatrix
+from metrics import METRICS
+from routing import RoutingEngine
+from scheduler import DEFAULT_RELOAD_MINUTES, PendingStop, split_trips, schedule_drivers
+
+# Below this many trucks, process start-up costs more than it saves
+PARALLEL_MIN_TRUCKS = 8
+# Move budget for route polishing; a move count (not wall-clock time) keeps
+# plans identical no matter how many workers run or how loaded they are
+DEFAULT_MAX_MOVES = 1000
+
+# stops is a list of scheduler.PendingStop; deadlines maps package_id ->
+# minutes since midnight; capacity is packages per trip. The optional tail
+# describes the truck and its depot: hub is the depot's address index and
+# None keeps the planner's router hub and speed, no weight limit, no shift end
+# and no trip limit. allowed_trucks maps each restricted package ID -> the
+# truck IDs it may ride on.
+TruckJob = namedtuple('TruckJob', ['truck_id', 'stops', 'deadlines', 'start_time', 'capacity', 'reload_minutes',
+                                   'depot_id', 'hub', 'speed_mph', 'max_weight', 'shift_end', 'allowed_trucks',
+                                   'max_trips'],
+                      defaults=(None, None, None, None, None, None, None))
+TruckPlan = namedtuple('TruckPlan', ['truck_id', 'trips', 'events', 'finish_time'])
+
+
+def truck_job(truck, package_ids, lookup, router, rules, reload_minutes=DEFAULT_RELOAD_MINUTES):
+    """
+    Describe one truck's packages, their availability and deadlines as a
+    TruckJob. truck has the depots.TruckSpec fields plus hub (its depot's
+    address index); lookup maps a package ID to its Package.
+    """
+    # Delayed packages and wrong-address packages are NOT loaded at the start
+    # of the shift; the scheduler sends the truck back out once they reach the hub.
+    # Packages that must be delivered together share a group, so they leave on one trip
+    packages = [lookup(package_id) for package_id in package_ids]
+    group_of = {}
+    for component in grouping_components(packages, rules.groups):
+        if len(component) > 1:
+            group_of.update(dict.fromkeys(component, component[0]))
+    stops = []
+    deadlines = {}
+    allowed_trucks = {}
+    for package_id, package in zip(package_ids, packages):
+        available_time = rules.available_time(package_id, truck.shift_start)
+        if available_time is None:
+            continue
+        stops.append(PendingStop(package_id, router.address_index(rules.delivery_address(package)),
+                                 available_time, float(package.weight or 0), group_of.get(package_id)))
+        if package.due is not None:
+            deadlines[package_id] = package.due
+        allowed = rules.allowed_trucks(package_id)
+        if allowed is not None:
+            allowed_trucks[package_id] = allowed
+    return TruckJob(truck.truck_id, stops, deadlines, truck.shift_start, truck.capacity, reload_minutes,
+                    truck.depot_id, truck.hub, truck.speed_mph, truck.max_weight, truck.shift_end,
+                    allowed_trucks, truck.max_trips)
+
+
+def job_router(router, job):
+    """The RoutingEngine for a job's depot and truck speed"""
+    return router.variant(job.hub, job.speed_mph)
+
+
+def plan_truck(router, job, max_moves=DEFAULT_MAX_MOVES):
+    """Split one truck's packages into trips and route each one; returns [scheduler.Trip]"""
+    return split_trips(job_router(router, job), job.stops, job.deadlines, job.start_time, job.capacity,
+                       job.reload_minutes, max_moves, job.max_weight, job.shift_end, job.max_trips)
+
+
+def drive_trips(router, truck_id, trips, start_time):
+    """Drive a truck's trips in order and return its TruckPlan with delivery events"""
+    events = []
+    finish_time = start_time
+    for trip in trips:
+        trip_events, finish_time = router.drive(truck_id, trip.departure_time, trip.route)
+        events.extend(trip_events)
+    return TruckPlan(truck_id, trips, events, finish_time)
+
+
+# --- SHARED DISTANCE MATRIX ---
+
+@contextlib.contextmanager
+def shared_router(router):
+    """
+    Copy a router's distance matrix into one shared-memory segment for a
+    process pool. Yields the arguments a worker passes to attach_router;
+    the segment is unlinked when the block exits.
+    """
+    distances = router.distances
+    payload = distances.tobytes()
+    memory = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+    try:
+        memory.buf[:len(payload)] = payload
+        yield (memory.name, distances.size, router.address_indices, router.speed_mph, router.hub)
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def attach_router(memory_name, size, address_indices, speed_mph, hub):
+    """In a worker: map a shared distance matrix read-only; returns (memory, RoutingEngine)"""
+    # Workers share the parent's resource tracker, so the parent's unlink
+    # remains the single owner of the segment
+    memory = shared_memory.SharedMemory(name=memory_name)
+    packed = memory.buf[:4 * (size * (size + 1) // 2)].cast('f')
+    return memory, RoutingEngine(DistanceMatrix(size, packed), address_indices, speed_mph, hub=hub)
+
+
+# --- WORKER PROCESS STATE ---
+
+_worker_router = None
+_worker_memory = None
+_worker_max_moves = DEFAULT_MAX_MOVES
+
+
+def _attach_worker(router_args, max_moves):
+    """Process-pool initializer: map the shared distance matrix read-only"""
+    global _worker_router, _worker_memory, _worker_max_moves
+    _worker_memory, _worker_router = attach_router(*router_args)
+    _worker_max_moves = max_moves
+
+
+def _plan_in_worker(job):
+    return plan_truck(_worker_router, job, _worker_max_moves)
+
+
+class FleetPlanner:
+    """
+    Plans every truck's trips. With more than one worker and enough
+    trucks, jobs go to a ProcessPoolExecutor whose workers all read one
+    copy of the distance matrix from shared memory; otherwise they run
+    in-process. When drivers is set, trips are then re-timed so no more
+    than that many trucks are out at once; drivers may also map depot_id ->
+    drivers, and each depot's trucks are then scheduled on their own.
+    Plans come back in job order and do not depend on the number of workers.
+    """
+
+    def __init__(self, router, workers=None, max_moves=DEFAULT_MAX_MOVES,
+                 min_parallel_trucks=PARALLEL_MIN_TRUCKS, drivers=None,
+                 reload_minutes=DEFAULT_RELOAD_MINUTES):
+        self.router = router
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_moves = max_moves
+        self.min_parallel_trucks = min_parallel_trucks
+        self.drivers = drivers
+        self.reload_minutes = reload_minutes
+
+    def plan(self, jobs):
+        """Return a TruckPlan for each TruckJob, in the same order"""
+        jobs = list(jobs)
+        with METRICS.timer('route'):
+            if self.workers <= 1 or len(jobs) < self.min_parallel_trucks:
+                trips = [plan_truck(self.router, job, self.max_moves) for job in jobs]
+            else:
+                trips = self._plan_parallel(jobs)
+        return self.schedule(jobs, trips)
+
+    def schedule(self, jobs, trips):
+        """
+        Time each job's trips (as plan_truck returns them, in job order)
+        against the drivers and drive them; returns a TruckPlan per job.
+        Trips are not modified, so callers may cache them per truck.
+        """
+        truck_trips = {job.truck_id: job_trips for job, job_trips in zip(jobs, trips)}
+        depots = {}
+        for job in jobs:
+            depots.setdefault(job.depot_id, []).append(job)
+        for depot_id, depot_jobs in depots.items():
+            drivers = self.drivers.get(depot_id) if isinstance(self.drivers, dict) else self.drivers
+            deadlines = {}
+            for job in depot_jobs:
+                deadlines.update(job.deadlines)
+            start_time = min(job.start_time for job in depot_jobs)
+            truck_trips.update(schedule_drivers(
+                {job.truck_id: truck_trips[job.truck_id] for job in depot_jobs}, drivers, self.router,
+                deadlines, start_time, self.reload_minutes,
+                {job.truck_id: job_router(self.router, job) for job in depot_jobs}))
+        return [drive_trips(job_router(self.router, job), job.truck_id, truck_trips[job.truck_id], job.start_time)
+                for job in jobs]
+
+    def _plan_parallel(self, jobs):
+        with shared_router(self.router) as router_args, ProcessPoolExecutor(
+            max_workers=min(self.workers, len(jobs)),
+            initializer=_attach_worker,
+            initargs=(router_args, self.max_moves),
+        ) as executor:
+            return list(executor.map(_plan_in_worker, jobs))
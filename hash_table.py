@@ -1,43 +1,141 @@
-# Custom HashTable for WGUPS (C950)
-
-class HashTable:
-    def __init__(self, size=40):
-        # Initialize the hash table with empty buckets (chaining method)
-        self.table = [[] for _ in range(size)]
-
-    def _hash(self, key):
-        # Simple hash function using modulo
-        return key % len(self.table)
-
-    def insert(self, key, item):
-        # Insert key-value pair, updating if key already exists
-        bucket_index = self._hash(key)
-        bucket = self.table[bucket_index]
-
-        for i, kv in enumerate(bucket):
-            if kv[0] == key:
-                bucket[i] = (key, item)
-                return
-        bucket.append((key, item))
-
-    def lookup(self, key):
-        # Retrieve value by key
-        bucket_index = self._hash(key)
-        bucket = self.table[bucket_index]
-
-        for k, v in bucket:
-            if k == key:
-                return v
-        return None
-
-    def remove(self, key):
-        # Remove key-value pair
-        bucket_index = self._hash(key)
-        bucket = self.table[bucket_index]
-
-        for i, (k, _) in enumerate(bucket):
-            if k == key:
-                del bucket[i]
-                return True
-        return False
-    
+# Custom HashTable for WGUPS (C950)
+
+_EMPTY = object()
+_FIB_MULTIPLIER = 11400714819323198485  # 2**64 / golden ratio
+_MASK_64 = (1 << 64) - 1
+
+
+class HashTable:
+    """
+    Self-adjusting hash table using open addressing with linear probing.
+
+    Keys and values live in two flat parallel lists (no per-entry bucket
+    lists or tuples). The capacity is always a power of two and doubles
+    whenever the load factor would exceed max_load, so probe sequences stay
+    short no matter how many packages are inserted. Deletion shifts later
+    entries of the probe run back instead of leaving tombstones.
+    """
+
+    def __init__(self, size=40, max_load=0.7):
+        self.max_load = max_load
+        capacity = 8
+        while capacity * max_load < size:
+            capacity *= 2
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._bits = capacity.bit_length() - 1
+        self._mask = capacity - 1
+        self._keys = [_EMPTY] * capacity
+        self._values = [None] * capacity
+        self._count = 0
+
+    def _hash(self, key):
+        # Fibonacci hashing spreads sequential package IDs across the table
+        return ((hash(key) * _FIB_MULTIPLIER) & _MASK_64) >> (64 - self._bits)
+
+    def _find_slot(self, key):
+        # Return the slot holding key, or the empty slot where it would go
+        keys = self._keys
+        mask = self._mask
+        index = self._hash(key)
+        while True:
+            k = keys[index]
+            if k is _EMPTY or k == key:
+                return index
+            index = (index + 1) & mask
+
+    def _resize(self, capacity):
+        old_keys, old_values = self._keys, self._values
+        self._allocate(capacity)
+        for key, value in zip(old_keys, old_values):
+            if key is not _EMPTY:
+                index = self._find_slot(key)
+                self._keys[index] = key
+                self._values[index] = value
+                self._count += 1
+
+    def reserve(self, count):
+        # Grow once so count entries fit without resizing during a bulk insert
+        capacity = self._capacity
+        while count > capacity * self.max_load:
+            capacity *= 2
+        if capacity != self._capacity:
+            self._resize(capacity)
+
+    def insert(self, key, item):
+        # Insert key-value pair, updating if key already exists
+        if (self._count + 1) > self._capacity * self.max_load:
+            self._resize(self._capacity * 2)
+        index = self._find_slot(key)
+        if self._keys[index] is _EMPTY:
+            self._keys[index] = key
+            self._count += 1
+        self._values[index] = item
+
+    def lookup(self, key):
+        # Retrieve value by key (hash inlined: this is the hottest path)
+        keys = self._keys
+        mask = self._mask
+        index = ((hash(key) * _FIB_MULTIPLIER) & _MASK_64) >> (64 - self._bits)
+        while True:
+            k = keys[index]
+            if k is _EMPTY:
+                return None
+            if k == key:
+                return self._values[index]
+            index = (index + 1) & mask
+
+    def probe_count(self, key):
+        # Slots a lookup of key examines: from its home slot to the key or the empty slot that ends its run
+        return ((self._find_slot(key) - self._hash(key)) & self._mask) + 1
+
+    def remove(self, key):
+        # Remove key-value pair, shifting the rest of its probe run back
+        index = self._find_slot(key)
+        if self._keys[index] is _EMPTY:
+            return False
+        keys, values, mask = self._keys, self._values, self._mask
+        keys[index] = _EMPTY
+        values[index] = None
+        self._count -= 1
+        hole = index
+        index = (index + 1) & mask
+        while keys[index] is not _EMPTY:
+            home = self._hash(keys[index])
+            # Move the entry into the hole if its home slot is not between hole and index
+            if (index - home) & mask >= (index - hole) & mask:
+                keys[hole], values[hole] = keys[index], values[index]
+                keys[index], values[index] = _EMPTY, None
+                hole = index
+            index = (index + 1) & mask
+        return True
+
+    def __contains__(self, key):
+        return self._keys[self._find_slot(key)] is not _EMPTY
+
+    def __len__(self):
+        return self._count
+
+    def keys(self):
+        # Iterate live keys without building an intermediate list
+        for key in self._keys:
+            if key is not _EMPTY:
+                yield key
+
+    def values(self):
+        # Iterate live values without building an intermediate list
+        keys, values = self._keys, self._values
+        for index in range(self._capacity):
+            if keys[index] is not _EMPTY:
+                yield values[index]
+
+    def items(self):
+        keys, values = self._keys, self._values
+        for index in range(self._capacity):
+            if keys[index] is not _EMPTY:
+                yield keys[index], values[index]
+
+    def __iter__(self):
+        return self.keys()
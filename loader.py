@@ -0,0 +1,111 @@
+# Streaming package manifest loader for WGUPS
+
+import csv
+import re
+import time
+from collections import namedtuple
+from itertools import islice
+
+from package import Package, PackageStatus
+from rules import AvailableAt, CoDeliveryGroup, WrongAddress, parse_note
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Manifest columns: id, address, city, state, zip, deadline, weight, notes (optional)
+COLUMNS = ('id', 'address', 'city', 'state', 'zip_code', 'deadline', 'weight', 'note')
+REQUIRED_COLUMNS = len(COLUMNS) - 1
+
+# Schema checks, compiled once at import
+DEADLINE_RULE = re.compile(r'^(EOD|\d{1,2}:\d{2}\s*[AP]M)$', re.IGNORECASE)
+ZIP_RULE = re.compile(r'^\d{5}(-\d{4})?$')
+
+LoadStats = namedtuple('LoadStats', ['rows', 'seconds', 'rows_per_second'])
+
+
+def read_rows(filename, has_header=False):
+    """Yield (line_number, row) for each non-blank CSV row without reading the whole file"""
+    with open(filename, newline='') as file:
+        reader = csv.reader(file)
+        if has_header:
+            next(reader, None)
+        for row in reader:
+            if row and any(cell.strip() for cell in row):
+                yield reader.line_num, row
+
+
+def validate_row(row, line_number, filename=""):
+    """Check a manifest row against the schema, raising ValueError with its location"""
+    where = f"{filename}:{line_number}" if filename else f"line {line_number}"
+    if len(row) < REQUIRED_COLUMNS:
+        raise ValueError(f"{where}: expected at least {REQUIRED_COLUMNS} columns, got {len(row)}")
+    if not row[0].strip().isdigit():
+        raise ValueError(f"{where}: package id must be a positive integer, got {row[0]!r}")
+    if not row[1].strip():
+        raise ValueError(f"{where}: address is empty")
+    if not ZIP_RULE.match(row[4].strip()):
+        raise ValueError(f"{where}: invalid zip code {row[4]!r}")
+    if not DEADLINE_RULE.match(row[5].strip()):
+        raise ValueError(f"{where}: deadline must be 'EOD' or 'HH:MM AM/PM', got {row[5]!r}")
+    try:
+        float(row[6])
+    except ValueError:
+        raise ValueError(f"{where}: weight must be numeric, got {row[6]!r}") from None
+
+
+def apply_note_rules(package):
+    """
+    Set availability, grouping and initial status on a package from its
+    special-handling note. The note is parsed into package.constraints the
+    first time; later calls (e.g. a reset) reuse them.
+    """
+    if package.constraints is None:
+        package.constraints = tuple(parse_note(package.id, package.note))
+    for constraint in package.constraints:
+        if isinstance(constraint, AvailableAt):
+            package.available_time = constraint.time
+            package.status = PackageStatus.DELAYED
+        elif isinstance(constraint, CoDeliveryGroup):
+            package.group_with = constraint.with_ids
+        elif isinstance(constraint, WrongAddress):
+            package.status = PackageStatus.WRONG_ADDRESS
+    return package
+
+
+def parse_row(row):
+    """Build a Package from a validated manifest row"""
+    note = row[7].strip() if len(row) > 7 else ""
+    package = Package(int(row[0]), row[1].strip(), row[2].strip(), row[4].strip(),
+                      row[5].strip(), row[6].strip(), note)
+    return apply_note_rules(package)
+
+
+def parse_packages(filename, has_header=False):
+    """Yield validated Package records from a manifest, one row at a time"""
+    for line_number, row in read_rows(filename, has_header):
+        validate_row(row, line_number, filename)
+        yield parse_row(row)
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def load_packages(filename, package_table, chunk_size=DEFAULT_CHUNK_SIZE, has_header=False):
+    """
+    Stream a manifest into package_table in chunks of chunk_size rows.
+    Rows are validated as they are read; a bad row raises ValueError.
+    Returns LoadStats with the row count, elapsed seconds and rows/s.
+    """
+    start = time.perf_counter()
+    rows = 0
+    for chunk in chunked(parse_packages(filename, has_header), chunk_size):
+        package_table.insert_many(chunk)
+        rows += len(chunk)
+    seconds = time.perf_counter() - start
+    return LoadStats(rows, seconds, rows / seconds if seconds > 0 else 0.0)
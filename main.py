@@ -1,142 +1,146 @@
 # Student ID: 012096094
 
-import csv
-from datetime import datetime, timedelta
-from utils import str_to_time, time_to_str, format_package_status
+import argparse
+import contextlib
+import sys
+from utils import str_to_minutes, minutes_to_str
+from package import Package, PackageStatus
+from loader import apply_note_rules
+from depots import Depot, FleetConfig, TruckSpec, assign_fleet, depot_fleets, load_fleet_config
+from hash_table import HashTable
+from timeline import DeliveryTimeline
+from routing import HUB_INDEX, RoutingEngine
+from fleet import FleetPlanner, truck_job
+from snapshot import load_distance_snapshot, load_packages_cached, load_shortest_paths
+from rules import RuleBook, load_address_changes
+from time_windows import lateness_report
+from status import package_location_at_time, package_status_at_time
+from projection import StatusProjection
+from scenarios import PlanState
+from optimizer import FleetOptimizer
+from batch import FORMATS, answer_queries, parse_query, read_queries, write_results
+from metrics import METRICS, CountingDistanceMatrix, CountingHashTable, profiled, traced_allocations
 
 # Constants
 MAX_PACKAGES_PER_TRUCK = 16
+MAX_TRIPS_PER_TRUCK = 3
+DRIVER_COUNT = 2
+RELOAD_MINUTES = 0
 TRUCK_SPEED_MPH = 18
-START_TIME = datetime.strptime("08:00", "%H:%M").time()
-PACKAGE_9_CORRECTION_TIME = datetime.strptime("10:20", "%H:%M").time()
-PACKAGE_9_CORRECTED_ADDRESS = "410 S State St"
+TRUCK_COUNT = 3
+HUB_DEPOT = 'HUB'
+HUB_ADDRESS = "4001 South 700 East"
+# Times are minutes since midnight
+START_TIME = str_to_minutes("08:00")
+END_OF_DAY = str_to_minutes("23:59")
+PACKAGE_FILE = "csv/packages.csv"
+ADDRESS_CHANGES_FILE = "csv/address_corrections.csv"
+DISTANCE_FILE = "csv/Distance_File.csv"
+ADDRESS_FILE = "csv/Address_File.csv"
 
 # --- HASH TABLE IMPLEMENTATION ---
 
 class PackageHashTable:
+    """Package records keyed by package ID, stored in the open-addressing HashTable"""
+
     def __init__(self, size=40):
-        self.size = size
-        self.table = [[] for _ in range(size)]
+        if METRICS.enabled:
+            self.table = CountingHashTable(size)
+            METRICS.register_collector(self.table.counters)
+        else:
+            self.table = HashTable(size)
+
+    def __len__(self):
+        return len(self.table)
 
-    def _hash(self, package_id):
-        return package_id % self.size
+    def __iter__(self):
+        # Iterate live packages without allocating a flattened list
+        return self.table.values()
 
     def insert(self, package_id, address, deadline, city, zip_code, weight, note=""):
-        index = self._hash(package_id)
-        # Initialize package data dictionary
-        package_data = {
-            'id': package_id,
-            'address': address,
-            'deadline': deadline,
-            'city': city,
-            'zip_code': zip_code,
-            'weight': weight,
-            'note': note,
-            'status': 'At Hub',
-            'delivery_time': None,
-            'truck': None,
-            'original_address': address,  # Store original address for package 9
-            'available_time': None,  # For delayed packages
-            'group_with': []  # For packages that must be delivered together
-        }
-        
-        # Handle special cases
-        if package_id == 9:
-            package_data['status'] = 'Wrong Address - Cannot Deliver'
-        
-        # Handle flight delays
-        if "Delayed on flight" in note:
-            package_data['available_time'] = datetime.strptime("09:05", "%H:%M").time()
-            package_data['status'] = 'Delayed - Not Available'
-        
-        # Handle package grouping
-        if "Must be delivered with" in note:
-            # Extract package IDs from note - handle quoted format from CSV
-            import re
-            # Look for numbers after "with" in the note
-            match = re.search(r'with (\d+), (\d+)', note)
-            if match:
-                numbers = [int(match.group(1)), int(match.group(2))]
-                package_data['group_with'] = numbers
-            else:
-                # Fallback: extract all numbers and skip the first (current package ID)
-                numbers = re.findall(r'\d+', note)
-                if len(numbers) >= 3:  # Current package + 2 others
-                    package_data['group_with'] = [int(num) for num in numbers[1:3]]  # Skip first, take next 2
-        
+        package = apply_note_rules(Package(package_id, address, city, zip_code, deadline, weight, note))
+        self.insert_package(package)
+
+    def insert_package(self, package):
         # Insert or update package
-        for idx, item in enumerate(self.table[index]):
-            if item['id'] == package_id:
-                self.table[index][idx] = package_data
-                return
-        self.table[index].append(package_data)
+        self.table.insert(package.id, package)
+
+    def insert_many(self, packages):
+        """Bulk insert parsed Package records, growing the table once up front"""
+        self.table.reserve(len(self.table) + len(packages))
+        for package in packages:
+            self.insert_package(package)
 
     def lookup(self, package_id):
-        index = self._hash(package_id)
-        for item in self.table[index]:
-            if item['id'] == package_id:
-                return item
-        return None
+        return self.table.lookup(package_id)
 
     def update_status(self, package_id, status, delivery_time=None, truck=None):
         package = self.lookup(package_id)
         if package:
-            package['status'] = status
-            package['delivery_time'] = delivery_time
+            package.status = status
+            package.delivery_time = delivery_time
             if truck:
-                package['truck'] = truck
+                package.truck = truck
 
     def update_address(self, package_id, new_address):
         package = self.lookup(package_id)
         if package:
-            package['address'] = new_address
-            if package['status'] == 'Wrong Address - Cannot Deliver':
-                package['status'] = 'At Hub'
+            package.address = new_address
+            if package.status is PackageStatus.WRONG_ADDRESS:
+                package.status = PackageStatus.AT_HUB
 
     def all_packages(self):
-        packages = []
-        for bucket in self.table:
-            packages.extend(bucket)
-        return packages
+        return list(self.table.values())
 
-    def get_available_packages_at_time(self, query_time):
-        """Get packages available for delivery at a specific time"""
+    def get_available_packages_at_time(self, query_minutes):
+        """Get packages available for delivery at a specific time (minutes since midnight)"""
         available = []
-        for package in self.all_packages():
+        for package in self:
             # Check if package is available (not delayed or wrong address)
-            if package['available_time'] and query_time < package['available_time']:
+            if package.available_time is not None and query_minutes < package.available_time:
                 continue
-            if package['status'] == 'Wrong Address - Cannot Deliver':
+            if package.status is PackageStatus.WRONG_ADDRESS:
                 continue
             available.append(package)
         return available
 
     def reset_delivery_state(self):
         """Reset all packages to their initial delivery state"""
-        for package in self.all_packages():
-            package['status'] = 'At Hub'
-            package['delivery_time'] = None
-            # Reset package 9 to wrong address status
-            if package['id'] == 9:
-                package['status'] = 'Wrong Address - Cannot Deliver'
-                package['address'] = package['original_address']
-            # Reset delayed packages
-            if "Delayed on flight" in package['note']:
-                package['status'] = 'Delayed - Not Available'
+        for package in self:
+            package.status = PackageStatus.AT_HUB
+            package.delivery_time = None
+            package.address = package.original_address
+            # Restore delayed / wrong address status from the note
+            apply_note_rules(package)
 
 # --- TRUCK CLASS ---
 
 class Truck:
-    def __init__(self, truck_id):
+    def __init__(self, truck_id, capacity=MAX_PACKAGES_PER_TRUCK, max_trips=MAX_TRIPS_PER_TRUCK,
+                 speed_mph=TRUCK_SPEED_MPH, max_weight=None, shift_start=START_TIME, shift_end=None,
+                 depot_id=HUB_DEPOT, hub=HUB_INDEX):
         self.truck_id = truck_id
+        self.capacity = capacity  # packages per trip
+        self.max_trips = max_trips
+        self.speed_mph = speed_mph
+        self.max_weight = max_weight  # total weight per trip, None for no limit
+        self.shift_start = shift_start
+        self.shift_end = shift_end
+        self.depot_id = depot_id
+        self.hub = hub  # address index of the truck's depot
         self.packages = []
         self.miles_traveled = 0.0
-        self.current_time = START_TIME
+        self.current_time = shift_start
         self.current_location = 'Hub'
         self.route = []
 
+    @classmethod
+    def from_spec(cls, spec, hub):
+        return cls(spec.truck_id, spec.capacity, spec.max_trips, spec.speed_mph, spec.max_weight,
+                   spec.shift_start, spec.shift_end, spec.depot_id, hub)
+
     def load_package(self, package_id):
-        if len(self.packages) < MAX_PACKAGES_PER_TRUCK:
+        if len(self.packages) < self.capacity * self.max_trips:
             self.packages.append(package_id)
             return True
         return False
@@ -147,14 +151,14 @@ class Truck:
             return True
         return False
 
-    def can_load_package(self, package, package_table):
+    def can_load_package(self, package, rules):
         """Check if truck can load a specific package based on constraints"""
         # Check truck-specific constraints
-        if "Can only be on truck 2" in package['note'] and self.truck_id != 2:
+        if not rules.can_ride(package.id, self.truck_id):
             return False
         
         # Check capacity
-        if len(self.packages) >= MAX_PACKAGES_PER_TRUCK:
+        if len(self.packages) >= self.capacity * self.max_trips:
             return False
             
         return True
@@ -162,376 +166,318 @@ class Truck:
     def reset_state(self):
         """Reset truck to initial state"""
         self.miles_traveled = 0.0
-        self.current_time = START_TIME
+        self.current_time = self.shift_start
         self.current_location = 'Hub'
 
+def default_fleet_config():
+    """The single-hub fleet: TRUCK_COUNT identical trucks sharing DRIVER_COUNT drivers"""
+    spec = TruckSpec(None, HUB_DEPOT, MAX_PACKAGES_PER_TRUCK, MAX_TRIPS_PER_TRUCK, TRUCK_SPEED_MPH,
+                     None, START_TIME, None)
+    return FleetConfig([Depot(HUB_DEPOT, HUB_ADDRESS, DRIVER_COUNT)],
+                       [spec._replace(truck_id=truck_id) for truck_id in range(1, TRUCK_COUNT + 1)])
+
+def build_fleet(config, router):
+    """Create a Truck per TruckSpec, resolving each depot's address to its hub index"""
+    hubs = {depot.depot_id: router.address_index(depot.address) for depot in config.depots}
+    return [Truck.from_spec(spec, hubs[spec.depot_id]) for spec in config.trucks]
+
 # --- MAIN DELIVERY PROGRAM ---
 
-def load_packages(filename, package_table):
-    """Load packages from CSV into the hash table"""
-    with open(filename) as file:
-        reader = csv.reader(file)
-        for row in reader:
-            package_id = int(row[0])
-            address = row[1]
-            city = row[2]
-            deadline = row[5]
-            zip_code = row[4]
-            weight = row[6]
-            note = row[7] if len(row) > 7 else ""
-            package_table.insert(package_id, address, deadline, city, zip_code, weight, note)
-
-def assign_packages_to_trucks(package_table, trucks):
-    """Assign packages to trucks based on constraints and requirements, with correct grouping."""
-    all_packages = package_table.all_packages()
-    # 1. Build grouping graph
-    from collections import defaultdict, deque
-    graph = defaultdict(set)
-    id_to_package = {pkg['id']: pkg for pkg in all_packages}
-    for pkg in all_packages:
-        for other_id in pkg.get('group_with', []):
-            graph[pkg['id']].add(other_id)
-            graph[other_id].add(pkg['id'])
-    # 2. Find all connected groups (connected components)
-    visited = set()
-    groups = []
-    for pkg in all_packages:
-        if pkg['id'] not in visited and pkg['group_with']:
-            # BFS to find all connected packages
-            group = set()
-            queue = deque([pkg['id']])
-            while queue:
-                current = queue.popleft()
-                if current not in visited:
-                    visited.add(current)
-                    group.add(current)
-                    for neighbor in graph[current]:
-                        if neighbor not in visited:
-                            queue.append(neighbor)
-            if group:
-                groups.append([id_to_package[pid] for pid in group])
-    # 3. Assign each group to a truck as a unit (excluding delayed packages)
-    for group in groups:
-        # Filter out delayed packages from initial assignment
-        available_group = [pkg for pkg in group if not pkg.get('available_time')]
-        if available_group:
-            assigned = False
-            for truck in trucks:
-                if all(truck.can_load_package(pkg, package_table) for pkg in available_group):
-                    for pkg in available_group:
-                        if truck.load_package(pkg['id']):
-                            package_table.update_status(pkg['id'], 'Assigned to Truck', truck=truck.truck_id)
-                    assigned = True
-                    break
-            if not assigned:
-                print(f"Warning: Could not assign grouped packages {[pkg['id'] for pkg in available_group]} to any truck")
-    # 4. Assign truck-specific packages first (packages that can only be on truck 2, excluding delayed)
-    truck2_only_packages = [pkg for pkg in all_packages if pkg['truck'] is None and "Can only be on truck 2" in pkg['note'] and not pkg.get('available_time')]
-    for package in truck2_only_packages:
-        truck2 = next((truck for truck in trucks if truck.truck_id == 2), None)
-        if truck2 and truck2.can_load_package(package, package_table):
-            if truck2.load_package(package['id']):
-                package_table.update_status(package['id'], 'Assigned to Truck', truck=truck2.truck_id)
-        else:
-            print(f"Warning: Could not assign package {package['id']} to truck 2")
-    # 5. Assign remaining packages (excluding those already assigned in groups or truck-specific, and delayed)
-    for package in all_packages:
-        if package['truck'] is None and not package.get('available_time'):  # Not yet assigned and not delayed
-            assigned = False
-            for truck in trucks:
-                if truck.can_load_package(package, package_table):
-                    if truck.load_package(package['id']):
-                        package_table.update_status(package['id'], 'Assigned to Truck', truck=truck.truck_id)
-                        assigned = True
-                        break
-            if not assigned:
-                print(f"Warning: Could not assign package {package['id']} to any truck")
-    # 6. Assign delayed packages to trucks (they'll be loaded after 9:05 AM)
-    delayed_packages = [pkg for pkg in all_packages if pkg.get('available_time')]
-    for package in delayed_packages:
-        if package['truck'] is None:  # Not yet assigned
-            assigned = False
-            for truck in trucks:
-                if truck.can_load_package(package, package_table):
-                    if truck.load_package(package['id']):
-                        package_table.update_status(package['id'], 'Assigned to Truck', truck=truck.truck_id)
-                        assigned = True
-                        break
-            if not assigned:
-                print(f"Warning: Could not assign delayed package {package['id']} to any truck")
-
-def simulate_delivery(package_table, trucks, query_time):
-    """Simulate delivery process up to the query time"""
-    # Reset all state first
-    package_table.reset_delivery_state()
+def assign_packages_to_trucks(package_table, trucks, router, rules):
+    """
+    Assign packages to trucks by location, honoring grouping, truck restrictions, capacity, weight and deadlines.
+    With several depots the manifest is first split across depots, then each depot assigns its own share.
+    """
+    all_packages = sorted(package_table, key=lambda pkg: pkg.id)
+    assignment, unassigned = assign_fleet(
+        all_packages,
+        depot_fleets(trucks),
+        router.distances,
+        lambda package: router.address_index(rules.delivery_address(package)),
+        rules,
+        START_TIME,
+    )
     for truck in trucks:
-        truck.reset_state()
-    
-    # Update package 9 address if past correction time
-    if query_time >= PACKAGE_9_CORRECTION_TIME:
-        package_table.update_address(9, PACKAGE_9_CORRECTED_ADDRESS)
-    
-    # Create a timeline of all delivery events
-    delivery_events = []
-    
-    # Simulate delivery for each truck (8:00 AM departure)
+        for package_id in assignment[truck.truck_id]:
+            if truck.load_package(package_id):
+                package_table.update_status(package_id, PackageStatus.ASSIGNED, truck=truck.truck_id)
+    for package_ids in unassigned:
+        print(f"Warning: Could not assign packages {list(package_ids)} to any truck", file=sys.stderr)
+
+def optimize_assignment(package_table, trucks, router, rules, drivers, seconds):
+    """
+    Revisit the truck assignment across the whole fleet with the optimizer
+    for up to seconds, then load the best assignment found onto the trucks
+    """
+    state = PlanState.from_day(package_table, trucks, rules, drivers, RELOAD_MINUTES)
+    result = FleetOptimizer(state, router).optimize(time_budget=seconds, max_iterations=None)
     for truck in trucks:
-        truck.current_time = START_TIME
-        # Only load packages that are available at departure time (8:00 AM)
-        # Delayed packages are NOT loaded at 8:00 AM
-        available_packages = []
-        for pkg_id in truck.packages:
-            package = package_table.lookup(pkg_id)
-            # Skip packages with wrong address
-            if package['status'] == 'Wrong Address - Cannot Deliver':
-                continue
-            # Skip delayed packages - they are NOT loaded at 8:00 AM
-            if package.get('available_time'):
-                continue
-            available_packages.append(pkg_id)
-        
-        # Process deliveries in time order
-        current_time = truck.current_time
-        for pkg_id in available_packages:
-            package = package_table.lookup(pkg_id)
-            
-            # Calculate delivery time (simplified - each delivery takes 15 minutes)
-            delivery_time = (datetime.combine(datetime.today(), current_time) + timedelta(minutes=15)).time()
-            
-            # Add to delivery events
-            delivery_events.append({
-                'package_id': pkg_id,
-                'truck_id': truck.truck_id,
-                'delivery_time': delivery_time,
-                'miles': 3.0
-            })
-            
-            current_time = delivery_time
-    
-    # Now handle delayed packages that arrive at depot at 9:05 AM
-    # These packages are loaded and delivered after they arrive
-    delayed_packages = []
+        truck.packages = list(result.state.assignment.get(truck.truck_id, ()))
+        for package_id in truck.packages:
+            package_table.update_status(package_id, PackageStatus.ASSIGNED, truck=truck.truck_id)
+    stats = result.stats
+    print(f"Optimized assignment: {stats.initial_cost.miles:.1f} -> {stats.best_cost.miles:.1f} miles, "
+          f"{len(stats.best_cost.late_packages)} late, {stats.iterations} iterations in {stats.seconds:.2f} s",
+          file=sys.stderr)
+
+def build_truck_jobs(package_table, trucks, router, rules):
+    """Describe each truck's packages, their availability and deadlines for the planner"""
+    return [truck_job(truck, truck.packages, package_table.lookup, router, rules, RELOAD_MINUTES) for truck in trucks]
+
+def day_end(timeline):
+    """END_OF_DAY, or the last event if the day ran past it (times keep counting past midnight)"""
+    return max(END_OF_DAY, timeline.end_time())
+
+def simulate_delivery(package_table, trucks, router, rules, planner=None):
+    """Simulate the whole delivery day once with real distances and return its event timeline"""
+    planner = planner or FleetPlanner(router, drivers=DRIVER_COUNT, reload_minutes=RELOAD_MINUTES)
+    plans = planner.plan(build_truck_jobs(package_table, trucks, router, rules))
+
+    events = []
+    for truck, plan in zip(trucks, plans):
+        truck.current_time = plan.finish_time
+        events.extend(plan.events)
+
+    timeline = DeliveryTimeline(events)
     for truck in trucks:
-        for pkg_id in truck.packages:
-            package = package_table.lookup(pkg_id)
-            if package.get('available_time') == datetime.strptime("09:05", "%H:%M").time():
-                delayed_packages.append((pkg_id, truck.truck_id))
-    
-    # Add delayed package deliveries starting at 9:05 AM
-    delayed_start_time = datetime.strptime("09:05", "%H:%M").time()
-    current_delayed_time = delayed_start_time
-    for pkg_id, truck_id in delayed_packages:
-        # Add loading time (instantaneous as per requirements)
-        delivery_time = (datetime.combine(datetime.today(), current_delayed_time) + timedelta(minutes=15)).time()
-        delivery_events.append({
-            'package_id': pkg_id,
-            'truck_id': truck_id,
-            'delivery_time': delivery_time,
-            'miles': 3.0
-        })
-        current_delayed_time = delivery_time
-    
-    # Sort delivery events by time
-    delivery_events.sort(key=lambda x: x['delivery_time'])
-    
-    # Apply delivery events up to query time
-    for event in delivery_events:
-        if event['delivery_time'] <= query_time:
-            package_table.update_status(event['package_id'], 'Delivered', event['delivery_time'], event['truck_id'])
-            # Update truck mileage
-            for truck in trucks:
-                if truck.truck_id == event['truck_id']:
-                    truck.miles_traveled += event['miles']
-                    break
-        else:
-            # Package is en route at query time
-            package_table.update_status(event['package_id'], 'En Route', None, event['truck_id'])
+        truck.miles_traveled = timeline.truck_miles_at(truck.truck_id, day_end(timeline))
+    return timeline
 
-def print_package_status_at_time(package_table, query_time, trucks=None):
-    """Display status of all packages at a specific time with all required fields"""
+def print_package_status_at_time(package_table, query_time, timeline, rules, projection=None):
+    """
+    Display status of all packages at a specific time with all required fields.
+    projection is a StatusProjection of the day, reused across calls when given.
+    """
     print(f"\n{'='*100}")
-    print(f"PACKAGE STATUS AT {time_to_str(query_time)}")
+    print(f"PACKAGE STATUS AT {minutes_to_str(query_time)}")
     print(f"{'='*100}")
     
-    # Simulate delivery up to query time
-    if trucks:
-        simulate_delivery(package_table, trucks, query_time)
-    
-    # Get all packages and sort by ID
-    all_packages = package_table.all_packages()
-    all_packages.sort(key=lambda pkg: int(pkg['id']))
+    # One columnar snapshot of the whole fleet, already in package ID order
+    projection = projection or StatusProjection(package_table, timeline, rules)
+    snapshot = projection.snapshot(query_time)
     
     print(f"{'ID':<3} {'Address':<20} {'City':<12} {'Zip':<6} {'Deadline':<8} {'Truck':<5} {'Status':<18} {'Weight':<5} {'Delivery':<10}")
     print("-" * 100)
     
-    for pkg in all_packages:
-        # Determine address to display
-        if pkg['id'] == 9 and query_time < PACKAGE_9_CORRECTION_TIME:
-            display_address = pkg['original_address'] + " (WRONG)"
-        else:
-            display_address = pkg['address']
-        
-        # Determine status
-        if pkg['status'] == 'Delivered' and pkg['delivery_time'] and pkg['delivery_time'] <= query_time:
-            status = f"Delivered at {time_to_str(pkg['delivery_time'])}"
-        elif pkg['status'] == 'Wrong Address - Cannot Deliver':
-            status = "Wrong Address - Cannot Deliver"
-        elif pkg.get('available_time') and query_time < pkg['available_time']:
-            # Package is delayed and not yet available
-            status = f"Delayed on flight until {time_to_str(pkg['available_time'])}"
-        elif pkg['status'] == 'En Route':
-            status = "En Route"
-        else:
-            status = "At Hub"
+    for row, (pkg, truck_id, code, delivery_time) in enumerate(
+            zip(projection.packages, snapshot.trucks, snapshot.codes, snapshot.delivery_times)):
+        display_address, city, zip_code = package_location_at_time(pkg, rules, query_time, " (WRONG)")
+        status = projection.status_text(row, code, query_time)
         
         # Format delivery time
-        delivery_time_str = time_to_str(pkg['delivery_time']) if pkg['delivery_time'] else "N/A"
+        delivery_time_str = minutes_to_str(delivery_time) if delivery_time != float('inf') else "N/A"
         
         # Format truck number
-        truck_str = str(pkg['truck']) if pkg['truck'] else "N/A"
+        truck_str = str(truck_id) if truck_id else "N/A"
         
-        print(f"{pkg['id']:<3} {display_address:<20} {pkg['city']:<12} {pkg['zip_code']:<6} {pkg['deadline']:<8} {truck_str:<5} {status:<18} {pkg['weight']:<5} {delivery_time_str:<10}")
+        print(f"{pkg.id:<3} {display_address:<20} {city:<12} {zip_code:<6} {pkg.deadline:<8} {truck_str:<5} {status:<18} {pkg.weight:<5} {delivery_time_str:<10}")
     
     # Display truck mileage
-    if trucks:
-        print(f"\n{'='*50}")
-        print("TRUCK MILEAGE")
-        print(f"{'='*50}")
-        total_miles = 0
-        for truck in trucks:
-            print(f"Truck {truck.truck_id}: {truck.miles_traveled:.2f} miles")
-            total_miles += truck.miles_traveled
-        print(f"Total mileage: {total_miles:.2f} miles")
-
-def print_single_package_status_at_time(package_table, package_id, query_time, trucks=None):
+    print(f"\n{'='*50}")
+    print("TRUCK MILEAGE")
+    print(f"{'='*50}")
+    total_miles = 0
+    for truck_id in timeline.truck_ids():
+        miles = timeline.truck_miles_at(truck_id, query_time)
+        print(f"Truck {truck_id}: {miles:.2f} miles")
+        total_miles += miles
+    print(f"Total mileage: {total_miles:.2f} miles")
+
+def print_single_package_status_at_time(package_table, package_id, query_time, timeline, rules):
     """Display status of a specific package at a given time"""
     pkg = package_table.lookup(package_id)
     if not pkg:
         print(f"No package found with ID {package_id}.")
         return
     
-    # Simulate delivery up to query time
-    if trucks:
-        simulate_delivery(package_table, trucks, query_time)
-        pkg = package_table.lookup(package_id)  # Refresh package data
-    
     print(f"\n{'='*60}")
-    print(f"PACKAGE {package_id} STATUS AT {time_to_str(query_time)}")
+    print(f"PACKAGE {package_id} STATUS AT {minutes_to_str(query_time)}")
     print(f"{'='*60}")
     
-    # Determine address to display
-    if pkg['id'] == 9 and query_time < PACKAGE_9_CORRECTION_TIME:
-        display_address = pkg['original_address'] + " (WRONG ADDRESS)"
-    else:
-        display_address = pkg['address']
-    
-    # Determine status
-    if pkg['status'] == 'Delivered' and pkg['delivery_time'] and pkg['delivery_time'] <= query_time:
-        status = f"Delivered at {time_to_str(pkg['delivery_time'])}"
-    elif pkg['status'] == 'Wrong Address - Cannot Deliver':
-        status = "Wrong Address - Cannot Deliver"
-    elif pkg.get('available_time') and query_time < pkg['available_time']:
-        # Package is delayed and not yet available
-        status = f"Delayed on flight until {time_to_str(pkg['available_time'])}"
-    elif pkg['status'] == 'En Route':
-        status = "En Route"
-    else:
-        status = "At Hub"
+    display_address, city, zip_code = package_location_at_time(pkg, rules, query_time, " (WRONG ADDRESS)")
+    status, delivery_time = package_status_at_time(pkg, timeline, rules, query_time)
+    truck_id = timeline.package_truck(pkg.id) or pkg.truck
     
-    print(f"Package ID: {pkg['id']}")
+    print(f"Package ID: {pkg.id}")
     print(f"Address: {display_address}")
-    print(f"City: {pkg['city']}")
-    print(f"Zip Code: {pkg['zip_code']}")
-    print(f"Deadline: {pkg['deadline']}")
-    print(f"Weight: {pkg['weight']}")
-    print(f"Truck: {pkg['truck'] if pkg['truck'] else 'Not Assigned'}")
+    print(f"City: {city}")
+    print(f"Zip Code: {zip_code}")
+    print(f"Deadline: {pkg.deadline}")
+    print(f"Weight: {pkg.weight}")
+    print(f"Truck: {truck_id if truck_id else 'Not Assigned'}")
     print(f"Status: {status}")
-    if pkg['delivery_time']:
-        print(f"Delivery Time: {time_to_str(pkg['delivery_time'])}")
-    if pkg['note']:
-        print(f"Special Notes: {pkg['note']}")
+    if delivery_time is not None:
+        print(f"Delivery Time: {minutes_to_str(delivery_time)}")
+    if pkg.note:
+        print(f"Special Notes: {pkg.note}")
+
+def print_lateness_report(package_table, timeline):
+    """Display on-time performance against package deadlines for each truck"""
+    deadlines = {pkg.id: pkg.due for pkg in package_table if pkg.due is not None}
+    print(f"\n{'='*60}")
+    print("DEADLINE REPORT")
+    print(f"{'='*60}")
+    print(f"{'Truck':<6} {'Deadlines':<10} {'Late':<6} {'Late min':<10} {'Tightest slack':<15} {'Late packages'}")
+    print("-" * 60)
+    for row in lateness_report(timeline, deadlines):
+        late_ids = ', '.join(f"{package_id} (undelivered)" if package_id in row.undelivered else str(package_id)
+                             for package_id in row.late_packages) or '-'
+        truck = row.truck_id if row.truck_id is not None else 'unassigned'
+        print(f"{truck:<6} {row.deadline_packages:<10} {len(row.late_packages):<6} "
+              f"{row.late_minutes:<10.1f} {row.min_slack:<15.1f} {late_ids}")
+
+HELP_TEXT = """Available commands:
+  [time]                - View all package statuses at that time (e.g., '9:15 AM')
+  [time] [package_id]    - View a specific package's status at that time (e.g., '9:15 AM 12')
+  mileage                - View total mileage traveled by all trucks
+  lateness               - View on-time performance against deadlines per truck
+  help                   - Show this list again
+  exit                   - Quit the program"""
+
+def build_router():
+    """Load the distance and address tables once for routing"""
+    # Trucks drive shortest paths, so routes are costed on the closure of the raw table
+    distances, address_indices = load_distance_snapshot(DISTANCE_FILE, ADDRESS_FILE)
+    distances = load_shortest_paths(DISTANCE_FILE, distances).matrix
+    if METRICS.enabled:
+        distances = CountingDistanceMatrix.wrap(distances)
+        METRICS.register_collector(distances.counters)
+    return RoutingEngine(distances, address_indices, TRUCK_SPEED_MPH)
 
-def main():
+def plan_day(fleet_file=None, optimize_seconds=None):
+    """
+    Load the manifest and tables, assign packages and simulate the day; returns (package_table, trucks, rules, timeline).
+    fleet_file is an optional JSON fleet configuration (see depots.load_fleet_config); the default is one hub.
+    optimize_seconds, when set, is spent improving the assignment across trucks before the day is simulated.
+    """
     # Create package hash table
     package_table = PackageHashTable()
 
     # Load packages from CSV file
-    load_packages("csv/packages.csv", package_table)
+    with METRICS.timer('load'):
+        load_stats = load_packages_cached(PACKAGE_FILE, package_table)
+    print(f"Loaded {load_stats.rows} packages in {load_stats.seconds * 1000:.1f} ms "
+          f"({load_stats.rows_per_second:,.0f} rows/s)", file=sys.stderr)
 
-    # Initialize trucks
-    trucks = [Truck(1), Truck(2), Truck(3)]
+    # Compile special-handling notes and scheduled address corrections once
+    rules = RuleBook.from_packages(package_table, load_address_changes(ADDRESS_CHANGES_FILE))
+
+    router = build_router()
+
+    # Initialize trucks at their depots
+    config = default_fleet_config()
+    if fleet_file is not None:
+        config = load_fleet_config(fleet_file, config.trucks[0])
+    trucks = build_fleet(config, router)
+    drivers = {depot.depot_id: depot.drivers for depot in config.depots}
+    planner = FleetPlanner(router, drivers=drivers, reload_minutes=RELOAD_MINUTES)
 
     # Assign packages to trucks
-    assign_packages_to_trucks(package_table, trucks)
+    with METRICS.timer('assign'):
+        assign_packages_to_trucks(package_table, trucks, router, rules)
+    if optimize_seconds:
+        with METRICS.timer('optimize'):
+            optimize_assignment(package_table, trucks, router, rules, drivers, optimize_seconds)
+
+    # Simulate the day once; every status query reads from this timeline
+    with METRICS.timer('simulate'):
+        timeline = simulate_delivery(package_table, trucks, router, rules, planner)
+    return package_table, trucks, rules, timeline
+
+def run_batch(source, destination, fmt, package_table, timeline, rules):
+    """Answer a file (or '-' for stdin) of 'time,package_id' queries in one pass"""
+    with contextlib.ExitStack() as stack:
+        queries_in = sys.stdin if source == '-' else stack.enter_context(open(source, newline=''))
+        results_out = sys.stdout if destination in (None, '-') else stack.enter_context(open(destination, 'w', newline=''))
+        with METRICS.timer('query'):
+            queries = list(read_queries(queries_in))
+            count = write_results(answer_queries(queries, package_table, timeline, rules), results_out, fmt)
+    print(f"Answered {count} queries", file=sys.stderr)
+
+def run_interactive(package_table, trucks, rules, timeline):
+    # Status columns are built once and shared by every all-packages query
+    projection = StatusProjection(package_table, timeline, rules)
 
     # User interface loop
     print("WGUPS Delivery System")
-    print("Available commands:")
-    print("  [time]                - View all package statuses at that time (e.g., '9:15 AM')")
-    print("  [time] [package_id]    - View a specific package's status at that time (e.g., '9:15 AM 12')")
-    print("  mileage                - View total mileage traveled by all trucks")
-    print("  exit                   - Quit the program")
-    
+    print(HELP_TEXT)
+
     while True:
-        print("\n" + "="*50)
-        print("Available commands:")
-        print("  [time]                - View all package statuses at that time (e.g., '9:15 AM')")
-        print("  [time] [package_id]    - View a specific package's status at that time (e.g., '9:15 AM 12')")
-        print("  mileage                - View total mileage traveled by all trucks")
-        print("  exit                   - Quit the program")
-        print("="*50)
-        
-        user_input = input("Enter command: ").strip()
-        
-        if user_input.lower() == 'exit':
+        try:
+            user_input = input("\nEnter command: ").strip()
+        except EOFError:
             break
-        elif user_input.lower() == 'mileage':
-            # Run full simulation to get accurate mileage
-            end_of_day = datetime.strptime("23:59", "%H:%M").time()
-            simulate_delivery(package_table, trucks, end_of_day)
-            total_miles = sum(truck.miles_traveled for truck in trucks)
+        command = user_input.lower()
+
+        if command == 'exit':
+            break
+        elif command == 'help':
+            print(HELP_TEXT)
+            continue
+        elif command == 'lateness':
+            print_lateness_report(package_table, timeline)
+            continue
+        elif command == 'mileage':
+            total_miles = timeline.total_miles()
             print(f"\nTotal mileage traveled by all trucks: {total_miles:.2f} miles")
             continue
-        
+
         # Parse input for time and optional package ID
-        parts = user_input.split()
-        
-        if len(parts) >= 3:
-            # Assume last part is package ID, rest is time
-            try:
-                package_id = int(parts[-1])
-                time_str = ' '.join(parts[:-1])
-                query_time = datetime.strptime(time_str, "%I:%M %p").time()
-                print_single_package_status_at_time(package_table, package_id, query_time, trucks)
-            except ValueError:
-                print("Invalid input. Please enter time as HH:MM AM/PM and a valid package ID (e.g., '9:15 AM 12').")
+        try:
+            query_time, package_id = parse_query(user_input)
+        except ValueError:
+            print("Invalid input. Enter a time as HH:MM AM/PM (e.g., 9:15 AM), '9:15 AM 12' for one package, "
+                  "or 'help'.")
             continue
-        elif len(parts) >= 2:
-            # Try to parse as time and package ID
-            try:
-                package_id = int(parts[-1])
-                time_str = ' '.join(parts[:-1])
-                query_time = datetime.strptime(time_str, "%I:%M %p").time()
-                print_single_package_status_at_time(package_table, package_id, query_time, trucks)
-            except ValueError:
-                # Try as just time for all packages
-                try:
-                    query_time = datetime.strptime(user_input, "%I:%M %p").time()
-                    print_package_status_at_time(package_table, query_time, trucks)
-                except ValueError:
-                    print("Invalid time format. Please enter time as HH:MM AM/PM (e.g., 9:15 AM) or '9:15 AM 12' for a specific package.")
-            continue
-        else:
-            # Try as just time for all packages
-            try:
-                query_time = datetime.strptime(user_input, "%I:%M %p").time()
-                print_package_status_at_time(package_table, query_time, trucks)
-            except ValueError:
-                print("Invalid input. Please enter a valid command, time, or 'exit'.")
-    
+        with METRICS.timer('query'):
+            if package_id is None:
+                print_package_status_at_time(package_table, query_time, timeline, rules, projection)
+            else:
+                print_single_package_status_at_time(package_table, package_id, query_time, timeline, rules)
+
     # Print total mileage on exit
     total_miles = sum(truck.miles_traveled for truck in trucks)
     print(f"\nTotal mileage traveled by all trucks: {total_miles:.2f} miles")
 
+def run(batch=None, output=None, fmt='csv', fleet_file=None, optimize_seconds=None):
+    package_table, trucks, rules, timeline = plan_day(fleet_file, optimize_seconds)
+    if batch is not None:
+        run_batch(batch, output, fmt, package_table, timeline, rules)
+    else:
+        run_interactive(package_table, trucks, rules, timeline)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WGUPS package delivery simulator")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="answer 'time,package_id' queries from FILE ('-' for stdin) instead of prompting")
+    parser.add_argument('--format', choices=FORMATS, default='csv', help="batch output format")
+    parser.add_argument('--output', metavar='FILE', help="write batch results to FILE instead of stdout")
+    parser.add_argument('--fleet', metavar='FILE', help="JSON depots and trucks configuration (default: one hub)")
+    parser.add_argument('--optimize', type=float, metavar='SECONDS',
+                        help="spend up to SECONDS moving packages between trucks to cut total mileage")
+    parser.add_argument('--metrics', choices=('json', 'prometheus'),
+                        help="record stage timings and counters and export them on exit")
+    parser.add_argument('--metrics-file', help="write metrics here instead of stderr")
+    parser.add_argument('--profile', metavar='PATH', help="run under cProfile and save stats to PATH")
+    parser.add_argument('--tracemalloc', action='store_true', help="report peak memory and top allocation sites")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        METRICS.enable()
+    with contextlib.ExitStack() as stack:
+        if args.profile:
+            stack.enter_context(profiled(args.profile))
+        if args.tracemalloc:
+            stack.enter_context(traced_allocations())
+        run(args.batch, args.output, args.format, args.fleet, args.optimize)
+
+    if args.metrics:
+        report = METRICS.export(args.metrics)
+        if args.metrics_file:
+            with open(args.metrics_file, 'w') as file:
+                file.write(report)
+        else:
+            print(report, file=sys.stderr)
+
 if __name__ == "__main__":
     main()
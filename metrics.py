@@ -0,0 +1,274 @@
+# Opt-in timing, counters and profiling for WGUPS runs
+
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left
+
+from distance import DistanceMatrix
+from hash_table import HashTable
+
+# Histogram bucket upper bounds in seconds (Prometheus 'le' labels)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+PROMETHEUS_PREFIX = 'wgups'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in seconds"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'total')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def cumulative(self):
+        """[(upper bound, observations at or below it)], ending with +Inf"""
+        running = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Metrics:
+    """
+    Registry of per-stage latency histograms and counters. Disabled by
+    default: timer() then hands back a shared no-op context manager and
+    incr()/observe() return after one attribute check, so instrumented code
+    costs next to nothing unless a run opts in.
+
+    Hot-path structures (hash table probes, distance lookups) keep their own
+    plain integer counters and are read through collectors at export time
+    rather than calling into the registry on every operation.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.stages = {}  # stage -> Histogram
+        self.counters = {}  # (name, ((label, value), ...)) -> number
+        self._collectors = []
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def timer(self, stage):
+        """Context manager recording the wall-clock time of one stage"""
+        return _StageTimer(self, stage) if self.enabled else _NULL_TIMER
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def incr(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_collector(self, collector):
+        """collector() returns [(name, labels dict, value)] read at export time"""
+        self._collectors.append(collector)
+
+    def _all_counters(self):
+        counters = dict(self.counters)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+        return counters
+
+    # --- EXPORT ---
+
+    def to_dict(self):
+        counters = self._all_counters()
+        hit_rates = {}
+        for (name, labels), value in counters.items():
+            if name != 'cache_requests':
+                continue
+            label_map = dict(labels)
+            cache = label_map.get('cache')
+            hits, total = hit_rates.get(cache, (0, 0))
+            hit_rates[cache] = (hits + (value if label_map.get('result') == 'hit' else 0), total + value)
+        return {
+            'stages': {
+                stage: {
+                    'count': histogram.count,
+                    'sum_seconds': histogram.total,
+                    'mean_seconds': histogram.total / histogram.count if histogram.count else 0.0,
+                    'buckets': {_format_bound(bound): count for bound, count in histogram.cumulative()},
+                }
+                for stage, histogram in sorted(self.stages.items())
+            },
+            'counters': {_format_key(name, labels): value for (name, labels), value in sorted(counters.items())},
+            'cache_hit_rate': {cache: hits / total for cache, (hits, total) in sorted(hit_rates.items()) if total},
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Prometheus text exposition format"""
+        lines = []
+        if self.stages:
+            metric = f"{prefix}_stage_seconds"
+            lines.append(f"# HELP {metric} Wall-clock seconds per planning stage")
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, histogram in sorted(self.stages.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{_format_bound(bound)}"}} {count}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+        by_name = {}
+        for (name, labels), value in sorted(self._all_counters().items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name, samples in by_name.items():
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, fmt):
+        if fmt == 'json':
+            return self.to_json()
+        if fmt == 'prometheus':
+            return self.to_prometheus()
+        raise ValueError(f"Unknown metrics format: {fmt!r}")
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _format_key(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f"{key}={value}" for key, value in labels) + '}'
+
+
+# Process-wide registry used by main, fleet and snapshot
+METRICS = Metrics()
+
+
+# --- INSTRUMENTED DATA STRUCTURES ---
+
+class CountingHashTable(HashTable):
+    """HashTable that counts lookups and the slots each lookup probes"""
+
+    def __init__(self, size=40, max_load=0.7):
+        super().__init__(size, max_load)
+        self.lookups = 0
+        self.probes = 0
+
+    def lookup(self, key):
+        self.lookups += 1
+        self.probes += self.probe_count(key)
+        return super().lookup(key)
+
+    def counters(self):
+        return [('hash_lookups', {}, self.lookups), ('hash_probes', {}, self.probes)]
+
+
+class CountingDistanceMatrix(DistanceMatrix):
+    """DistanceMatrix that counts every pairwise distance it reads"""
+
+    def __init__(self, size, packed):
+        super().__init__(size, packed)
+        self.lookups = 0
+
+    @classmethod
+    def wrap(cls, matrix):
+        return cls(matrix.size, matrix._data)
+
+    def distance(self, i, j):
+        self.lookups += 1
+        return super().distance(i, j)
+
+    def distances_from(self, origin, targets):
+        result = super().distances_from(origin, targets)
+        self.lookups += len(result)
+        return result
+
+    def nearest(self, origin, candidates):
+        candidates = list(candidates)
+        self.lookups += len(candidates)
+        return super().nearest(origin, candidates)
+
+    def counters(self):
+        return [('distance_lookups', {}, self.lookups)]
+
+
+# --- PROFILING ---
+
+@contextlib.contextmanager
+def profiled(path, limit=25, stream=sys.stderr):
+    """Run the block under cProfile, save stats to path and print the top functions"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(limit)
+        print(report.getvalue(), file=stream)
+
+
+@contextlib.contextmanager
+def traced_allocations(limit=15, stream=sys.stderr):
+    """Run the block under tracemalloc and print peak memory and the top allocation sites"""
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Peak traced memory: {peak / 2**20:.1f} MB", file=stream)
+        for stat in snapshot.statistics('lineno')[:limit]:
+            print(f"  {stat}", file=stream)
@@ -0,0 +1,431 @@
+# Anytime whole-fleet plan improvement by adaptive large neighborhood search
+
+import math
+import random
+import time
+from collections import namedtuple
+
+from assignment import DEADLINE_RISK_MILES, TruckLimits, build_units
+from fleet import DEFAULT_MAX_MOVES, FleetPlanner, plan_truck, truck_job
+from scenarios import plan_kpis
+from scheduler import LATENESS_MILES_PER_MINUTE
+from time_windows import EPSILON
+
+DEFAULT_ITERATIONS = 500
+DEFAULT_SEED = 0
+# Objective terms besides miles driven, in miles
+LATE_PACKAGE_MILES = 50.0
+UNDELIVERED_MILES = 1000.0
+# Each destroy removes 1 to REMOVAL_FRACTION of the units, at most MAX_REMOVED
+REMOVAL_FRACTION = 0.25
+MAX_REMOVED = 10
+# Ranked removals take rank int(n * random() ** REMOVAL_DETERMINISM): usually near the top, not always
+REMOVAL_DETERMINISM = 3
+# Operator scores for producing a new best, an improvement on the current
+# plan, or an accepted worse plan not seen before; weights move towards the
+# average score per use by REACTION after every SEGMENT_ITERATIONS
+NEW_BEST_SCORE = 33
+IMPROVED_SCORE = 9
+ACCEPTED_SCORE = 13
+SEGMENT_ITERATIONS = 25
+REACTION = 0.1
+MIN_WEIGHT = 0.01
+# Repairs add up to this fraction of the longest distance to each insertion
+# estimate at random, so a removed unit does not always return to its truck
+INSERTION_NOISE = 0.1
+# Simulated annealing starts where a plan START_WORSE_FRACTION costlier than
+# the first is accepted half the time, and cools by COOLING per iteration
+START_WORSE_FRACTION = 0.05
+COOLING = 0.995
+# After this many iterations without a new best, restart from the best plan at the starting temperature
+REHEAT_ITERATIONS = 250
+# Planned trips and evaluated plans are cached up to this many entries each
+CACHE_SIZE = 20000
+
+# cost is miles plus the late and undelivered penalties; late_packages is a tuple of package IDs
+PlanCost = namedtuple('PlanCost', ['cost', 'miles', 'late_packages', 'late_minutes', 'undelivered'])
+OperatorStats = namedtuple('OperatorStats', ['uses', 'weight'])
+# evaluations counts distinct plans priced and cached_trips the truck plans reused;
+# reheats counts restarts from the best plan after REHEAT_ITERATIONS without progress;
+# history lists (iteration, seconds, PlanCost) for the first plan and every new best;
+# operators maps each destroy and repair operator name -> OperatorStats
+OptimizerStats = namedtuple('OptimizerStats', ['iterations', 'evaluations', 'cached_trips', 'accepted',
+                                               'improvements', 'reheats', 'seconds', 'initial_cost', 'best_cost',
+                                               'history', 'operators'])
+# state is a scenarios.PlanState fork holding the best assignment found
+OptimizeResult = namedtuple('OptimizeResult', ['state', 'cost', 'stats'])
+# One evaluated plan: its PlanCost, the miles saved by dropping each placed
+# unit from its route, and the units with a late package
+_Evaluation = namedtuple('_Evaluation', ['cost', 'detours', 'late_units'])
+
+
+def plan_cost(miles, late, undelivered):
+    """PlanCost for a plan's miles, late (package_id -> minutes late) and undelivered package count"""
+    late_minutes = sum(late.values())
+    cost = (miles + LATE_PACKAGE_MILES * len(late) + LATENESS_MILES_PER_MINUTE * late_minutes
+            + UNDELIVERED_MILES * undelivered)
+    return PlanCost(cost, miles, tuple(sorted(late)), late_minutes, undelivered)
+
+
+class FleetOptimizer:
+    """
+    Improves which truck carries which packages across the whole fleet,
+    which assignment.solve_assignment decides once and never revisits.
+
+    Adaptive large neighborhood search over grouping units (see
+    assignment.build_units): each iteration a destroy operator takes a few
+    units off their trucks and a repair operator puts them back, and the
+    result is planned with the real trip splitter, driver schedule and
+    route polishing and priced by plan_cost. Simulated annealing decides
+    whether to keep it, and operators that find better plans are picked
+    more often. Units stay whole and only go to trucks they may ride on,
+    within package count, weight and shift limits; missed deadlines are
+    priced heavily enough that a plan with more late packages never beats
+    one with fewer over a realistic mileage difference.
+
+    Each truck's trips are cached by its package set, so an iteration only
+    replans the trucks it changed. The search is anytime: it stops at
+    max_iterations or time_budget, whichever comes first, and returns the
+    best plan so far. For a given seed and iteration count the result is
+    reproducible; a time budget alone depends on machine speed.
+    """
+
+    def __init__(self, state, router, seed=DEFAULT_SEED, max_moves=DEFAULT_MAX_MOVES):
+        self.state = state
+        self.router = router
+        self.seed = seed
+        self.max_moves = max_moves
+        self.truck_ids = sorted(state.trucks)
+        self.capacities = {truck_id: truck.capacity * truck.max_trips for truck_id, truck in state.trucks.items()}
+        self.limits = {truck_id: TruckLimits(truck.max_weight, truck.max_trips, truck.shift_end)
+                       for truck_id, truck in state.trucks.items()}
+        self.planner = FleetPlanner(router, workers=1, max_moves=max_moves, drivers=dict(state.drivers),
+                                    reload_minutes=state.reload_minutes)
+
+        rules = state.rules
+        start_time = min(truck.shift_start for truck in state.trucks.values())
+        self.units, _ = build_units([state.packages[package_id] for package_id in sorted(state.packages)],
+                                    lambda package: router.address_index(rules.delivery_address(package)),
+                                    rules, start_time)
+        self.unit_of = {package_id: index for index, unit in enumerate(self.units) for package_id in unit.package_ids}
+
+        # Packages outside every unit (never deliverable) stay where they are
+        truck_of = {}
+        self.fixed = {}
+        for truck_id in self.truck_ids:
+            package_ids = state.assignment.get(truck_id, ())
+            truck_of.update(dict.fromkeys(package_ids, truck_id))
+            self.fixed[truck_id] = tuple(p for p in package_ids if p not in self.unit_of)
+        self.initial = tuple(truck_of.get(unit.package_ids[0]) for unit in self.units)
+        distances = router.distances
+        self.noise_miles = INSERTION_NOISE * max((distances.distance(i, j) for i in range(distances.size)
+                                                  for j in range(i)), default=0.0)
+        self.max_removed = max(1, min(MAX_REMOVED, round(len(self.units) * REMOVAL_FRACTION)))
+
+        self.destroy_operators = {
+            'random': self._random_removal,
+            'worst': self._worst_removal,
+            'related': self._related_removal,
+            'late': self._late_removal,
+        }
+        self.repair_operators = {
+            'greedy': self._greedy_insertion,
+            'regret': self._regret_insertion,
+        }
+        self._trips = {}
+        self._evaluations = {}
+        self._evaluated = 0
+        self._cached_trips = 0
+
+    # --- SEARCH ---
+
+    def optimize(self, time_budget=None, max_iterations=DEFAULT_ITERATIONS, on_best=None):
+        """
+        Search for up to max_iterations iterations and/or time_budget
+        seconds (at least one must be set). on_best(iteration, PlanCost,
+        state) is called with a PlanState fork each time a new best plan is
+        found. Returns OptimizeResult.
+        """
+        if time_budget is None and max_iterations is None:
+            raise ValueError("Set a time budget, an iteration limit or both")
+        rng = random.Random(self.seed)
+        # Which plans count as seen before affects operator scores, so each run starts afresh
+        self._evaluations.clear()
+        self._evaluated = self._cached_trips = 0
+        start = time.perf_counter()
+        stop_at = None if time_budget is None else start + time_budget
+
+        current = best = self.initial
+        current_eval = best_eval = self._evaluate(current)
+        start_temperature = max(START_WORSE_FRACTION * current_eval.cost.cost / math.log(2), EPSILON)
+        temperature = start_temperature
+        history = [(0, time.perf_counter() - start, current_eval.cost)]
+
+        names = list(self.destroy_operators) + list(self.repair_operators)
+        weights = dict.fromkeys(names, 1.0)
+        uses = dict.fromkeys(names, 0)
+        segment_scores = dict.fromkeys(names, 0.0)
+        segment_uses = dict.fromkeys(names, 0)
+        iterations = accepted = improvements = reheats = 0
+        stalled_since = 0
+        searchable = len(self.truck_ids) > 1 and self.units
+
+        while searchable and (max_iterations is None or iterations < max_iterations):
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                break
+            iterations += 1
+            destroy = rng.choices(list(self.destroy_operators), [weights[n] for n in self.destroy_operators])[0]
+            repair = rng.choices(list(self.repair_operators), [weights[n] for n in self.repair_operators])[0]
+
+            location = list(current)
+            removed = self.destroy_operators[destroy](rng, location, current_eval, rng.randint(1, self.max_removed))
+            self.repair_operators[repair](rng, location, removed)
+            candidate = tuple(location)
+            seen = candidate in self._evaluations
+            evaluation = self._evaluate(candidate)
+
+            score = 0
+            cost, current_cost = evaluation.cost.cost, current_eval.cost.cost
+            if cost < best_eval.cost.cost - EPSILON:
+                best = current = candidate
+                best_eval = current_eval = evaluation
+                accepted += 1
+                improvements += 1
+                stalled_since = iterations
+                score = NEW_BEST_SCORE
+                history.append((iterations, time.perf_counter() - start, evaluation.cost))
+                if on_best is not None:
+                    on_best(iterations, evaluation.cost, self.state_for(best))
+            elif cost < current_cost - EPSILON:
+                current, current_eval = candidate, evaluation
+                accepted += 1
+                score = IMPROVED_SCORE
+            elif candidate != current and rng.random() < math.exp((current_cost - cost) / temperature):
+                current, current_eval = candidate, evaluation
+                accepted += 1
+                score = 0 if seen else ACCEPTED_SCORE
+
+            for name in (destroy, repair):
+                uses[name] += 1
+                segment_uses[name] += 1
+                segment_scores[name] += score
+            temperature = max(temperature * COOLING, EPSILON)
+            if iterations - stalled_since >= REHEAT_ITERATIONS:
+                current, current_eval = best, best_eval
+                temperature = start_temperature
+                stalled_since = iterations
+                reheats += 1
+            if iterations % SEGMENT_ITERATIONS == 0:
+                for name in names:
+                    if segment_uses[name]:
+                        weights[name] = max((1 - REACTION) * weights[name]
+                                            + REACTION * segment_scores[name] / segment_uses[name], MIN_WEIGHT)
+                    segment_scores[name], segment_uses[name] = 0.0, 0
+
+        stats = OptimizerStats(iterations, self._evaluated, self._cached_trips, accepted, improvements,
+                               reheats, time.perf_counter() - start, history[0][2], best_eval.cost, tuple(history),
+                               {name: OperatorStats(uses[name], weights[name]) for name in names})
+        return OptimizeResult(self.state_for(best), best_eval.cost, stats)
+
+    def state_for(self, location):
+        """A fork of the input PlanState with the assignment given by location"""
+        state = self.state.fork()
+        for truck_id, package_ids in self._members(location).items():
+            state.assignment[truck_id] = package_ids
+        return state
+
+    # --- EVALUATION ---
+
+    def _members(self, location):
+        """truck_id -> sorted package IDs for a location (each unit's truck, or None if unplaced)"""
+        members = {truck_id: list(self.fixed[truck_id]) for truck_id in self.truck_ids}
+        for unit, truck_id in zip(self.units, location):
+            if truck_id is not None:
+                members[truck_id].extend(unit.package_ids)
+        return {truck_id: tuple(sorted(package_ids)) for truck_id, package_ids in members.items()}
+
+    def _evaluate(self, location):
+        evaluation = self._evaluations.get(location)
+        if evaluation is not None:
+            return evaluation
+        state = self.state
+        jobs = []
+        trips = []
+        for truck_id, package_ids in self._members(location).items():
+            job = truck_job(state.trucks[truck_id], package_ids, state.packages.get, self.router, state.rules,
+                            state.reload_minutes)
+            key = (truck_id, package_ids)
+            job_trips = self._trips.get(key)
+            if job_trips is None:
+                if len(self._trips) >= CACHE_SIZE:
+                    self._trips.clear()
+                job_trips = self._trips[key] = plan_truck(self.router, job, self.max_moves)
+            else:
+                self._cached_trips += 1
+            jobs.append(job)
+            trips.append(job_trips)
+        plans = self.planner.schedule(jobs, trips)
+        miles, late, _, delivered = plan_kpis(jobs, plans)
+
+        # Miles saved by skipping each stop, summed per unit
+        dist = self.router.distances.distance
+        detours = [0.0] * len(self.units)
+        for job, plan in zip(jobs, plans):
+            hub = self.router.hub if job.hub is None else job.hub
+            for trip in plan.trips:
+                path = [hub] + [address_index for _, address_index in trip.route] + [hub]
+                for position, (package_id, address_index) in enumerate(trip.route):
+                    before, after = path[position], path[position + 2]
+                    unit = self.unit_of.get(package_id)
+                    if unit is not None:
+                        detours[unit] += dist(before, address_index) + dist(address_index, after) - dist(before, after)
+        late_units = sorted({self.unit_of[p] for p in late if p in self.unit_of})
+
+        if len(self._evaluations) >= CACHE_SIZE:
+            self._evaluations.clear()
+        self._evaluated += 1
+        evaluation = self._evaluations[location] = _Evaluation(
+            plan_cost(miles, late, len(state.packages) - delivered), detours, late_units)
+        return evaluation
+
+    # --- DESTROY OPERATORS ---
+    # Each takes up to count units off their trucks in location and returns
+    # them, along with any unit that was already unplaced
+
+    @staticmethod
+    def _placed(location):
+        return [unit for unit, truck_id in enumerate(location) if truck_id is not None]
+
+    @staticmethod
+    def _remove(location, chosen):
+        unplaced = [unit for unit, truck_id in enumerate(location) if truck_id is None]
+        for unit in chosen:
+            location[unit] = None
+        return unplaced + list(chosen)
+
+    @staticmethod
+    def _take_ranked(rng, ranked, count):
+        """Pop count entries from ranked, favouring the front"""
+        chosen = []
+        while ranked and len(chosen) < count:
+            chosen.append(ranked.pop(int(len(ranked) * rng.random() ** REMOVAL_DETERMINISM)))
+        return chosen
+
+    def _random_removal(self, rng, location, evaluation, count):
+        placed = self._placed(location)
+        return self._remove(location, rng.sample(placed, min(count, len(placed))))
+
+    def _worst_removal(self, rng, location, evaluation, count):
+        """Units whose stops add the most miles to their routes"""
+        ranked = sorted(self._placed(location), key=lambda unit: (-evaluation.detours[unit], unit))
+        return self._remove(location, self._take_ranked(rng, ranked, count))
+
+    def _related_removal(self, rng, location, evaluation, count):
+        """A random unit and the units closest to it, whichever trucks they are on"""
+        placed = self._placed(location)
+        if not placed:
+            return self._remove(location, [])
+        seed = rng.choice(placed)
+        dist = self.router.distances.distance
+        seed_addresses = self.units[seed].address_indices
+
+        def closeness(unit):
+            return min(dist(a, b) for a in seed_addresses for b in self.units[unit].address_indices)
+
+        ranked = sorted((unit for unit in placed if unit != seed), key=lambda unit: (closeness(unit), unit))
+        return self._remove(location, [seed] + self._take_ranked(rng, ranked, count - 1))
+
+    def _late_removal(self, rng, location, evaluation, count):
+        """Units with late packages, topped up at random"""
+        late = [unit for unit in evaluation.late_units if location[unit] is not None]
+        chosen = rng.sample(late, min(count, len(late)))
+        others = [unit for unit in self._placed(location) if unit not in chosen]
+        chosen += rng.sample(others, min(count - len(chosen), len(others)))
+        return self._remove(location, chosen)
+
+    # --- REPAIR OPERATORS ---
+    # Each places the removed units back onto feasible trucks in location;
+    # a unit that fits nowhere stays unplaced
+
+    def _truck_state(self, location):
+        """(stops, load, weight, risk) per truck: addresses on board plus its hub, packages, weight, deadline risk"""
+        stops = {}
+        load = {}
+        weight = {}
+        risk = {}
+        packages = self.state.packages
+        for truck_id in self.truck_ids:
+            truck = self.state.trucks[truck_id]
+            stops[truck_id] = {self.router.hub if truck.hub is None else truck.hub}
+            load[truck_id] = len(self.fixed[truck_id])
+            weight[truck_id] = sum(float(packages[p].weight or 0) for p in self.fixed[truck_id])
+            risk[truck_id] = 0.0
+        for unit, truck_id in zip(self.units, location):
+            if truck_id is not None:
+                stops[truck_id].update(unit.address_indices)
+                load[truck_id] += len(unit)
+                weight[truck_id] += unit.weight
+                risk[truck_id] += unit.risk()
+        return stops, load, weight, risk
+
+    def _insertion_costs(self, rng, unit, stops, load, weight, risk):
+        """[(estimated miles, truck_id)] for every truck unit may go on, cheapest first, with noise"""
+        nearest = self.router.candidates.nearest
+        unit_risk = unit.risk()
+        costs = []
+        for truck_id in self.truck_ids:
+            if unit.allowed_trucks is not None and truck_id not in unit.allowed_trucks:
+                continue
+            if load[truck_id] + len(unit) > self.capacities[truck_id]:
+                continue
+            if not unit.fits(self.limits[truck_id], weight[truck_id]):
+                continue
+            miles = sum(nearest(address_index, stops[truck_id])[1] for address_index in unit.address_indices)
+            estimate = miles + DEADLINE_RISK_MILES * risk[truck_id] * unit_risk
+            costs.append((estimate + self.noise_miles * rng.random(), truck_id))
+        costs.sort()
+        return costs
+
+    def _place(self, location, index, truck_id, stops, load, weight, risk):
+        unit = self.units[index]
+        location[index] = truck_id
+        stops[truck_id].update(unit.address_indices)
+        load[truck_id] += len(unit)
+        weight[truck_id] += unit.weight
+        risk[truck_id] += unit.risk()
+
+    def _greedy_insertion(self, rng, location, removed):
+        """Most constrained units first (random among equals), each on its cheapest truck"""
+        stops, load, weight, risk = self._truck_state(location)
+        order = list(removed)
+        rng.shuffle(order)
+        order.sort(key=lambda index: (self.units[index].allowed_trucks is None, -len(self.units[index])))
+        for index in order:
+            costs = self._insertion_costs(rng, self.units[index], stops, load, weight, risk)
+            if costs:
+                self._place(location, index, costs[0][1], stops, load, weight, risk)
+
+    def _regret_insertion(self, rng, location, removed):
+        """Repeatedly place the unit that loses most by missing its cheapest truck"""
+        stops, load, weight, risk = self._truck_state(location)
+        pending = set(removed)
+        while pending:
+            choice = None
+            for index in sorted(pending):
+                costs = self._insertion_costs(rng, self.units[index], stops, load, weight, risk)
+                if not costs:
+                    continue
+                regret = costs[1][0] - costs[0][0] if len(costs) > 1 else float('inf')
+                if choice is None or regret > choice[0]:
+                    choice = (regret, index, costs[0][1])
+            if choice is None:
+                break
+            _, index, truck_id = choice
+            self._place(location, index, truck_id, stops, load, weight, risk)
+            pending.discard(index)
+
+
+def optimize_plan(state, router, time_budget=None, max_iterations=DEFAULT_ITERATIONS, seed=DEFAULT_SEED,
+                  on_best=None, max_moves=DEFAULT_MAX_MOVES):
+    """Run a FleetOptimizer over a scenarios.PlanState; returns OptimizeResult"""
+    return FleetOptimizer(state, router, seed, max_moves).optimize(time_budget, max_iterations, on_best)
@@ -1,19 +1,58 @@
 # Package class for WGUPS Routing Program
 
+from enum import Enum
+from utils import minutes_to_str, parse_deadline
+
+
+class PackageStatus(Enum):
+    """Delivery status of a package; members are singletons, so compare with 'is'"""
+    AT_HUB = 'At Hub'
+    ASSIGNED = 'Assigned to Truck'
+    DELAYED = 'Delayed - Not Available'
+    WRONG_ADDRESS = 'Wrong Address - Cannot Deliver'
+    EN_ROUTE = 'En Route'
+    DELIVERED = 'Delivered'
+
+    def __str__(self):
+        return self.value
+
+
 class Package:
+    """
+    One package record. __slots__ keeps each record to a fixed set of
+    attributes with no per-instance dict. Times (due, available_time,
+    delivery_time) are integer minutes since midnight, or None; deadline
+    keeps the manifest text for display and due is parsed from it once.
+    constraints holds the rules.parse_note result for note, set once at
+    load (None until then).
+    """
+
+    __slots__ = ('id', 'address', 'city', 'zip_code', 'deadline', 'due', 'weight', 'note',
+                 'status', 'delivery_time', 'truck', 'original_address',
+                 'available_time', 'group_with', 'constraints')
+
     def __init__(self, package_id, address, city, zip_code, deadline, weight, note=""):
         self.id = int(package_id)
         self.address = address
         self.city = city
-        self.zip = zip_code
+        self.zip_code = zip_code
         self.deadline = deadline
+        self.due = parse_deadline(deadline)  # None means end of day
         self.weight = weight
         self.note = note
-        self.status = "At the hub"
+        self.status = PackageStatus.AT_HUB
         self.delivery_time = None
         self.truck = None
+        self.original_address = address  # Address as listed on the manifest
+        self.available_time = None  # For delayed packages
+        self.group_with = ()  # IDs of packages that must be delivered together
+        self.constraints = None  # Typed rules from note, parsed once
+
+    def __repr__(self):
+        return f"Package({self.id}, {self.address!r}, status={self.status.name})"
 
     def __str__(self):
-        return (f"Package {self.id}: {self.address}, {self.city} {self.zip}, "
+        delivered = minutes_to_str(self.delivery_time) if self.delivery_time is not None else 'N/A'
+        return (f"Package {self.id}: {self.address}, {self.city} {self.zip_code}, "
                 f"Deadline: {self.deadline}, Weight: {self.weight}kg, "
-                f"Status: {self.status} at {self.delivery_time if self.delivery_time else 'N/A'}")
+                f"Status: {self.status} at {delivered}")
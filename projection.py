@@ -0,0 +1,267 @@
+# Columnar whole-fleet status snapshots computed from the delivery timeline
+
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+
+from package import PackageStatus
+from utils import minutes_to_str
+
+try:
+    import numpy
+except ImportError:  # Optional: snapshots fall back to array-backed columns
+    numpy = None
+
+INFINITY = float('inf')
+NO_TRUCK = 0
+
+
+class StatusCode(IntEnum):
+    """Compact status codes stored in snapshot columns"""
+    AT_HUB = 0
+    EN_ROUTE = 1
+    DELIVERED = 2
+    DELAYED = 3
+    WRONG_ADDRESS = 4
+
+
+STATUS_NAMES = {
+    StatusCode.AT_HUB: 'At Hub',
+    StatusCode.EN_ROUTE: str(PackageStatus.EN_ROUTE),
+    StatusCode.DELIVERED: str(PackageStatus.DELIVERED),
+    StatusCode.DELAYED: str(PackageStatus.DELAYED),
+    StatusCode.WRONG_ADDRESS: str(PackageStatus.WRONG_ADDRESS),
+}
+
+
+class StatusSnapshot:
+    """
+    Package state at one time as parallel columns: package_ids, trucks
+    (NO_TRUCK if unassigned), codes (StatusCode values) and delivery_times
+    (minutes, inf if not delivered yet). rows are the projection row numbers
+    the columns were taken from. Columns are NumPy arrays when NumPy is
+    installed and array.array otherwise.
+    """
+
+    __slots__ = ('time', 'rows', 'package_ids', 'trucks', 'codes', 'delivery_times')
+
+    def __init__(self, time, rows, package_ids, trucks, codes, delivery_times):
+        self.time = time
+        self.rows = rows
+        self.package_ids = package_ids
+        self.trucks = trucks
+        self.codes = codes
+        self.delivery_times = delivery_times
+
+    def __len__(self):
+        return len(self.package_ids)
+
+    def counts(self):
+        """{StatusCode: number of packages}"""
+        counts = dict.fromkeys(StatusCode, 0)
+        for code in self.codes:
+            counts[StatusCode(int(code))] += 1
+        return counts
+
+    def to_columns(self):
+        """Plain lists per column, e.g. for JSON; undelivered times become None"""
+        return {
+            'time': self.time,
+            'package_id': [int(value) for value in self.package_ids],
+            'truck': [int(value) or None for value in self.trucks],
+            'status': [int(value) for value in self.codes],
+            'delivery_minute': [None if value == INFINITY else float(value) for value in self.delivery_times],
+        }
+
+
+class StatusProjection:
+    """
+    Columnar view of a planned day for whole-fleet status queries.
+
+    Each package's status only changes at a handful of fixed times (its
+    address is corrected, its flight lands, it is loaded, it is delivered),
+    so those are read from the RuleBook and DeliveryTimeline once into
+    per-row columns. A snapshot at T is then one vectorized comparison of
+    those columns against T, with no per-package event lookups or string
+    work. Rows are in package ID order.
+
+    Filtered views use indexes built alongside the columns: rows per truck,
+    rows sorted by deadline, load time and delivery time, and the short
+    lists of delayed and wrong-address rows, so selecting by truck, status
+    or deadline does not scan the fleet.
+    """
+
+    def __init__(self, packages, timeline, rules):
+        packages = sorted(packages, key=lambda pkg: pkg.id)
+        self.packages = packages
+        self.row_of = {pkg.id: row for row, pkg in enumerate(packages)}
+
+        ids = array('i')
+        trucks = array('i')
+        deadlines = array('d')
+        wrong_until = array('d')
+        delayed_until = array('d')
+        loaded_at = array('d')
+        delivered_at = array('d')
+        for pkg in packages:
+            ids.append(pkg.id)
+            trucks.append(timeline.package_truck(pkg.id) or pkg.truck or NO_TRUCK)
+            deadlines.append(INFINITY if pkg.due is None else pkg.due)
+            if pkg.id in rules.wrong_address:
+                change = rules.address_changes.get(pkg.id)
+                wrong_until.append(INFINITY if change is None else change.time)
+            else:
+                wrong_until.append(-INFINITY)
+            arrival = rules.available_at.get(pkg.id)
+            delayed_until.append(-INFINITY if arrival is None else arrival)
+            loaded = delivered = INFINITY
+            for event in timeline.package_events(pkg.id):
+                if event.status is PackageStatus.DELIVERED:
+                    delivered = min(delivered, event.time)
+                else:
+                    loaded = min(loaded, event.time)
+            loaded_at.append(min(loaded, delivered))
+            delivered_at.append(delivered)
+
+        self.package_ids = ids
+        self.trucks = trucks
+        self.deadlines = deadlines
+        self.wrong_until = wrong_until
+        self.delayed_until = delayed_until
+        self.loaded_at = loaded_at
+        self.delivered_at = delivered_at
+
+        # Indexes for filtered views
+        everyone = range(len(packages))
+        self.truck_rows = {}
+        for row in everyone:
+            self.truck_rows.setdefault(trucks[row], array('i')).append(row)
+        self._by_deadline = sorted(everyone, key=lambda row: (deadlines[row], row))
+        self._deadline_keys = [deadlines[row] for row in self._by_deadline]
+        self._by_loaded = sorted(everyone, key=lambda row: (loaded_at[row], row))
+        self._loaded_keys = [loaded_at[row] for row in self._by_loaded]
+        self._by_delivered = sorted(everyone, key=lambda row: (delivered_at[row], row))
+        self._delivered_keys = [delivered_at[row] for row in self._by_delivered]
+        self._wrong_rows = [row for row in everyone if wrong_until[row] > -INFINITY]
+        self._delayed_rows = [row for row in everyone if delayed_until[row] > -INFINITY]
+
+        if numpy is not None:
+            self._columns = {name: numpy.frombuffer(column, dtype=numpy.int32 if column.typecode == 'i' else numpy.float64)
+                             for name, column in (('package_ids', ids), ('trucks', trucks),
+                                                  ('wrong_until', wrong_until), ('delayed_until', delayed_until),
+                                                  ('loaded_at', loaded_at), ('delivered_at', delivered_at))}
+
+    def __len__(self):
+        return len(self.packages)
+
+    # --- SNAPSHOTS ---
+
+    def snapshot(self, query_time, rows=None):
+        """StatusSnapshot at query_time for all rows, or for the given row numbers in order"""
+        if numpy is not None:
+            return self._snapshot_numpy(query_time, rows)
+        return self._snapshot_python(query_time, rows)
+
+    def _snapshot_numpy(self, query_time, rows):
+        columns = self._columns
+        if rows is not None:
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            columns = {name: column[rows] for name, column in columns.items()}
+        delivered_at = columns['delivered_at']
+        codes = numpy.select(
+            [columns['wrong_until'] > query_time, columns['delayed_until'] > query_time,
+             delivered_at <= query_time, columns['loaded_at'] <= query_time],
+            [StatusCode.WRONG_ADDRESS, StatusCode.DELAYED, StatusCode.DELIVERED, StatusCode.EN_ROUTE],
+            StatusCode.AT_HUB).astype(numpy.int8)
+        delivery_times = numpy.where(codes == StatusCode.DELIVERED, delivered_at, INFINITY)
+        return StatusSnapshot(query_time, rows, columns['package_ids'], columns['trucks'], codes, delivery_times)
+
+    def _snapshot_python(self, query_time, rows):
+        if rows is None:
+            package_ids, trucks = self.package_ids, self.trucks
+            wrong_until, delayed_until = self.wrong_until, self.delayed_until
+            loaded_at, delivered_at = self.loaded_at, self.delivered_at
+        else:
+            def take(column):
+                return array(column.typecode, [column[row] for row in rows])
+            package_ids, trucks = take(self.package_ids), take(self.trucks)
+            wrong_until, delayed_until = take(self.wrong_until), take(self.delayed_until)
+            loaded_at, delivered_at = take(self.loaded_at), take(self.delivered_at)
+
+        wrong, delayed = int(StatusCode.WRONG_ADDRESS), int(StatusCode.DELAYED)
+        delivered, en_route, at_hub = int(StatusCode.DELIVERED), int(StatusCode.EN_ROUTE), int(StatusCode.AT_HUB)
+        codes = array('b', [wrong if w > query_time else
+                            delayed if d > query_time else
+                            delivered if t <= query_time else
+                            en_route if l <= query_time else at_hub
+                            for w, d, l, t in zip(wrong_until, delayed_until, loaded_at, delivered_at)])
+        delivery_times = array('d', [t if code == delivered else INFINITY for code, t in zip(codes, delivered_at)])
+        return StatusSnapshot(query_time, rows, package_ids, trucks, codes, delivery_times)
+
+    # --- FILTERED VIEWS ---
+
+    def rows_for_truck(self, truck_id):
+        return self.truck_rows.get(truck_id, array('i'))
+
+    def rows_due_by(self, minute):
+        """Rows with a deadline at or before minute, earliest deadline first"""
+        return self._by_deadline[:bisect_right(self._deadline_keys, minute)]
+
+    def _available(self, row, query_time):
+        return self.wrong_until[row] <= query_time and self.delayed_until[row] <= query_time
+
+    def rows_with_status(self, code, query_time):
+        """Rows whose status at query_time is code, in row order"""
+        code = StatusCode(code)
+        if code is StatusCode.WRONG_ADDRESS:
+            rows = [row for row in self._wrong_rows if self.wrong_until[row] > query_time]
+        elif code is StatusCode.DELAYED:
+            rows = [row for row in self._delayed_rows
+                    if self.delayed_until[row] > query_time and self.wrong_until[row] <= query_time]
+        elif code is StatusCode.DELIVERED:
+            rows = sorted(row for row in self._by_delivered[:bisect_right(self._delivered_keys, query_time)]
+                          if self._available(row, query_time))
+        elif code is StatusCode.EN_ROUTE:
+            # Loaded by query_time but not yet delivered
+            loaded = self._by_loaded[:bisect_right(self._loaded_keys, query_time)]
+            rows = sorted(row for row in loaded
+                          if self.delivered_at[row] > query_time and self._available(row, query_time))
+        else:
+            # Everything not loaded yet, less the delayed and wrong-address rows
+            waiting = self._by_loaded[bisect_right(self._loaded_keys, query_time):]
+            rows = sorted(row for row in waiting if self._available(row, query_time))
+        return rows
+
+    def view(self, query_time, truck=None, status=None, due_by=None):
+        """
+        StatusSnapshot at query_time restricted to one truck, one StatusCode
+        and/or deadlines at or before due_by (minutes). With no filters this
+        is the whole fleet.
+        """
+        selections = []
+        if truck is not None:
+            selections.append(self.rows_for_truck(truck))
+        if status is not None:
+            selections.append(self.rows_with_status(status, query_time))
+        if due_by is not None:
+            selections.append(self.rows_due_by(due_by))
+        if not selections:
+            return self.snapshot(query_time)
+        selections.sort(key=len)
+        rows = set(selections[0])
+        for selection in selections[1:]:
+            rows.intersection_update(selection)
+        return self.snapshot(query_time, sorted(rows))
+
+    # --- DISPLAY ---
+
+    def status_text(self, row, code, query_time):
+        """
+        The display status text for a projection row (snapshot.rows[i] for a
+        filtered view) with the given code, matching status.status_from_event
+        """
+        if code == StatusCode.DELAYED:
+            return f"Delayed on flight until {minutes_to_str(self.delayed_until[row])}"
+        if code == StatusCode.DELIVERED:
+            return f"Delivered at {minutes_to_str(self.delivered_at[row])}"
+        return STATUS_NAMES[StatusCode(code)]
@@ -0,0 +1,188 @@
+# Local-search route improvement (2-opt and Or-opt) for WGUPS routes
+
+import time
+
+HUB_INDEX = 0
+MAX_OR_OPT_SEGMENT = 3
+
+
+def group_stops(route):
+    """
+    Collapse a route of (package_id, address_index) pairs into stops of
+    (address_index, [package_ids]) so each address is visited once.
+    """
+    stops = []
+    positions = {}
+    for package_id, address_index in route:
+        if address_index in positions:
+            stops[positions[address_index]][1].append(package_id)
+        else:
+            positions[address_index] = len(stops)
+            stops.append((address_index, [package_id]))
+    return stops
+
+
+def flatten_stops(stops):
+    """Expand (address_index, [package_ids]) stops back into a (package_id, address_index) route"""
+    return [(package_id, address_index) for address_index, package_ids in stops for package_id in package_ids]
+
+
+def tour_length(stops, distances, hub=HUB_INDEX):
+    """Miles to visit the stops in order, starting and ending at the hub"""
+    dist = distances.distance
+    miles = 0.0
+    current = hub
+    for address_index, _ in stops:
+        miles += dist(current, address_index)
+        current = address_index
+    return miles + dist(current, hub)
+
+
+def _positions(tour):
+    """address_index -> position for every stop between the hub ends"""
+    return {stop[0]: position for position, stop in enumerate(tour[1:-1], 1)}
+
+
+def _two_opt_pass(tour, distances, accept, deadline, candidates=None, schedule=None):
+    """
+    Try every segment reversal once, applying the first one that shortens
+    the tour and is accepted. tour includes the hub at both ends.
+    With a CandidateIndex, only reversals that connect a stop to one of
+    its k nearest neighbors are tried. A schedule (time_windows.RouteSchedule
+    of the stops between the hub ends) rules out reversals that would miss
+    a deadline in O(1), before the candidate tour is built.
+    Returns True if a move was applied.
+    """
+    dist = distances.distance
+    last = len(tour) - 2
+    positions = _positions(tour) if candidates is not None else None
+    for i in range(1, last):
+        if deadline is not None and time.perf_counter() > deadline:
+            return False
+        a, b = tour[i - 1][0], tour[i][0]
+        if positions is None:
+            partners = range(i + 1, last + 1)
+        else:
+            # The new edge (a, c) must be shorter than (a, b) for a gain
+            ab = dist(a, b)
+            partners = sorted(positions[c] for c in candidates.neighbors(a)
+                              if c in positions and positions[c] > i and dist(a, c) < ab)
+        for j in partners:
+            c, d = tour[j][0], tour[j + 1][0]
+            delta = dist(a, c) + dist(b, d) - dist(a, b) - dist(c, d)
+            if delta < -1e-9:
+                if schedule is not None and not schedule.can_reverse(i - 1, j - 1):
+                    continue
+                candidate = tour[:i] + tour[i:j + 1][::-1] + tour[j + 1:]
+                if accept(candidate):
+                    tour[:] = candidate
+                    return True
+    return False
+
+
+def _insertion_edges(tour, positions, candidates, first, tail):
+    """Edges (by start position) touching a near neighbor of either segment end"""
+    edges = set()
+    for address_index in candidates.neighbors(first) + candidates.neighbors(tail):
+        position = positions.get(address_index)
+        if position is not None:
+            edges.add(position - 1)
+            edges.add(position)
+        elif address_index == tour[0][0]:
+            edges.add(0)
+            edges.add(len(tour) - 2)
+    return sorted(edges)
+
+
+def _or_opt_pass(tour, distances, accept, deadline, candidates=None, schedule=None):
+    """
+    Try moving every segment of 1..MAX_OR_OPT_SEGMENT consecutive stops to
+    every other edge of the tour, applying the first shortening, accepted move.
+    With a CandidateIndex, only edges next to one of the k nearest
+    neighbors of the segment's ends are tried. A schedule rules out moves
+    that would miss a deadline in O(1), as in _two_opt_pass.
+    Returns True if a move was applied.
+    """
+    dist = distances.distance
+    last = len(tour) - 2
+    positions = _positions(tour) if candidates is not None else None
+    for length in range(1, MAX_OR_OPT_SEGMENT + 1):
+        for i in range(1, last - length + 2):
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            j = i + length - 1
+            prev, first, tail, nxt = tour[i - 1][0], tour[i][0], tour[j][0], tour[j + 1][0]
+            removal_gain = dist(prev, first) + dist(tail, nxt) - dist(prev, nxt)
+            if positions is None:
+                edges = range(0, len(tour) - 1)
+            else:
+                edges = _insertion_edges(tour, positions, candidates, first, tail)
+            for k in edges:
+                if i - 1 <= k <= j:
+                    continue
+                a, b = tour[k][0], tour[k + 1][0]
+                delta = dist(a, first) + dist(tail, b) - dist(a, b) - removal_gain
+                if delta < -1e-9:
+                    if schedule is not None and not schedule.can_relocate(i - 1, j - 1, k - 1):
+                        continue
+                    segment = tour[i:j + 1]
+                    rest = tour[:i] + tour[j + 1:]
+                    insert_at = k + 1 if k < i else k + 1 - length
+                    candidate = rest[:insert_at] + segment + rest[insert_at:]
+                    if accept(candidate):
+                        tour[:] = candidate
+                        return True
+    return False
+
+
+def improve_route(stops, distances, accept=None, time_budget=None, max_iterations=None, hub=HUB_INDEX,
+                  candidates=None, schedule_for=None):
+    """
+    Improve a route with 2-opt and Or-opt moves until no shortening move
+    remains or the budget runs out.
+
+    stops is a list of (address_index, [package_ids]) in visiting order and
+    distances is a distance.DistanceMatrix.
+    Moves are scored with O(1) delta-cost lookups in the distance matrix;
+    accept(candidate_stops) is only consulted for moves that shorten the
+    route and can veto them (e.g. when they would make a package late).
+    time_budget is in seconds of wall-clock time and max_iterations caps
+    the number of applied moves.
+    candidates is an optional candidates.CandidateIndex; routes with more
+    stops than its k only try moves between near neighbors, so each pass
+    costs O(n * k) instead of O(n^2).
+    schedule_for(stops), when given, builds a time_windows.RouteSchedule of
+    an on-time route; it is built once per applied move and answers whether
+    each shortening move keeps every deadline in O(1).
+
+    Returns (improved_stops, moves_applied).
+    """
+    if len(stops) < 2:
+        return list(stops), 0
+
+    hub_stop = (hub, [])
+    tour = [hub_stop] + list(stops) + [hub_stop]
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+
+    if accept is None:
+        accept_tour = lambda candidate: True
+    else:
+        accept_tour = lambda candidate: accept(candidate[1:-1])
+
+    if candidates is not None and len(stops) <= candidates.k:
+        candidates = None  # Full neighborhoods are no larger than the candidate lists
+
+    moves = 0
+    while max_iterations is None or moves < max_iterations:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        schedule = schedule_for(tour[1:-1]) if schedule_for is not None else None
+        if _two_opt_pass(tour, distances, accept_tour, deadline, candidates, schedule):
+            moves += 1
+            continue
+        if _or_opt_pass(tour, distances, accept_tour, deadline, candidates, schedule):
+            moves += 1
+            continue
+        break
+
+    return tour[1:-1], moves
@@ -0,0 +1,176 @@
+# Routing engine that drives the WGUPS delivery simulation
+
+from candidates import CandidateIndex, DEFAULT_CANDIDATES
+from distance import DistanceMatrix, load_address_indices
+from timeline import DeliveryEvent, TRUCK_RETURNED
+from package import PackageStatus
+from route_optimizer import group_stops, flatten_stops, improve_route
+from time_windows import RouteSchedule
+
+HUB_INDEX = 0
+DEFAULT_SPEED_MPH = 18
+DEFAULT_OPTIMIZE_SECONDS = 0.5
+
+
+class RoutingEngine:
+    """
+    Loads the distance and address tables once into a compact, symmetric
+    DistanceMatrix plus an address -> index map, so every leg costs one O(1) lookup.
+    Routes are built with nearest neighbor and driven at a constant speed
+    to produce real mileage and arrival times. Every trip starts and ends
+    at the hub address index.
+    """
+
+    def __init__(self, distances, address_indices, speed_mph=DEFAULT_SPEED_MPH, candidate_count=DEFAULT_CANDIDATES,
+                 hub=HUB_INDEX):
+        self.distances = distances
+        self.address_indices = address_indices
+        self.speed_mph = speed_mph
+        self.candidate_count = candidate_count
+        self.hub = hub
+        self._candidates = None
+        self._variants = {}
+
+    def variant(self, hub=None, speed_mph=None):
+        """
+        A RoutingEngine for another depot or truck speed that shares this
+        engine's distance matrix and candidate index. None keeps the current value.
+        """
+        hub = self.hub if hub is None else hub
+        speed_mph = self.speed_mph if speed_mph is None else speed_mph
+        if hub == self.hub and speed_mph == self.speed_mph:
+            return self
+        engine = self._variants.get((hub, speed_mph))
+        if engine is None:
+            engine = RoutingEngine(self.distances, self.address_indices, speed_mph, self.candidate_count, hub)
+            engine._candidates = self.candidates
+            self._variants[(hub, speed_mph)] = engine
+        return engine
+
+    @property
+    def candidates(self):
+        """CandidateIndex of each address's nearest neighbors, built on first use"""
+        if self._candidates is None:
+            self._candidates = CandidateIndex(self.distances, self.candidate_count)
+        return self._candidates
+
+    @classmethod
+    def from_csv(cls, distance_file, address_file, speed_mph=DEFAULT_SPEED_MPH):
+        return cls(DistanceMatrix.from_csv(distance_file), load_address_indices(address_file), speed_mph)
+
+    def address_index(self, address):
+        """Return the matrix index for a street address"""
+        index = self.address_indices.get(address.strip())
+        if index is None:
+            raise KeyError(f"Unknown delivery address: {address}")
+        return index
+
+    def distance(self, from_index, to_index):
+        return self.distances.distance(from_index, to_index)
+
+    def travel_time(self, miles):
+        """Return the driving time for a distance in minutes"""
+        return miles / self.speed_mph * 60
+
+    def nearest_neighbor_route(self, stops, start=None):
+        """
+        Order (package_id, address_index) stops greedily, always driving to
+        the closest remaining address next. Packages sharing an address are
+        bucketed into one stop, and each step checks the current address's
+        candidate list before falling back to a scan of every remaining address.
+        """
+        remaining = {}
+        start = self.hub if start is None else start
+        for stop in stops:
+            remaining.setdefault(stop[1], []).append(stop)
+        candidates = self.candidates
+        route = []
+        current = start
+        while remaining:
+            current, _ = candidates.nearest(current, remaining)
+            route.extend(remaining.pop(current))
+        return route
+
+    def route_miles(self, route, start=None):
+        """Total miles to drive a route from start (default the hub) and back to the hub"""
+        miles = 0.0
+        current = self.hub if start is None else start
+        for _, address_index in route:
+            miles += self.distances.distance(current, address_index)
+            current = address_index
+        return miles + self.distances.distance(current, self.hub)
+
+    def lateness(self, stops, departure_time, deadlines):
+        """
+        Total minutes by which packages on (address_index, [package_ids]) stops
+        miss their deadlines when the route leaves the hub at departure_time.
+        Times are minutes since midnight; deadlines maps package_id -> minutes
+        (missing means end of day).
+        """
+        clock = departure_time
+        late_minutes = 0.0
+        current = self.hub
+        for address_index, package_ids in stops:
+            clock += self.travel_time(self.distances.distance(current, address_index))
+            current = address_index
+            for package_id in package_ids:
+                deadline = deadlines.get(package_id)
+                if deadline is not None and clock > deadline:
+                    late_minutes += clock - deadline
+        return late_minutes
+
+    def plan_route(self, stops, departure_time, deadlines=None,
+                   time_budget=DEFAULT_OPTIMIZE_SECONDS, max_iterations=None):
+        """
+        Build a route with nearest neighbor, then polish it with 2-opt and
+        Or-opt. Moves that would add lateness against deadlines are rejected.
+        Returns the ordered list of (package_id, address_index) stops.
+        """
+        return self.polish_route(self.nearest_neighbor_route(stops), departure_time, deadlines,
+                                 time_budget, max_iterations)
+
+    def polish_route(self, route, departure_time, deadlines=None,
+                     time_budget=DEFAULT_OPTIMIZE_SECONDS, max_iterations=None):
+        """
+        Improve a given (package_id, address_index) route with 2-opt and
+        Or-opt, starting from its current order. Moves that would add
+        lateness against deadlines are rejected, so the result is never
+        longer or later than the route given. An on-time route is checked
+        with a RouteSchedule in O(1) per move; only a route that is already
+        late is re-driven for each candidate. Returns the new route.
+        """
+        route = group_stops(route)
+        accept = None
+        schedule_for = None
+        if deadlines:
+            schedule_for = lambda stops: RouteSchedule.for_stops(self, departure_time, stops, deadlines)
+            if not schedule_for(route).is_on_time():
+                schedule_for = None
+                baseline = self.lateness(route, departure_time, deadlines)
+                accept = lambda candidate: self.lateness(candidate, departure_time, deadlines) <= baseline + 1e-9
+        route, _ = improve_route(route, self.distances, accept, time_budget, max_iterations,
+                                 self.hub, self.candidates, schedule_for)
+        return flatten_stops(route)
+
+    def drive(self, truck_id, departure_time, route):
+        """
+        Drive a route from the hub starting at departure_time and return to the hub.
+        Times are minutes since midnight. Returns (events, return_time) where
+        events are DeliveryEvents for the trip.
+        """
+        clock = departure_time
+        events = [DeliveryEvent(departure_time, package_id, truck_id, PackageStatus.EN_ROUTE, 0.0)
+                  for package_id, _ in route]
+        current = self.hub
+        for package_id, address_index in route:
+            miles = self.distances.distance(current, address_index)
+            clock += self.travel_time(miles)
+            events.append(DeliveryEvent(clock, package_id, truck_id, PackageStatus.DELIVERED, miles))
+            current = address_index
+
+        # Return to hub
+        miles = self.distances.distance(current, self.hub)
+        if route:
+            clock += self.travel_time(miles)
+            events.append(DeliveryEvent(clock, None, truck_id, TRUCK_RETURNED, miles))
+        return events, clock
@@ -0,0 +1,165 @@
+# Special-handling rules compiled from package notes
+
+import csv
+import re
+from collections import namedtuple
+
+from utils import str_to_minutes
+
+DEFAULT_FLIGHT_ARRIVAL_TIME = str_to_minutes("09:05")
+
+# Typed constraints. Times are minutes since midnight.
+AvailableAt = namedtuple('AvailableAt', ['package_id', 'time'])
+TruckRestriction = namedtuple('TruckRestriction', ['package_id', 'truck_id'])
+CoDeliveryGroup = namedtuple('CoDeliveryGroup', ['package_id', 'with_ids'])
+WrongAddress = namedtuple('WrongAddress', ['package_id'])
+AddressChange = namedtuple('AddressChange', ['package_id', 'time', 'address', 'city', 'zip_code'])
+
+# Note patterns, compiled once at import
+DELAYED_RULE = re.compile(r'Delayed on flight', re.IGNORECASE)
+ARRIVAL_TIME_RULE = re.compile(r'until (\d{1,2}:\d{2})\s*([ap]m)', re.IGNORECASE)
+TRUCK_RULE = re.compile(r'Can only be on truck (\d+)', re.IGNORECASE)
+GROUP_RULE = re.compile(r'Must be delivered with', re.IGNORECASE)
+GROUP_IDS_RULE = re.compile(r'with (\d+), (\d+)')
+NUMBER_RULE = re.compile(r'\d+')
+WRONG_ADDRESS_RULE = re.compile(r'Wrong address listed', re.IGNORECASE)
+
+
+def parse_note(package_id, note):
+    """Parse a special-handling note into a list of typed constraints"""
+    constraints = []
+    if not note:
+        return constraints
+
+    # Flight delays
+    if DELAYED_RULE.search(note):
+        match = ARRIVAL_TIME_RULE.search(note)
+        if match:
+            arrival = str_to_minutes(f"{match.group(1)} {match.group(2).upper()}")
+        else:
+            arrival = DEFAULT_FLIGHT_ARRIVAL_TIME
+        constraints.append(AvailableAt(package_id, arrival))
+
+    # Truck restrictions
+    match = TRUCK_RULE.search(note)
+    if match:
+        constraints.append(TruckRestriction(package_id, int(match.group(1))))
+
+    # Package grouping
+    if GROUP_RULE.search(note):
+        match = GROUP_IDS_RULE.search(note)
+        if match:
+            constraints.append(CoDeliveryGroup(package_id, (int(match.group(1)), int(match.group(2)))))
+        else:
+            # Fallback: extract all numbers and skip the first (current package ID)
+            numbers = NUMBER_RULE.findall(note)
+            if len(numbers) >= 3:  # Current package + 2 others
+                constraints.append(CoDeliveryGroup(package_id, tuple(int(num) for num in numbers[1:3])))
+
+    # Wrong address; undeliverable until an AddressChange arrives
+    if WRONG_ADDRESS_RULE.search(note):
+        constraints.append(WrongAddress(package_id))
+    return constraints
+
+
+def load_address_changes(filename):
+    """Read scheduled address corrections: package id, time, address, city, zip"""
+    changes = []
+    with open(filename, newline='') as file:
+        for row in csv.reader(file):
+            if not row or not row[0].strip().isdigit():
+                continue
+            changes.append(AddressChange(int(row[0]), str_to_minutes(row[1].strip()),
+                                         row[2].strip(), row[3].strip(), row[4].strip()))
+    return changes
+
+
+class RuleBook:
+    """
+    All special-handling constraints for a manifest, indexed by type and
+    package ID. The book is built from each package's constraints, parsed
+    from its note once at load, so assignment, simulation and status
+    queries answer every rule check with a dict lookup.
+    """
+
+    def __init__(self):
+        self.available_at = {}  # package_id -> minutes
+        self.truck_restrictions = {}  # package_id -> frozenset of truck IDs
+        self.groups = {}  # package_id -> tuple of package IDs
+        self.wrong_address = set()  # package IDs with a wrong address
+        self.address_changes = {}  # package_id -> AddressChange
+
+    @classmethod
+    def from_packages(cls, packages, address_changes=()):
+        book = cls()
+        for package in packages:
+            constraints = package.constraints
+            if constraints is None:  # Built without the loader
+                constraints = parse_note(package.id, package.note)
+            for constraint in constraints:
+                book.add(constraint)
+        for change in address_changes:
+            book.add(change)
+        return book
+
+    def add(self, constraint):
+        package_id = constraint.package_id
+        if isinstance(constraint, AvailableAt):
+            self.available_at[package_id] = constraint.time
+        elif isinstance(constraint, TruckRestriction):
+            allowed = frozenset((constraint.truck_id,))
+            current = self.truck_restrictions.get(package_id)
+            self.truck_restrictions[package_id] = allowed if current is None else current & allowed
+        elif isinstance(constraint, CoDeliveryGroup):
+            self.groups[package_id] = constraint.with_ids
+        elif isinstance(constraint, WrongAddress):
+            self.wrong_address.add(package_id)
+        elif isinstance(constraint, AddressChange):
+            self.address_changes[package_id] = constraint
+        else:
+            raise TypeError(f"Unknown constraint: {constraint!r}")
+
+    def allowed_trucks(self, package_id):
+        """Trucks a package may ride on, or None for any truck"""
+        return self.truck_restrictions.get(package_id)
+
+    def can_ride(self, package_id, truck_id):
+        allowed = self.truck_restrictions.get(package_id)
+        return allowed is None or truck_id in allowed
+
+    def available_time(self, package_id, default=None):
+        """
+        When a package can leave the hub: its flight arrival and, for a
+        wrong-address package, the time its correction arrives.
+        Returns default if it has no availability rule, or None if it can
+        never be delivered (wrong address with no correction).
+        """
+        available = self.available_at.get(package_id)
+        if package_id in self.wrong_address:
+            change = self.address_changes.get(package_id)
+            if change is None:
+                return None
+            available = change.time if available is None else max(available, change.time)
+        return available if available is not None else default
+
+    def is_deliverable(self, package_id):
+        return package_id not in self.wrong_address or package_id in self.address_changes
+
+    def has_wrong_address_at(self, package_id, minutes):
+        """True while a package's listed address is wrong and not yet corrected"""
+        if package_id not in self.wrong_address:
+            return False
+        change = self.address_changes.get(package_id)
+        return change is None or minutes < change.time
+
+    def address_change_at(self, package_id, minutes):
+        """The AddressChange in effect for a package at a time, or None"""
+        change = self.address_changes.get(package_id)
+        if change is not None and minutes >= change.time:
+            return change
+        return None
+
+    def delivery_address(self, package):
+        """The address a package will finally be delivered to"""
+        change = self.address_changes.get(package.id)
+        return change.address if change is not None else package.address
@@ -0,0 +1,371 @@
+# What-if scenarios: fork a planned day, apply changes and compare KPIs
+#
+# Usage: python scenarios.py [FILE] [--workers N] [--fleet FILE]
+#
+# FILE is a JSON list of scenarios, e.g.
+#   [{"name": "fourth truck", "changes": [{"type": "add_truck", "truck_id": 4, "like": 1},
+#                                         {"type": "reassign"}]},
+#    {"name": "late start", "changes": [{"type": "delay_departure", "truck_id": 2, "start_time": "8:30 AM"}]}]
+# Without FILE a built-in set of alternatives is compared with the baseline.
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import ChainMap, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from assignment import grouping_components
+from depots import TruckSpec, assign_fleet, depot_fleets
+from fleet import DEFAULT_MAX_MOVES, FleetPlanner, attach_router, shared_router, truck_job
+from package import PackageStatus
+from scheduler import DEFAULT_RELOAD_MINUTES
+from time_windows import EPSILON
+from utils import minutes_to_str, parse_clock
+
+# A truck in a scenario: its depots.TruckSpec plus hub, its depot's address index
+ScenarioTruck = namedtuple('ScenarioTruck', TruckSpec._fields + ('hub',))
+
+# --- CHANGES ---
+
+# Add a truck with the same depot and limits as truck like (default: the lowest ID)
+AddTruck = namedtuple('AddTruck', ['truck_id', 'like'], defaults=(None,))
+# Start a truck's shift (every truck's when truck_id is None) at start_time
+DelayDeparture = namedtuple('DelayDeparture', ['truck_id', 'start_time'])
+# Put packages (with everything they must be delivered with) on another truck,
+# taking them off whichever truck had them
+MovePackages = namedtuple('MovePackages', ['package_ids', 'truck_id'])
+# Re-run package assignment over the scenario's trucks
+Reassign = namedtuple('Reassign', [])
+# Change how many drivers a depot has
+SetDrivers = namedtuple('SetDrivers', ['depot_id', 'drivers'])
+
+CHANGE_TYPES = {
+    'add_truck': AddTruck,
+    'delay_departure': DelayDeparture,
+    'move_packages': MovePackages,
+    'reassign': Reassign,
+    'set_drivers': SetDrivers,
+}
+
+Scenario = namedtuple('Scenario', ['name', 'changes'])
+# miles and finish_time (minutes) for the whole fleet; late_packages is a
+# tuple of package IDs; undelivered counts packages no truck delivers
+# error is the reason the scenario's changes could not be applied (None if it was planned)
+ScenarioResult = namedtuple('ScenarioResult', ['name', 'miles', 'late_packages', 'late_minutes',
+                                               'finish_time', 'undelivered', 'seconds', 'error'],
+                            defaults=(None,))
+
+
+class PlanState:
+    """
+    The inputs of a planned day (trucks, assignment, drivers) layered in
+    ChainMaps over a package table and RuleBook that are never modified.
+    fork() only pushes an empty layer onto each map, so a scenario costs
+    nothing until it changes something, and its changes stay in its own
+    layer while the base plan and sibling scenarios keep reading theirs.
+    """
+
+    def __init__(self, packages, rules, trucks, assignment, drivers, reload_minutes=DEFAULT_RELOAD_MINUTES):
+        self.packages = packages  # package_id -> Package, shared read-only
+        self.rules = rules
+        self.trucks = trucks  # ChainMap: truck_id -> ScenarioTruck
+        self.assignment = assignment  # ChainMap: truck_id -> tuple of package IDs
+        self.drivers = drivers  # ChainMap: depot_id -> drivers
+        self.reload_minutes = reload_minutes
+
+    @classmethod
+    def from_day(cls, package_table, trucks, rules, drivers, reload_minutes=DEFAULT_RELOAD_MINUTES):
+        """Capture a planned day from main: its package table, Trucks and RuleBook; drivers maps depot_id -> drivers"""
+        return cls({package.id: package for package in package_table}, rules,
+                   ChainMap({truck.truck_id: ScenarioTruck(*(getattr(truck, field) for field in ScenarioTruck._fields))
+                             for truck in trucks}),
+                   ChainMap({truck.truck_id: tuple(truck.packages) for truck in trucks}),
+                   ChainMap(dict(drivers)), reload_minutes)
+
+    def fork(self):
+        return PlanState(self.packages, self.rules, self.trucks.new_child(), self.assignment.new_child(),
+                         self.drivers.new_child(), self.reload_minutes)
+
+    def with_changes(self, changes, router):
+        """A fork with every change applied in order"""
+        state = self.fork()
+        for change in changes:
+            state.apply(change, router)
+        return state
+
+    def apply(self, change, router):
+        """
+        Apply one change to this state's own layer. Raises ValueError for a
+        change that names an unknown truck, depot or package, gives a truck
+        ID that is not a whole number or a depot fewer than one driver, or
+        that would load a truck past its package count or weight limits.
+        """
+        if isinstance(change, AddTruck):
+            truck_id = _truck_id(change.truck_id)
+            if truck_id in self.trucks:
+                raise ValueError(f"Truck {truck_id} already exists")
+            like = self._truck(change.like if change.like is not None else min(self.trucks))
+            self.trucks[truck_id] = like._replace(truck_id=truck_id)
+            self.assignment[truck_id] = ()
+        elif isinstance(change, DelayDeparture):
+            truck_ids = list(self.trucks) if change.truck_id is None else [self._truck(change.truck_id).truck_id]
+            for truck_id in truck_ids:
+                self.trucks[truck_id] = self.trucks[truck_id]._replace(shift_start=change.start_time)
+        elif isinstance(change, MovePackages):
+            truck = self._truck(change.truck_id)
+            unknown = sorted(set(change.package_ids).difference(self.packages))
+            if unknown:
+                raise ValueError(f"No packages {unknown}")
+            moving = self._with_groups(change.package_ids)
+            refused = sorted(p for p in moving if not self.rules.can_ride(p, truck.truck_id))
+            if refused:
+                raise ValueError(f"Packages {refused} cannot ride on truck {truck.truck_id}")
+            load = tuple(p for p in self.assignment.get(truck.truck_id, ()) if p not in moving) + tuple(sorted(moving))
+            self._check_load(truck, load)
+            for truck_id, package_ids in list(self.assignment.items()):
+                if moving.intersection(package_ids):
+                    self.assignment[truck_id] = tuple(p for p in package_ids if p not in moving)
+            self.assignment[truck.truck_id] = load
+        elif isinstance(change, Reassign):
+            self._reassign(router)
+        elif isinstance(change, SetDrivers):
+            if change.depot_id not in self.drivers:
+                raise ValueError(f"No depot {change.depot_id}")
+            if change.drivers is not None and (not isinstance(change.drivers, int) or change.drivers < 1):
+                raise ValueError(f"Depot {change.depot_id} needs at least one driver, not {change.drivers!r}")
+            self.drivers[change.depot_id] = change.drivers
+        else:
+            raise TypeError(f"Unknown scenario change: {change!r}")
+
+    def _truck(self, truck_id):
+        truck = self.trucks.get(_truck_id(truck_id))
+        if truck is None:
+            raise ValueError(f"No truck {truck_id}")
+        return truck
+
+    def _check_load(self, truck, package_ids):
+        """Raise ValueError unless a day's load fits truck's trips by count and weight"""
+        most = truck.capacity * truck.max_trips
+        if len(package_ids) > most:
+            raise ValueError(f"Truck {truck.truck_id} carries at most {most} packages a day, "
+                             f"not {len(package_ids)}")
+        if truck.max_weight is None:
+            return
+        weights = {p: float(self.packages[p].weight or 0) for p in package_ids}
+        heavy = sorted(p for p, weight in weights.items() if weight > truck.max_weight)
+        if heavy:
+            raise ValueError(f"Packages {heavy} are over truck {truck.truck_id}'s {truck.max_weight} trip weight limit")
+        weight = sum(weights.values())
+        if weight > truck.max_weight * truck.max_trips:
+            raise ValueError(f"Truck {truck.truck_id} carries at most {truck.max_weight * truck.max_trips} a day, "
+                             f"not {weight}")
+
+    def _with_groups(self, package_ids):
+        """package_ids plus every package grouped with them"""
+        moving = set(package_ids)
+        for component in grouping_components(self.packages.values(), self.rules.groups):
+            if moving.intersection(component):
+                moving.update(component)
+        return moving
+
+    def _reassign(self, router):
+        start_time = min(truck.shift_start for truck in self.trucks.values())
+        trucks = [self.trucks[truck_id] for truck_id in sorted(self.trucks)]
+        assignment, _ = assign_fleet(
+            [self.packages[package_id] for package_id in sorted(self.packages)], depot_fleets(trucks),
+            router.distances, lambda package: router.address_index(self.rules.delivery_address(package)),
+            self.rules, start_time)
+        for truck_id in self.trucks:
+            self.assignment[truck_id] = tuple(assignment.get(truck_id, ()))
+
+    def jobs(self, router):
+        """A fleet.TruckJob per truck, in truck ID order"""
+        return [truck_job(truck, self.assignment.get(truck_id, ()), self.packages.get, router, self.rules,
+                          self.reload_minutes)
+                for truck_id, truck in sorted(self.trucks.items())]
+
+
+def _truck_id(value):
+    """Truck IDs are ints, as in a fleet config; '4' is read as 4"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid truck ID {value!r}") from None
+
+
+def plan_kpis(jobs, plans):
+    """
+    (miles, late, finish_time, delivered) for fleet.TruckPlans of jobs:
+    late maps package_id -> minutes past its deadline, finish_time is the
+    last truck's return (None if nothing left the hub) and delivered counts
+    delivered packages
+    """
+    deadlines = {}
+    for job in jobs:
+        deadlines.update(job.deadlines)
+    miles = 0.0
+    delivered = 0
+    late = {}
+    for plan in plans:
+        for event in plan.events:
+            miles += event.miles
+            if event.status is PackageStatus.DELIVERED:
+                delivered += 1
+                deadline = deadlines.get(event.package_id)
+                if deadline is not None and event.time > deadline + EPSILON:
+                    late[event.package_id] = event.time - deadline
+    finish_time = max((plan.finish_time for plan in plans if plan.trips), default=None)
+    return miles, late, finish_time, delivered
+
+
+def evaluate(state, router, scenario, max_moves=DEFAULT_MAX_MOVES):
+    """
+    Plan one scenario in-process and return its ScenarioResult. Changes
+    that cannot be applied (e.g. a package moved onto a truck it may not
+    ride), and any error planning the changed day, are reported in the
+    result's error rather than raised, so one bad alternative does not stop
+    the rest of a batch.
+    """
+    start = time.perf_counter()
+    try:
+        forked = state.with_changes(scenario.changes, router)
+    except ValueError as error:
+        return ScenarioResult(scenario.name, None, (), None, None, None, time.perf_counter() - start, str(error))
+    try:
+        jobs = forked.jobs(router)
+        planner = FleetPlanner(router, workers=1, max_moves=max_moves, drivers=dict(forked.drivers),
+                               reload_minutes=forked.reload_minutes)
+        miles, late, finish_time, delivered = plan_kpis(jobs, planner.plan(jobs))
+    except Exception as error:
+        return ScenarioResult(scenario.name, None, (), None, None, None, time.perf_counter() - start,
+                              f"planning failed: {type(error).__name__}: {error}")
+    return ScenarioResult(scenario.name, miles, tuple(sorted(late)), sum(late.values()), finish_time,
+                          len(forked.packages) - delivered, time.perf_counter() - start)
+
+
+# --- WORKER PROCESS STATE ---
+
+_worker_state = None
+_worker_router = None
+_worker_memory = None
+_worker_max_moves = DEFAULT_MAX_MOVES
+
+
+def _attach_worker(router_args, state, max_moves):
+    """Process-pool initializer: receive the base plan once and map the shared distance matrix"""
+    global _worker_state, _worker_router, _worker_memory, _worker_max_moves
+    _worker_memory, _worker_router = attach_router(*router_args)
+    _worker_state = state
+    _worker_max_moves = max_moves
+
+
+def _evaluate_in_worker(scenario):
+    return evaluate(_worker_state, _worker_router, scenario, _worker_max_moves)
+
+
+def run_scenarios(state, router, scenarios, workers=None, max_moves=DEFAULT_MAX_MOVES):
+    """
+    Evaluate scenarios against one base PlanState and return their
+    ScenarioResults in the same order. With more than one worker they run
+    in a ProcessPoolExecutor: each worker receives the base state once and
+    reads the distance matrix from shared memory, and only the small
+    Scenario records travel per task. Results do not depend on the number
+    of workers.
+    """
+    scenarios = list(scenarios)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1 or len(scenarios) < 2:
+        return [evaluate(state, router, scenario, max_moves) for scenario in scenarios]
+    with shared_router(router) as router_args, ProcessPoolExecutor(
+        max_workers=min(workers, len(scenarios)),
+        initializer=_attach_worker,
+        initargs=(router_args, state, max_moves),
+    ) as executor:
+        return list(executor.map(_evaluate_in_worker, scenarios))
+
+
+# --- SCENARIO FILES ---
+
+def parse_change(entry):
+    """Build a change from a JSON object with a 'type' key and the change's fields"""
+    fields = dict(entry)
+    kind = fields.pop('type', None)
+    if kind not in CHANGE_TYPES:
+        raise ValueError(f"Unknown change type {kind!r}; expected one of {', '.join(CHANGE_TYPES)}")
+    if isinstance(fields.get('start_time'), str):
+        fields['start_time'] = parse_clock(fields['start_time'])
+    try:
+        return CHANGE_TYPES[kind](**fields)
+    except TypeError as error:
+        raise ValueError(f"Invalid {kind} change: {error}") from None
+
+
+def load_scenarios(path):
+    with open(path) as file:
+        return [Scenario(entry['name'], tuple(parse_change(change) for change in entry.get('changes', ())))
+                for entry in json.load(file)]
+
+
+def default_scenarios(state):
+    """Baseline plus common dispatcher alternatives for the state's fleet"""
+    truck_ids = sorted(state.trucks)
+    extra = max(truck_ids) + 1
+    scenarios = [Scenario('baseline', ()),
+                 Scenario('reassign', (Reassign(),)),
+                 Scenario(f'add truck {extra}', (AddTruck(extra), Reassign()))]
+    for depot_id, drivers in sorted(state.drivers.items()):
+        if drivers is not None:
+            scenarios.append(Scenario(f'{depot_id}: {drivers + 1} drivers', (SetDrivers(depot_id, drivers + 1),)))
+    for truck_id in truck_ids:
+        start = state.trucks[truck_id].shift_start
+        for minutes in (15, 30, 60):
+            scenarios.append(Scenario(f'truck {truck_id} leaves {minutes_to_str(start + minutes)}',
+                                      (DelayDeparture(truck_id, start + minutes),)))
+    return scenarios
+
+
+def print_results(results, stream=sys.stdout):
+    print(f"{'Scenario':<28} {'Miles':>8} {'Late':>5} {'Late min':>9} {'Finish':>9} {'Undeliv.':>9} {'ms':>7}",
+          file=stream)
+    print("-" * 80, file=stream)
+    for result in results:
+        if result.error is not None:
+            print(f"{result.name:<28.28} rejected: {result.error}", file=stream)
+            continue
+        finish = minutes_to_str(result.finish_time) if result.finish_time is not None else 'N/A'
+        print(f"{result.name:<28.28} {result.miles:>8.1f} {len(result.late_packages):>5} {result.late_minutes:>9.1f} "
+              f"{finish:>9} {result.undelivered:>9} {result.seconds * 1000:>7.1f}", file=stream)
+
+
+def main(argv=None):
+    import main as wgups
+    from depots import load_fleet_config
+
+    parser = argparse.ArgumentParser(description="Compare what-if scenarios against the planned WGUPS day")
+    parser.add_argument('scenarios', nargs='?', metavar='FILE', help="JSON list of scenarios (default: built-in set)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--fleet', metavar='FILE', help="JSON depots and trucks configuration (default: one hub)")
+    args = parser.parse_args(argv)
+
+    package_table, trucks, rules, _ = wgups.plan_day(args.fleet)
+    config = wgups.default_fleet_config()
+    if args.fleet is not None:
+        config = load_fleet_config(args.fleet, config.trucks[0])
+    state = PlanState.from_day(package_table, trucks, rules,
+                               {depot.depot_id: depot.drivers for depot in config.depots}, wgups.RELOAD_MINUTES)
+    router = wgups.build_router()
+    try:
+        scenarios = load_scenarios(args.scenarios) if args.scenarios else default_scenarios(state)
+    except (OSError, ValueError, KeyError) as error:
+        parser.error(f"cannot load scenarios: {error}")
+
+    start = time.perf_counter()
+    results = run_scenarios(state, router, scenarios, args.workers)
+    print_results(results)
+    print(f"\n{len(results)} scenarios in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
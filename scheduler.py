@@ -0,0 +1,358 @@
+# Multi-trip truck and driver scheduling for WGUPS
+
+import heapq
+from collections import namedtuple
+
+from time_windows import EPSILON, RouteSchedule
+
+DEFAULT_RELOAD_MINUTES = 0
+# Cost of one minute of lateness, in miles, when comparing trip splits
+LATENESS_MILES_PER_MINUTE = 1.0
+
+# A stop waiting at the hub: available_time is minutes since midnight, weight counts
+# against a truck's per-trip weight limit, and stops sharing a group (not None)
+# must be delivered on the same trip
+PendingStop = namedtuple('PendingStop', ['package_id', 'address_index', 'available_time', 'weight', 'group'],
+                         defaults=(0.0, None))
+# One trip out of the hub and back; route is [(package_id, address_index), ...]
+Trip = namedtuple('Trip', ['departure_time', 'route', 'return_time'])
+
+
+def _gather_groups(router, tour, deadlines):
+    """
+    Make each group's members consecutive: the group is lifted out of the
+    tour as one block (members in their tour order) and put back at the
+    position, in whichever direction, that costs least in miles plus
+    lateness when the tour is driven from its earliest available time
+    """
+    members = {}
+    for stop in tour:
+        if stop.group is not None:
+            members.setdefault(stop.group, []).append(stop)
+    if not members:
+        return tour
+    dist = router.distances.distance
+    hub = router.hub
+    departure_time = min(stop.available_time for stop in tour)
+    rest = [stop for stop in tour if stop.group is None]
+    for group in sorted(members):
+        block = members[group]
+        inside = sum(dist(a.address_index, b.address_index) for a, b in zip(block, block[1:]))
+        # The block pushes every later stop back by the time its added miles
+        # take: stops already late get that much later, and no stop gets
+        # earlier, which gives a floor on each position's cost
+        lateness = []
+        miles = 0.0
+        current = hub
+        for stop in rest:
+            miles += dist(current, stop.address_index)
+            current = stop.address_index
+            deadline = deadlines.get(stop.package_id)
+            arrival = departure_time + router.travel_time(miles)
+            lateness.append(arrival - deadline if deadline is not None and arrival > deadline else 0.0)
+        base = miles + dist(current, hub)
+        late_after = [0] * (len(rest) + 1)
+        for position in range(len(rest) - 1, -1, -1):
+            late_after[position] = late_after[position + 1] + (lateness[position] > 0.0)
+        base += LATENESS_MILES_PER_MINUTE * sum(lateness)
+
+        floors = []
+        before = hub
+        for position in range(len(rest) + 1):
+            after = rest[position].address_index if position < len(rest) else hub
+            for direction, ordered in enumerate((block, block[::-1])):
+                added = (dist(before, ordered[0].address_index) + inside
+                         + dist(ordered[-1].address_index, after) - dist(before, after))
+                pushed = LATENESS_MILES_PER_MINUTE * late_after[position] * max(0.0, router.travel_time(added))
+                floors.append((added + pushed, direction, position))
+            before = after
+
+        # Exact costs in floor order, until no floor left can beat the best so far
+        best = None
+        for floor, direction, position in sorted(floors):
+            if best is not None and base + floor > best[0] + 1e-6:
+                break
+            ordered = block if direction == 0 else block[::-1]
+            candidate = rest[:position] + ordered + rest[position:]
+            miles, late, _ = _segment_cost(router, candidate, departure_time, deadlines)
+            cost = miles + LATENESS_MILES_PER_MINUTE * late
+            if best is None or cost < best[0] - 1e-9:
+                best = (cost, candidate)
+        rest = best[1]
+    return rest
+
+
+def _same_trip_groups(stops, capacity, max_weight=None):
+    """
+    Prepare stops for one truck's trip split: each group that fits in one
+    trip gets its latest member's available_time, so the group leaves
+    together; a group too big for any trip is left unconstrained (group None)
+    """
+    groups = {}
+    for stop in stops:
+        if stop.group is not None:
+            groups.setdefault(stop.group, []).append(stop)
+    ready = {}
+    for group, members in groups.items():
+        weight = sum(stop.weight for stop in members)
+        if len(members) <= capacity and (max_weight is None or weight <= max_weight):
+            ready[group] = max(stop.available_time for stop in members)
+    return [stop._replace(available_time=ready[stop.group]) if stop.group in ready else stop._replace(group=None)
+            for stop in stops]
+
+
+def giant_tour(router, stops, deadlines, max_moves=None):
+    """
+    Order every stop for a truck into one sequence: availability waves in
+    time order, each wave routed with nearest neighbor plus local search.
+    Members of a group end up next to each other.
+    """
+    waves = {}
+    for stop in stops:
+        waves.setdefault(stop.available_time, []).append(stop)
+    tour = []
+    for available_time in sorted(waves):
+        wave = waves[available_time]
+        route = router.plan_route([(s.package_id, s.address_index) for s in wave], available_time,
+                                  deadlines, time_budget=None, max_iterations=max_moves)
+        by_id = {s.package_id: s for s in wave}
+        tour.extend(by_id[package_id] for package_id, _ in route)
+    return _gather_groups(router, tour, deadlines)
+
+
+def _segment_cost(router, segment, departure_time, deadlines):
+    """(miles, late_minutes, duration_minutes) for one trip visiting segment in order"""
+    dist = router.distances.distance
+    miles = 0.0
+    late = 0.0
+    current = router.hub
+    for stop in segment:
+        miles += dist(current, stop.address_index)
+        current = stop.address_index
+        deadline = deadlines.get(stop.package_id)
+        if deadline is not None:
+            arrival = departure_time + router.travel_time(miles)
+            if arrival > deadline:
+                late += arrival - deadline
+    miles += dist(current, router.hub)
+    return miles, late, router.travel_time(miles)
+
+
+def _nearest_neighbor_order(router, segment):
+    """segment's stops reordered as a nearest-neighbor route from the hub"""
+    by_id = {stop.package_id: stop for stop in segment}
+    route = router.nearest_neighbor_route([(stop.package_id, stop.address_index) for stop in segment])
+    return [by_id[package_id] for package_id, _ in route]
+
+
+def split_trips(router, stops, deadlines, start_time, capacity,
+                reload_minutes=DEFAULT_RELOAD_MINUTES, max_moves=None, max_weight=None, shift_end=None,
+                max_trips=None):
+    """
+    Split one truck's stops into hub-to-hub trips of at most capacity packages
+    (and, when max_weight is set, at most that much total weight).
+
+    The stops are first ordered into a giant tour, then a dynamic program
+    over cut points picks consecutive segments minimizing miles plus
+    LATENESS_MILES_PER_MINUTE * late minutes. Stops of one group are kept
+    together in the tour and never cut apart, so they share a trip (unless
+    the group alone exceeds a trip's capacity or weight). A trip departs
+    once the truck is back and reloaded and every package on it has
+    arrived at the hub. Minutes a trip runs past shift_end are charged like
+    lateness. Each segment is scored in two orders, as it appears in the
+    tour and as a nearest-neighbor route of its own stops; the chosen trip
+    keeps the order the DP scored and is only polished from there, so no
+    trip costs more than it was scored at. When max_trips is set the DP
+    counts trips and uses at most that many, unless the stops cannot be cut
+    into so few; then it uses the fewest it can.
+    Returns a list of Trips in departure order.
+    """
+    tour = giant_tour(router, _same_trip_groups(stops, capacity, max_weight), deadlines, max_moves)
+    n = len(tour)
+    if n == 0:
+        return []
+
+    def can_cut(position):
+        """A trip may end before tour[position] unless that splits a group"""
+        return (position in (0, n) or tour[position].group is None
+                or tour[position].group != tour[position - 1].group)
+
+    # Prefix miles and a RouteSchedule along the tour score a trip over
+    # tour[i:j] in tour order in O(1) whenever it meets its deadlines
+    dist = router.distances.distance
+    hub = router.hub
+    along = [0.0]
+    for previous, stop in zip(tour, tour[1:]):
+        along.append(along[-1] + dist(previous.address_index, stop.address_index))
+    schedule = RouteSchedule(router, start_time, [(stop.package_id, stop.address_index) for stop in tour],
+                             deadlines)
+
+    def offer(best, j, i, order, cost, departure_time, miles, late):
+        """Make a trip over order, after the plan for tour[:i], best[j] if it is cheaper (then sooner back)"""
+        duration = router.travel_time(miles)
+        if shift_end is not None:
+            late += max(0.0, departure_time + duration - shift_end)
+        candidate = (cost + miles + LATENESS_MILES_PER_MINUTE * late,
+                     departure_time + duration + reload_minutes, i, order)
+        if best[j] is None or candidate[:2] < best[j][:2]:
+            best[j] = candidate
+
+    def within(best, j, lower_bound):
+        """Whether a candidate costing at least lower_bound could still become best[j]"""
+        return best[j] is None or lower_bound <= best[j][0] + EPSILON
+
+    def fill(best, before, lowest=1, highest=n):
+        """
+        Fill best[j] for lowest <= j <= highest with the cheapest plan whose
+        last trip follows a plan in before (None: in best itself)
+        """
+        before = best if before is None else before
+        for j in range(max(lowest, 1), min(highest, n) + 1):
+            if not can_cut(j):
+                continue
+            latest_available = start_time
+            weight = 0.0
+            farthest = 0.0
+            reorderable = []
+            for i in range(j - 1, max(0, j - capacity) - 1, -1):
+                latest_available = max(latest_available, tour[i].available_time)
+                weight += tour[i].weight
+                farthest = max(farthest, dist(hub, tour[i].address_index))
+                # A single stop always forms a trip, even if it alone is over the limit
+                if max_weight is not None and weight > max_weight and i < j - 1:
+                    break
+                if before[i] is None:
+                    continue
+                cost, ready_time = before[i][:2]
+                departure_time = max(ready_time, latest_available)
+                segment = tour[i:j]
+                # Lateness only adds to miles, so it is only worked out for
+                # trips whose miles alone could still win
+                miles = (dist(hub, tour[i].address_index) + along[j - 1] - along[i]
+                         + dist(tour[j - 1].address_index, hub))
+                if within(best, j, cost + miles):
+                    late = 0.0
+                    if not schedule.segment_on_time(i, j, departure_time):
+                        late = _segment_cost(router, segment, departure_time, deadlines)[1]
+                    offer(best, j, i, segment, cost, departure_time, miles, late)
+                if len(segment) >= 3:
+                    reorderable.append((cost + 2 * farthest, i, cost, departure_time))
+            # Reorder only once every tour-order trip has set the bar. No order of
+            # a segment is shorter than out to its farthest stop and back.
+            for lower_bound, i, cost, departure_time in sorted(reorderable):
+                if not within(best, j, lower_bound):
+                    break
+                order = _nearest_neighbor_order(router, tour[i:j])
+                if order == tour[i:j]:
+                    continue  # Already scored in tour order
+                miles, late, _ = _segment_cost(router, order, departure_time, deadlines)
+                offer(best, j, i, order, cost, departure_time, miles, late)
+        return best
+
+    # best[j] = (cost, ready_time, cut, order) for the first j stops of the
+    # tour, order being the last trip's stops; None where no split works
+    # (j is inside a group). Without a trip limit one table builds on itself.
+    def cuts(tables, table, step):
+        """The trips of the plan for the whole tour in tables[table], last first"""
+        segments = []
+        j = n
+        while j > 0:
+            _, _, i, order = tables[table][j]
+            segments.append(order)
+            j = i
+            table -= step
+        return segments
+
+    start = [None] * (n + 1)
+    start[0] = (0.0, start_time, None, None)
+    if max_trips is None:
+        segments = cuts([fill(start, None)], 0, 0)
+    else:
+        # Table k holds plans of exactly k trips, each trip planned after
+        # one in table k - 1. A trip carries at most capacity stops, so
+        # after k trips the plan has covered at most k * capacity stops and
+        # must have left no more than the remaining trips can carry.
+        tables = [start]
+        for k in range(1, max_trips + 1):
+            tables.append(fill([None] * (n + 1), tables[-1], n - (max_trips - k) * capacity, k * capacity))
+        if all(table[n] is None for table in tables):
+            # The stops cannot be cut into max_trips trips; use the fewest that work
+            tables = [start]
+            while tables[-1][n] is None and len(tables) <= n:
+                tables.append(fill([None] * (n + 1), tables[-1]))
+        fewest = min((table[n][0], k) for k, table in enumerate(tables) if table[n] is not None)[1]
+        segments = cuts(tables, fewest, 1)
+    segments.reverse()
+
+    trips = []
+    ready_time = start_time
+    for segment in segments:
+        departure_time = max([ready_time] + [stop.available_time for stop in segment])
+        route = router.polish_route([(s.package_id, s.address_index) for s in segment], departure_time,
+                                    deadlines, time_budget=None, max_iterations=max_moves)
+        return_time = departure_time + router.travel_time(router.route_miles(route))
+        trips.append(Trip(departure_time, route, return_time))
+        ready_time = return_time + reload_minutes
+    return trips
+
+
+def _latest_start(router, trip, deadlines):
+    """Latest departure that still meets every deadline on a trip (inf if it has none)"""
+    dist = router.distances.distance
+    latest = float('inf')
+    miles = 0.0
+    current = router.hub
+    for package_id, address_index in trip.route:
+        miles += dist(current, address_index)
+        current = address_index
+        deadline = deadlines.get(package_id)
+        if deadline is not None:
+            latest = min(latest, deadline - router.travel_time(miles))
+    return latest
+
+
+def schedule_drivers(truck_trips, driver_count, router, deadlines, start_time,
+                     reload_minutes=DEFAULT_RELOAD_MINUTES, routers=None):
+    """
+    Re-time every truck's trips so no more than driver_count trucks are on
+    the road at once. Drivers are interchangeable and change trucks at the
+    hub. Whenever a driver comes free, the most urgent trip that can leave
+    by then goes next (least slack before a deadline is missed), or else
+    the trip that can leave soonest; it departs once its truck is back and
+    its packages are in.
+
+    truck_trips maps truck_id -> [Trip]; routers optionally maps truck_id ->
+    the RoutingEngine its trips are driven with (default router). Returns the
+    same shape with updated departure and return times. Raises ValueError
+    if driver_count is less than one.
+    """
+    routers = routers or {}
+    if driver_count is not None and driver_count < 1:
+        raise ValueError(f"Need at least one driver, not {driver_count}")
+    if driver_count is None or driver_count >= len(truck_trips):
+        return truck_trips
+
+    drivers = [start_time] * driver_count
+    heapq.heapify(drivers)
+    truck_ready = {truck_id: start_time for truck_id in truck_trips}
+    pending = {truck_id: list(trips) for truck_id, trips in truck_trips.items()}
+    scheduled = {truck_id: [] for truck_id in truck_trips}
+
+    def earliest(truck_id):
+        return max(pending[truck_id][0].departure_time, truck_ready[truck_id])
+
+    while any(pending.values()):
+        driver_free = heapq.heappop(drivers)
+        waiting = [t for t in sorted(pending) if pending[t]]
+        ready = [t for t in waiting if earliest(t) <= driver_free]
+        if ready:
+            truck_id = min(ready, key=lambda t: (_latest_start(routers.get(t, router), pending[t][0], deadlines), earliest(t), t))
+        else:
+            truck_id = min(waiting, key=lambda t: (earliest(t), t))
+        trip = pending[truck_id].pop(0)
+        departure_time = max(trip.departure_time, truck_ready[truck_id], driver_free)
+        return_time = departure_time + (trip.return_time - trip.departure_time)
+        scheduled[truck_id].append(Trip(departure_time, trip.route, return_time))
+        truck_ready[truck_id] = return_time + reload_minutes
+        heapq.heappush(drivers, return_time)
+    return scheduled
@@ -0,0 +1,254 @@
+# Local asyncio HTTP service answering status reads from one precomputed plan
+#
+# Usage: python service.py [--host 127.0.0.1] [--port 8950]
+#
+# GET /packages?time=10:15 AM           every package's status at a time
+# GET /packages/<id>?time=10:15 AM      one package's status
+# GET /trucks?time=10:15 AM             every truck's location and miles
+# GET /trucks/<id>?time=10:15 AM        one truck
+# GET /snapshot?time=10:15 AM           whole-fleet status as columns; filter with
+#     &truck=2  &status=en_route  &due_by=10:30 AM
+# GET /summary                          mileage, finish times and deadline report
+# GET /health
+#
+# time defaults to the end of the day.
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from projection import STATUS_NAMES, StatusCode, StatusProjection
+from status import status_record, truck_location_at_time
+from time_windows import lateness_report
+from utils import minutes_to_str, parse_clock
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8950
+MAX_HEADER_BYTES = 16 * 1024
+IDLE_TIMEOUT_SECONDS = 30
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StatusService:
+    """
+    Read-only view over one planned day. The package table, rules and
+    DeliveryTimeline are built once at startup and never mutated afterwards,
+    so any number of concurrent requests can read them without locking;
+    every answer is a projection of the immutable timeline at the requested
+    time rather than a reset and re-run of the simulation.
+    """
+
+    def __init__(self, package_table, trucks, rules, timeline, end_of_day):
+        self.package_table = package_table
+        self.rules = rules
+        self.timeline = timeline
+        self.end_of_day = end_of_day
+        self.package_ids = sorted(package.id for package in package_table)
+        self.truck_ids = [truck.truck_id for truck in trucks]
+        self.projection = StatusProjection(package_table, timeline, rules)
+        # The summary never changes, so it is encoded once
+        self._summary = _encode(self._build_summary(trucks))
+
+    def _build_summary(self, trucks):
+        deadlines = {package.id: package.due for package in self.package_table if package.due is not None}
+        delivered = sum(1 for package_id in self.package_ids if self.timeline.delivery_time(package_id) is not None)
+        return {
+            'packages': len(self.package_ids),
+            'delivered': delivered,
+            'total_miles': round(self.timeline.total_miles(), 2),
+            'trucks': [{'truck_id': truck.truck_id,
+                        'miles': round(truck.miles_traveled, 2),
+                        'finish_time': minutes_to_str(truck.current_time),
+                        'packages': len(truck.packages)} for truck in trucks],
+            # An undelivered package leaves no finite slack; JSON has no -Infinity
+            'deadlines': [dict(row._asdict(), min_slack=row.min_slack if math.isfinite(row.min_slack) else None)
+                          for row in lateness_report(self.timeline, deadlines)],
+        }
+
+    # --- ENDPOINTS ---
+
+    def query_time(self, params):
+        values = params.get('time')
+        if not values:
+            return self.end_of_day
+        try:
+            return parse_clock(values[-1])
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(error)) from None
+
+    def package(self, package_id, query_time):
+        pkg = self.package_table.lookup(package_id)
+        if pkg is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No package {package_id}")
+        event = self.timeline.package_event_at(package_id, query_time)
+        return status_record(pkg, event, self.timeline, self.rules, query_time)
+
+    def truck(self, truck_id, query_time):
+        if truck_id not in self.truck_ids:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No truck {truck_id}")
+        return {
+            'time': minutes_to_str(query_time),
+            'truck_id': truck_id,
+            'location': truck_location_at_time(truck_id, self.timeline, self.package_table, self.rules, query_time),
+            'miles': round(self.timeline.truck_miles_at(truck_id, query_time), 2),
+        }
+
+    def snapshot(self, params, query_time):
+        """Columnar status of every package, optionally filtered by truck, status and deadline"""
+        filters = {}
+        try:
+            if params.get('truck'):
+                filters['truck'] = int(params['truck'][-1])
+            if params.get('status'):
+                value = params['status'][-1]
+                filters['status'] = StatusCode(int(value)) if value.isdigit() else StatusCode[value.upper()]
+            if params.get('due_by'):
+                filters['due_by'] = parse_clock(params['due_by'][-1])
+        except (KeyError, ValueError) as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid snapshot filter: {error}") from None
+        columns = self.projection.view(query_time, **filters).to_columns()
+        columns['time'] = minutes_to_str(query_time)
+        columns['status_names'] = [STATUS_NAMES[code] for code in StatusCode]
+        return columns
+
+    def respond(self, target):
+        """Route a request target to (HTTPStatus, body bytes)"""
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+
+        if parts == ['health']:
+            return HTTPStatus.OK, _encode({'status': 'ok'})
+        if parts == ['summary']:
+            return HTTPStatus.OK, self._summary
+        if parts == ['snapshot']:
+            return HTTPStatus.OK, _encode(self.snapshot(params, self.query_time(params)))
+        if parts and parts[0] in ('packages', 'trucks') and len(parts) <= 2:
+            query_time = self.query_time(params)
+            lookup, ids = (self.package, self.package_ids) if parts[0] == 'packages' else (self.truck, self.truck_ids)
+            if len(parts) == 1:
+                return HTTPStatus.OK, _encode([lookup(item_id, query_time) for item_id in ids])
+            try:
+                item_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid id {parts[1]!r}") from None
+            return HTTPStatus.OK, _encode(lookup(item_id, query_time))
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {url.path}")
+
+    # --- HTTP/1.1 ---
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it or goes idle"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                     _error('Headers too large'), keep_alive=False)
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, _error('Malformed request line'), False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+
+                # Drain any body; every endpoint is a read
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, _error('Invalid Content-Length'), False)
+                    break
+                if length:
+                    try:
+                        await reader.readexactly(length)
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+
+                if method not in ('GET', 'HEAD'):
+                    status, body = HTTPStatus.METHOD_NOT_ALLOWED, _error(f"{method} not allowed")
+                else:
+                    try:
+                        status, body = self.respond(target)
+                    except HTTPError as error:
+                        status, body = error.status, _error(str(error))
+                await self._send(writer, status, body if method == 'GET' else b'', keep_alive, len(body))
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _send(writer, status, body, keep_alive, length=None):
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body) if length is None else length}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        address = server.sockets[0].getsockname()
+        print(f"Serving WGUPS status on http://{address[0]}:{address[1]}", file=sys.stderr)
+        if ready is not None:
+            ready.set_result(address)
+        async with server:
+            await server.serve_forever()
+
+
+def _encode(payload):
+    return json.dumps(payload).encode('utf-8')
+
+
+def _error(message):
+    return _encode({'error': message})
+
+
+def build_service():
+    """Plan the day once and wrap it in a StatusService"""
+    import main
+    package_table, trucks, rules, timeline = main.plan_day()
+    return StatusService(package_table, trucks, rules, timeline, main.day_end(timeline))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve WGUPS package and truck status over HTTP")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    service = build_service()
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
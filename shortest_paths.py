@@ -0,0 +1,159 @@
+# All-pairs shortest paths over the address distance graph
+
+import heapq
+from array import array
+
+from distance import DistanceMatrix
+
+try:
+    import numpy
+except ImportError:  # Optional: the pure-Python closure is used instead
+    numpy = None
+
+NO_HOP = -1
+# Only take a detour that is shorter by more than float noise
+IMPROVEMENT_EPSILON = 1e-9
+METHODS = ('auto', 'floyd-warshall', 'dijkstra')
+
+
+class ShortestPaths:
+    """
+    Shortest-path closure of a distance graph. matrix is a DistanceMatrix of
+    shortest-path miles (so it satisfies the triangle inequality) and
+    next_hop is a flat size * size int32 table: next_hop[i * size + j] is
+    the first address after i on the shortest path from i to j, or NO_HOP
+    if j cannot be reached.
+    """
+
+    __slots__ = ('matrix', 'next_hop', 'size')
+
+    def __init__(self, matrix, next_hop):
+        self.matrix = matrix
+        self.next_hop = next_hop
+        self.size = matrix.size
+
+    def distance(self, i, j):
+        return self.matrix.distance(i, j)
+
+    def path(self, i, j):
+        """Address indices visited driving from i to j, both ends included; [] if unreachable"""
+        if i == j:
+            return [i]
+        if self.next_hop[i * self.size + j] == NO_HOP:
+            return []
+        path = [i]
+        while i != j:
+            i = self.next_hop[i * self.size + j]
+            path.append(i)
+        return path
+
+    def improved_pairs(self, raw):
+        """Number of address pairs whose shortest path is shorter than the raw matrix entry"""
+        return sum(1 for i in range(self.size) for j in range(i)
+                   if self.matrix.distance(i, j) < raw.distance(i, j) - 1e-6)
+
+
+def _pack(rows):
+    """Lower triangle of a square distance table as a packed float32 array"""
+    packed = array('f')
+    for i, row in enumerate(rows):
+        packed.extend(row[:i + 1])
+    return packed
+
+
+def _floyd_warshall_python(matrix):
+    size = matrix.size
+    dist = matrix.to_rows()
+    hops = [list(range(size)) for _ in range(size)]
+    for k in range(size):
+        row_k = dist[k]
+        for i in range(size):
+            row_i = dist[i]
+            via = row_i[k]
+            hops_i = hops[i]
+            hop_k = hops_i[k]
+            for j in range(size):
+                candidate = via + row_k[j]
+                if candidate < row_i[j] - IMPROVEMENT_EPSILON:
+                    row_i[j] = candidate
+                    hops_i[j] = hop_k
+    next_hop = array('i')
+    for row in hops:
+        next_hop.extend(row)
+    return _pack(dist), next_hop
+
+
+def _floyd_warshall_numpy(matrix):
+    size = matrix.size
+    dist = numpy.array(matrix.to_rows(), dtype=numpy.float64)
+    hops = numpy.tile(numpy.arange(size, dtype=numpy.int32), (size, 1))
+    for k in range(size):
+        candidate = dist[:, k:k + 1] + dist[k:k + 1, :]
+        better = candidate < dist - IMPROVEMENT_EPSILON
+        dist = numpy.where(better, candidate, dist)
+        hops = numpy.where(better, hops[:, k:k + 1], hops)
+    return _pack(dist.tolist()), array('i', hops.astype(numpy.int32).ravel().tolist())
+
+
+def floyd_warshall(matrix, use_numpy=None):
+    """
+    Close a complete DistanceMatrix under shortest paths in O(n^3).
+    Uses the vectorized NumPy version when NumPy is installed (or when
+    use_numpy is True). Returns ShortestPaths.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy and numpy is None:
+        raise RuntimeError("NumPy is not installed")
+    packed, next_hop = (_floyd_warshall_numpy if use_numpy else _floyd_warshall_python)(matrix)
+    return ShortestPaths(DistanceMatrix(matrix.size, packed), next_hop)
+
+
+def adjacency_from_matrix(matrix):
+    """Edge lists [(neighbor, miles), ...] for every address of a complete matrix"""
+    return [[(j, matrix.distance(i, j)) for j in range(matrix.size) if j != i] for i in range(matrix.size)]
+
+
+def dijkstra_all_pairs(adjacency):
+    """
+    Shortest paths from every node of a sparse, undirected road graph, in
+    O(n * (n + e) log n). adjacency[i] lists (neighbor, miles) edges.
+    Unreachable pairs get an infinite distance and NO_HOP. Returns ShortestPaths.
+    """
+    size = len(adjacency)
+    infinity = float('inf')
+    rows = []
+    next_hop = array('i')
+    for source in range(size):
+        dist = [infinity] * size
+        first = [NO_HOP] * size
+        dist[source] = 0.0
+        first[source] = source
+        heap = [(0.0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for neighbor, miles in adjacency[node]:
+                candidate = d + miles
+                if candidate < dist[neighbor] - IMPROVEMENT_EPSILON:
+                    dist[neighbor] = candidate
+                    first[neighbor] = neighbor if node == source else first[node]
+                    heapq.heappush(heap, (candidate, neighbor))
+        rows.append(dist)
+        next_hop.extend(first)
+    return ShortestPaths(DistanceMatrix(size, _pack(rows)), next_hop)
+
+
+def shortest_paths(matrix, method='auto'):
+    """
+    Shortest-path closure of a DistanceMatrix. 'floyd-warshall' suits the
+    dense address table; 'dijkstra' runs from each node and suits large
+    sparse graphs (see dijkstra_all_pairs for graphs given as edge lists).
+    'auto' picks Floyd-Warshall.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown shortest-path method {method!r}; expected one of {', '.join(METHODS)}")
+    if method == 'dijkstra':
+        return dijkstra_all_pairs(adjacency_from_matrix(matrix))
+    return floyd_warshall(matrix)
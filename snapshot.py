@@ -0,0 +1,373 @@
+# Binary snapshot cache for the parsed manifest and distance matrix
+
+import hashlib
+import importlib.util
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from functools import lru_cache
+
+from distance import DistanceMatrix, load_address_indices
+from loader import LoadStats, load_packages
+from metrics import METRICS
+from shortest_paths import ShortestPaths, shortest_paths
+from package import Package, PackageStatus
+from rules import AvailableAt, CoDeliveryGroup, TruckRestriction, WrongAddress, parse_note
+
+# Snapshots live in this directory next to their source files
+CACHE_DIR_NAME = ".wgups_cache"
+# Bump when a record layout changes; parser changes are caught by PARSERS below
+SNAPSHOT_VERSION = 3
+
+# The modules whose code decides what each kind of snapshot holds. A hash
+# of their files is stored in the snapshot, so editing a parser (e.g. how
+# notes become available_time or group_with) invalidates stale records.
+PARSERS = {
+    'distance': ('distance',),
+    'paths': ('distance', 'shortest_paths'),
+    'packages': ('loader', 'package', 'rules', 'utils'),
+}
+
+# Every snapshot starts with: magic, format version, metadata length.
+# The metadata is a JSON blob (source fingerprints and small tables),
+# padded so the binary payload that follows is 8-byte aligned.
+_HEADER = struct.Struct('<4sHxxI')
+_DISTANCE_MAGIC = b'WGDM'
+_PACKAGE_MAGIC = b'WGPK'
+_PATHS_MAGIC = b'WGSP'
+
+# Package record: id, available_time (-1 for none), status, group size,
+# note constraint count
+_PACKAGE_RECORD = struct.Struct('<IiBBB')
+_GROUP_ID = struct.Struct('<I')
+# Note constraint: kind, then the time, truck ID or number of group IDs that follow (0 for a wrong address)
+_CONSTRAINT = struct.Struct('<Bi')
+_CONSTRAINT_KINDS = (AvailableAt, TruckRestriction, CoDeliveryGroup, WrongAddress)
+_CONSTRAINT_CODES = {kind: code for code, kind in enumerate(_CONSTRAINT_KINDS)}
+_STRING_LENGTH = struct.Struct('<H')
+_STATUSES = tuple(PackageStatus)
+_STATUS_CODES = {status: code for code, status in enumerate(_STATUSES)}
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    """Identify a source file by size, mtime and content hash"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _file_sha256(path)}
+
+
+def is_fresh(recorded, path):
+    """
+    True if path still matches a recorded fingerprint. An unchanged size and
+    mtime is trusted without hashing; otherwise the content hash decides, so
+    a touched-but-identical file keeps its snapshot.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != recorded['size']:
+        return False
+    if stat.st_mtime_ns == recorded['mtime_ns']:
+        return True
+    return _file_sha256(path) == recorded['sha256']
+
+
+def _module_bytes(name):
+    """
+    The bytes of the file a module is loaded from (source or compiled). A
+    module with no readable file, e.g. one frozen into an executable, is
+    identified by its name alone.
+    """
+    spec = importlib.util.find_spec(name)
+    if spec is not None and spec.has_location and spec.origin is not None:
+        try:
+            with open(spec.origin, 'rb') as file:
+                return file.read()
+        except OSError:
+            pass
+    return name.encode('utf-8')
+
+
+@lru_cache(maxsize=None)
+def parser_fingerprint(kind):
+    """Content hash of the PARSERS modules for one snapshot kind"""
+    digest = hashlib.sha256()
+    for name in PARSERS[kind]:
+        digest.update(_module_bytes(name))
+    return digest.hexdigest()
+
+
+def snapshot_path(cache_dir, source, suffix):
+    """Snapshot file for source; cache_dir None means CACHE_DIR_NAME in source's own directory"""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIR_NAME)
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir, f"{name}.{suffix}")
+
+
+def _write_snapshot(path, magic, metadata, payload):
+    # Write to a temporary file and rename, so readers never see a partial snapshot
+    blob = json.dumps(metadata).encode('utf-8')
+    padding = -(_HEADER.size + len(blob)) % 8
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(_HEADER.pack(magic, SNAPSHOT_VERSION, len(blob) + padding))
+        file.write(blob + b' ' * padding)
+        file.write(payload)
+    os.replace(temporary, path)
+
+
+def _open_snapshot(path, magic):
+    """
+    Memory-map a snapshot; returns (mmap, metadata, payload offset) or None
+    if it is missing, from another format or byte order, or truncated or
+    corrupt, so the caller rebuilds it
+    """
+    try:
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < _HEADER.size:
+        mapped.close()
+        return None
+    file_magic, version, metadata_length = _HEADER.unpack_from(mapped, 0)
+    offset = _HEADER.size + metadata_length
+    if file_magic != magic or version != SNAPSHOT_VERSION or offset > len(mapped):
+        mapped.close()
+        return None
+    try:
+        metadata = json.loads(bytes(mapped[_HEADER.size:offset]))
+    except ValueError:
+        metadata = None
+    if not isinstance(metadata, dict) or metadata.get('byteorder') != sys.byteorder:
+        mapped.close()
+        return None
+    return mapped, metadata, offset
+
+
+def _payload(mapped, offset, length):
+    """A view of length payload bytes, or None if the snapshot is too short to hold them"""
+    if offset + length > len(mapped):
+        return None
+    return memoryview(mapped)[offset:offset + length]
+
+
+def _sources_fresh(metadata, sources, kind):
+    """True if the snapshot came from the current parser and its source files are unchanged"""
+    if metadata.get('parser') != parser_fingerprint(kind):
+        return False
+    recorded = metadata.get('sources')
+    try:
+        return all(key in recorded and is_fresh(recorded[key], path) for key, path in sources.items())
+    except (KeyError, TypeError):
+        return False  # Malformed fingerprints: rebuild
+
+
+# --- DISTANCE MATRIX ---
+
+def save_distance_snapshot(path, matrix, address_indices, sources):
+    metadata = {
+        'byteorder': sys.byteorder,
+        'size': matrix.size,
+        'addresses': address_indices,
+        'parser': parser_fingerprint('distance'),
+        'sources': {key: fingerprint(source) for key, source in sources.items()},
+    }
+    _write_snapshot(path, _DISTANCE_MAGIC, metadata, matrix.tobytes())
+
+
+def load_distance_snapshot(distance_file, address_file, cache_dir=None):
+    """
+    Return (DistanceMatrix, address_indices), reading a memory-mapped snapshot
+    when it is still fresh and rebuilding it from the CSVs otherwise. The
+    mapped matrix is read-only and shared between processes via the page cache.
+    """
+    path = snapshot_path(cache_dir, distance_file, 'wgdm')
+    sources = {'distance': distance_file, 'address': address_file}
+
+    opened = _open_snapshot(path, _DISTANCE_MAGIC)
+    if opened is not None:
+        mapped, metadata, offset = opened
+        size = metadata.get('size')
+        packed = _payload(mapped, offset, 4 * (size * (size + 1) // 2)) if isinstance(size, int) else None
+        if packed is not None and 'addresses' in metadata and _sources_fresh(metadata, sources, 'distance'):
+            METRICS.incr('cache_requests', cache='distance_snapshot', result='hit')
+            return DistanceMatrix(size, packed.cast('f')), metadata['addresses']
+        if packed is not None:
+            packed.release()
+        mapped.close()
+
+    METRICS.incr('cache_requests', cache='distance_snapshot', result='miss')
+    matrix = DistanceMatrix.from_csv(distance_file)
+    address_indices = load_address_indices(address_file)
+    save_distance_snapshot(path, matrix, address_indices, sources)
+    return matrix, address_indices
+
+
+# --- SHORTEST PATHS ---
+
+def save_paths_snapshot(path, paths, method, sources):
+    metadata = {
+        'byteorder': sys.byteorder,
+        'size': paths.size,
+        'method': method,
+        'parser': parser_fingerprint('paths'),
+        'sources': {key: fingerprint(source) for key, source in sources.items()},
+    }
+    _write_snapshot(path, _PATHS_MAGIC, metadata, paths.matrix.tobytes() + paths.next_hop.tobytes())
+
+
+def load_shortest_paths(distance_file, matrix, method='auto', cache_dir=None):
+    """
+    Return the ShortestPaths closure of matrix (loaded from distance_file),
+    reading a memory-mapped snapshot when it is still fresh for that file
+    and method, and computing and saving it otherwise.
+    """
+    path = snapshot_path(cache_dir, distance_file, 'wgsp')
+    sources = {'distance': distance_file}
+
+    opened = _open_snapshot(path, _PATHS_MAGIC)
+    if opened is not None:
+        mapped, metadata, offset = opened
+        size = matrix.size
+        triangle = 4 * (size * (size + 1) // 2)
+        view = _payload(mapped, offset, triangle + 4 * size * size)
+        if (view is not None and metadata.get('method') == method and metadata.get('size') == size
+                and _sources_fresh(metadata, sources, 'paths')):
+            METRICS.incr('cache_requests', cache='paths_snapshot', result='hit')
+            return ShortestPaths(DistanceMatrix(size, view[:triangle].cast('f')), view[triangle:].cast('i'))
+        if view is not None:
+            view.release()
+        mapped.close()
+
+    METRICS.incr('cache_requests', cache='paths_snapshot', result='miss')
+    paths = shortest_paths(matrix, method)
+    save_paths_snapshot(path, paths, method, sources)
+    return paths
+
+
+# --- PACKAGE TABLE ---
+
+def _pack_string(value):
+    encoded = value.encode('utf-8')
+    return _STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def _pack_constraint(constraint):
+    code = _CONSTRAINT_CODES[type(constraint)]
+    if isinstance(constraint, CoDeliveryGroup):
+        return (_CONSTRAINT.pack(code, len(constraint.with_ids))
+                + b''.join(_GROUP_ID.pack(group_id) for group_id in constraint.with_ids))
+    if isinstance(constraint, AvailableAt):
+        return _CONSTRAINT.pack(code, constraint.time)
+    if isinstance(constraint, TruckRestriction):
+        return _CONSTRAINT.pack(code, constraint.truck_id)
+    return _CONSTRAINT.pack(code, 0)
+
+
+def save_package_snapshot(path, packages, sources):
+    parts = []
+    count = 0
+    for package in packages:
+        available = package.available_time if package.available_time is not None else -1
+        constraints = package.constraints
+        if constraints is None:
+            constraints = parse_note(package.id, package.note)
+        parts.append(_PACKAGE_RECORD.pack(package.id, available, _STATUS_CODES[package.status],
+                                          len(package.group_with), len(constraints)))
+        parts.extend(_GROUP_ID.pack(group_id) for group_id in package.group_with)
+        parts.extend(_pack_constraint(constraint) for constraint in constraints)
+        for value in (package.address, package.city, package.zip_code,
+                      package.deadline, package.weight, package.note):
+            parts.append(_pack_string(value))
+        count += 1
+    metadata = {
+        'byteorder': sys.byteorder,
+        'count': count,
+        'parser': parser_fingerprint('packages'),
+        'sources': {key: fingerprint(source) for key, source in sources.items()},
+    }
+    _write_snapshot(path, _PACKAGE_MAGIC, metadata, b''.join(parts))
+
+
+def _read_packages(mapped, offset, count):
+    unpack_record = _PACKAGE_RECORD.unpack_from
+    unpack_length = _STRING_LENGTH.unpack_from
+    for _ in range(count):
+        package_id, available, status, group_size, constraint_count = unpack_record(mapped, offset)
+        offset += _PACKAGE_RECORD.size
+        group = struct.unpack_from(f'<{group_size}I', mapped, offset)
+        offset += _GROUP_ID.size * group_size
+        constraints = []
+        for _ in range(constraint_count):
+            code, value = _CONSTRAINT.unpack_from(mapped, offset)
+            offset += _CONSTRAINT.size
+            kind = _CONSTRAINT_KINDS[code]
+            if kind is CoDeliveryGroup:
+                constraints.append(CoDeliveryGroup(package_id, struct.unpack_from(f'<{value}I', mapped, offset)))
+                offset += _GROUP_ID.size * value
+            elif kind is WrongAddress:
+                constraints.append(WrongAddress(package_id))
+            else:
+                constraints.append(kind(package_id, value))
+        strings = []
+        for _ in range(6):
+            (length,) = unpack_length(mapped, offset)
+            offset += _STRING_LENGTH.size
+            value = mapped[offset:offset + length]
+            if len(value) != length:
+                raise ValueError("Truncated package record")
+            strings.append(value.decode('utf-8'))
+            offset += length
+        address, city, zip_code, deadline, weight, note = strings
+        package = Package(package_id, address, city, zip_code, deadline, weight, note)
+        package.available_time = available if available >= 0 else None
+        package.status = _STATUSES[status]
+        package.group_with = group
+        package.constraints = tuple(constraints)
+        yield package
+
+
+def load_packages_cached(package_file, package_table, cache_dir=None):
+    """
+    Fill package_table from a fresh package snapshot, or parse the CSV with
+    loader.load_packages and write a new snapshot. Returns LoadStats.
+    """
+    path = snapshot_path(cache_dir, package_file, 'wgpk')
+    sources = {'packages': package_file}
+
+    opened = _open_snapshot(path, _PACKAGE_MAGIC)
+    if opened is not None:
+        mapped, metadata, offset = opened
+        try:
+            if _sources_fresh(metadata, sources, 'packages'):
+                start = time.perf_counter()
+                try:
+                    packages = list(_read_packages(mapped, offset, metadata['count']))
+                except (KeyError, TypeError, ValueError, IndexError, struct.error):
+                    packages = None  # Truncated or corrupt records: rebuild
+                if packages is not None:
+                    METRICS.incr('cache_requests', cache='package_snapshot', result='hit')
+                    package_table.insert_many(packages)
+                    seconds = time.perf_counter() - start
+                    return LoadStats(len(packages), seconds, len(packages) / seconds if seconds > 0 else 0.0)
+        finally:
+            mapped.close()
+
+    METRICS.incr('cache_requests', cache='package_snapshot', result='miss')
+    stats = load_packages(package_file, package_table)
+    save_package_snapshot(path, package_table, sources)
+    return stats
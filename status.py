@@ -0,0 +1,70 @@
+# Point-in-time package status projection for display and batch queries
+
+from package import PackageStatus
+from timeline import TRUCK_RETURNED
+from utils import minutes_to_str
+
+
+def status_from_event(pkg, event, rules, query_time):
+    """
+    Project a package's display status and delivery time at query_time,
+    given its latest timeline event at or before that time (or None)
+    """
+    if rules.has_wrong_address_at(pkg.id, query_time):
+        return str(PackageStatus.WRONG_ADDRESS), None
+    arrival = rules.available_at.get(pkg.id)
+    if arrival is not None and query_time < arrival:
+        # Package is delayed and not yet available
+        return f"Delayed on flight until {minutes_to_str(arrival)}", None
+    if event is None:
+        return "At Hub", None
+    if event.status is PackageStatus.DELIVERED:
+        return f"Delivered at {minutes_to_str(event.time)}", event.time
+    return str(event.status), None
+
+
+def package_status_at_time(pkg, timeline, rules, query_time):
+    """Project a package's display status and delivery time at query_time from the timeline"""
+    return status_from_event(pkg, timeline.package_event_at(pkg.id, query_time), rules, query_time)
+
+
+def package_location_at_time(pkg, rules, query_time, wrong_suffix):
+    """Return the (address, city, zip) to display for a package at query_time"""
+    change = rules.address_change_at(pkg.id, query_time)
+    if change is not None:
+        return change.address, change.city, change.zip_code
+    if rules.has_wrong_address_at(pkg.id, query_time):
+        return pkg.original_address + wrong_suffix, pkg.city, pkg.zip_code
+    return pkg.address, pkg.city, pkg.zip_code
+
+
+def status_record(pkg, event, timeline, rules, query_time):
+    """One package's status at query_time as a flat dict for CSV, JSON or HTTP responses"""
+    status, delivery_time = status_from_event(pkg, event, rules, query_time)
+    address, city, zip_code = package_location_at_time(pkg, rules, query_time, " (WRONG)")
+    truck_id = timeline.package_truck(pkg.id) or pkg.truck
+    return {
+        'time': minutes_to_str(query_time),
+        'package_id': pkg.id,
+        'status': status,
+        'delivery_time': minutes_to_str(delivery_time) if delivery_time is not None else '',
+        'truck': truck_id or '',
+        'address': address,
+        'city': city,
+        'zip_code': zip_code,
+        'deadline': pkg.deadline,
+    }
+
+
+def truck_location_at_time(truck_id, timeline, package_table, rules, query_time):
+    """
+    Where a truck is at query_time: 'At Hub' before it leaves and after it
+    returns, 'Left hub' once loaded, or the address of its last delivery
+    """
+    event = timeline.truck_event_at(truck_id, query_time)
+    if event is None or event.status == TRUCK_RETURNED:
+        return "At Hub"
+    if event.status is PackageStatus.DELIVERED:
+        pkg = package_table.lookup(event.package_id)
+        return package_location_at_time(pkg, rules, event.time, "")[0] if pkg else "Unknown"
+    return "Left hub"
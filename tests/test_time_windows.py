@@ -0,0 +1,155 @@
+# Tests for deadline lateness reporting and RouteSchedule feasibility checks
+
+import math
+import random
+
+from distance import DistanceMatrix
+from package import PackageStatus
+from routing import RoutingEngine
+from time_windows import EPSILON, RouteSchedule, lateness_report
+from timeline import TRUCK_RETURNED, DeliveryEvent, DeliveryTimeline
+
+DEPARTURE = 480
+TRIALS = 200
+
+
+def delivered(time, package_id, truck_id):
+    return DeliveryEvent(time, package_id, truck_id, PackageStatus.DELIVERED, 1.0)
+
+
+def en_route(time, package_id, truck_id):
+    return DeliveryEvent(time, package_id, truck_id, PackageStatus.EN_ROUTE, 0.0)
+
+
+def test_undelivered_deadline_package_on_its_truck():
+    timeline = DeliveryTimeline([
+        en_route(480, 1, 1), en_route(480, 2, 1),
+        delivered(500, 1, 1),
+        DeliveryEvent(520, None, 1, TRUCK_RETURNED, 1.0),
+    ])
+    rows = lateness_report(timeline, {1: 540, 2: 600})
+    assert len(rows) == 1
+    row = rows[0]
+    assert row.truck_id == 1
+    assert row.deadline_packages == 2
+    assert row.late_packages == (2,)
+    assert row.undelivered == (2,)
+    assert row.late_minutes == 0.0
+    assert row.min_slack == -math.inf
+
+
+def test_never_loaded_deadline_package_in_unassigned_row():
+    timeline = DeliveryTimeline([en_route(480, 1, 1), delivered(500, 1, 1)])
+    rows = lateness_report(timeline, {1: 490, 3: 600})
+    assert [row.truck_id for row in rows] == [1, None]
+    on_truck, unassigned = rows
+    assert on_truck.late_packages == (1,)
+    assert on_truck.late_minutes == 10.0
+    assert on_truck.undelivered == ()
+    assert unassigned.deadline_packages == 1
+    assert unassigned.late_packages == (3,)
+    assert unassigned.undelivered == (3,)
+
+
+# --- ROUTE SCHEDULE AGAINST RE-DRIVING ---
+
+def random_router(rng, size=10):
+    """A RoutingEngine over random points, hub at index 0"""
+    points = [(rng.uniform(0, 8), rng.uniform(0, 8)) for _ in range(size)]
+    return RoutingEngine(DistanceMatrix.from_rows([[math.dist(p, q) for q in points] for p in points]), {})
+
+
+def random_trip(rng, router, late=False):
+    """
+    A route of 1-8 stops and its deadlines: none, exactly at the arrival,
+    or a little or a lot after it. With late, one stop is already late.
+    """
+    route = [(package_id, rng.randrange(1, router.distances.size)) for package_id in range(rng.randint(1, 8))]
+    arrivals = RouteSchedule(router, DEPARTURE, route, {}).arrivals
+    deadlines = {}
+    for (package_id, _), arrival in zip(route, arrivals):
+        margin = rng.choice([None, 0.0, rng.uniform(0, 3), rng.uniform(3, 60)])
+        if margin is not None:
+            deadlines[package_id] = arrival + margin
+    if late:
+        package_id = rng.randrange(len(route))
+        deadlines[package_id] = arrivals[package_id] - rng.uniform(1, 30)
+    return route, deadlines
+
+
+def drives_on_time(router, departure_time, route, deadlines, checked=None):
+    """Drive route stop by stop; True if every stop (or every stop in checked) meets its deadline"""
+    dist = router.distances.distance
+    clock = departure_time
+    current = router.hub
+    for package_id, address_index in route:
+        clock += router.travel_time(dist(current, address_index))
+        current = address_index
+        deadline = deadlines.get(package_id)
+        if deadline is not None and clock > deadline + EPSILON and (checked is None or package_id in checked):
+            return False
+    return True
+
+
+def test_can_insert_matches_re_driving():
+    rng = random.Random(1)
+    for trial in range(TRIALS):
+        router = random_router(rng)
+        route, deadlines = random_trip(rng, router, late=trial % 3 == 0)
+        schedule = RouteSchedule(router, DEPARTURE, route, deadlines)
+        new_id = len(route)
+        for position in range(len(route) + 1):
+            for address_index in range(router.distances.size):
+                deadline = rng.choice([None, DEPARTURE + rng.uniform(0, 90)])
+                candidate = route[:position] + [(new_id, address_index)] + route[position:]
+                # Stops before the insertion are not moved; it is only
+                # answerable for the new stop and the ones it delays
+                checked = {package_id for package_id, _ in candidate[position:]}
+                expected = drives_on_time(router, DEPARTURE, candidate, {**deadlines, new_id: deadline}, checked)
+                assert schedule.can_insert(position, address_index, deadline) == expected, (trial, position)
+
+
+def test_can_reverse_matches_re_driving():
+    rng = random.Random(2)
+    for trial in range(TRIALS):
+        router = random_router(rng)
+        route, deadlines = random_trip(rng, router)
+        schedule = RouteSchedule(router, DEPARTURE, route, deadlines)
+        assert schedule.is_on_time()
+        for first in range(len(route)):
+            for last in range(first + 1, len(route)):
+                candidate = route[:first] + route[first:last + 1][::-1] + route[last + 1:]
+                expected = drives_on_time(router, DEPARTURE, candidate, deadlines)
+                assert schedule.can_reverse(first, last) == expected, (trial, first, last)
+
+
+def test_can_relocate_matches_re_driving():
+    rng = random.Random(3)
+    for trial in range(TRIALS):
+        router = random_router(rng)
+        route, deadlines = random_trip(rng, router)
+        schedule = RouteSchedule(router, DEPARTURE, route, deadlines)
+        for first in range(len(route)):
+            for last in range(first, len(route)):
+                block = route[first:last + 1]
+                rest = route[:first] + route[last + 1:]
+                for after in range(-1, len(route)):
+                    if first - 1 <= after <= last:
+                        continue
+                    at = after + 1 if after < first else after + 1 - len(block)
+                    candidate = rest[:at] + block + rest[at:]
+                    expected = drives_on_time(router, DEPARTURE, candidate, deadlines)
+                    assert schedule.can_relocate(first, last, after) == expected, (trial, first, last, after)
+
+
+def test_segment_on_time_matches_re_driving():
+    rng = random.Random(4)
+    for trial in range(TRIALS):
+        router = random_router(rng)
+        route, deadlines = random_trip(rng, router, late=trial % 2 == 0)
+        schedule = RouteSchedule(router, DEPARTURE, route, deadlines)
+        for first in range(len(route) + 1):
+            for last in range(first, len(route) + 1):
+                departure_time = DEPARTURE + rng.choice([0.0, rng.uniform(-60, 60)])
+                expected = drives_on_time(router, departure_time, route[first:last], deadlines)
+                assert schedule.segment_on_time(first, last, departure_time) == expected, (trial, first, last)
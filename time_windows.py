@@ -0,0 +1,230 @@
+# Deadline time windows: O(1) insertion feasibility and lateness reporting
+
+from collections import namedtuple
+
+INFINITY = float('inf')
+# Arrival times are floats; ignore rounding noise when comparing to deadlines
+EPSILON = 1e-6
+
+# Per-truck deadline outcome. late_minutes sums how far past their deadlines
+# the late packages were; min_slack is the tightest margin (negative if late).
+# undelivered lists deadline packages the truck never delivers; they also
+# count as late, with a min_slack of -inf, but add no late_minutes. truck_id
+# is None for the row of packages no truck ever loads.
+TruckLateness = namedtuple('TruckLateness', ['truck_id', 'deadline_packages', 'late_packages',
+                                             'late_minutes', 'min_slack', 'undelivered'], defaults=((),))
+
+
+class _RangeMin:
+    """Sparse table answering min(values[first:last]) in O(1) after an O(n log n) build"""
+
+    __slots__ = ('levels',)
+
+    def __init__(self, values):
+        levels = [list(values)]
+        width = 1
+        while 2 * width <= len(values):
+            below = levels[-1]
+            levels.append([min(below[i], below[i + width]) for i in range(len(below) - width)])
+            width *= 2
+        self.levels = levels
+
+    def query(self, first, last):
+        if last <= first:
+            return INFINITY
+        level = (last - first).bit_length() - 1
+        row = self.levels[level]
+        return min(row[first], row[last - (1 << level)])
+
+
+class RouteSchedule:
+    """
+    Arrival-time prefix array and deadline-slack suffix array for one trip.
+
+    arrivals[i] is when the truck reaches stop i. slack[i] is how many
+    minutes every stop from i on could be pushed back and still meet its
+    deadline (infinite when none of them has one). Building the arrays is
+    O(n); after that, whether a new stop can be inserted before stop i
+    without making anything late is an O(1) check instead of re-driving
+    the candidate route. Range-minimum tables, built on first use, make
+    segment reversals, segment moves and sub-trips O(1) checks as well.
+    """
+
+    __slots__ = ('router', 'departure_time', 'route', 'addresses', 'due', 'arrivals', 'slack', '_ranges')
+
+    def __init__(self, router, departure_time, route, deadlines):
+        due = []
+        for package_id, _ in route:
+            deadline = deadlines.get(package_id)
+            due.append(deadline if deadline is not None else INFINITY)
+        self._build(router, departure_time, route, [address_index for _, address_index in route], due)
+
+    @classmethod
+    def for_stops(cls, router, departure_time, stops, deadlines):
+        """Schedule for grouped (address_index, [package_ids]) stops, each due at its earliest deadline"""
+        schedule = cls.__new__(cls)
+        due = []
+        for _, package_ids in stops:
+            times = [deadlines[package_id] for package_id in package_ids
+                     if deadlines.get(package_id) is not None]
+            due.append(min(times, default=INFINITY))
+        schedule._build(router, departure_time, stops, [address_index for address_index, _ in stops], due)
+        return schedule
+
+    def _build(self, router, departure_time, route, addresses, due):
+        self.router = router
+        self.departure_time = departure_time
+        self.route = route
+        self.addresses = addresses
+        self.due = due
+        self._ranges = None
+        dist = router.distances.distance
+
+        arrivals = []
+        clock = departure_time
+        current = router.hub
+        for address_index in addresses:
+            clock += router.travel_time(dist(current, address_index))
+            current = address_index
+            arrivals.append(clock)
+        self.arrivals = arrivals
+
+        slack = [INFINITY] * (len(addresses) + 1)
+        for i in range(len(addresses) - 1, -1, -1):
+            slack[i] = min(due[i] - arrivals[i], slack[i + 1])
+        self.slack = slack
+
+    def is_on_time(self):
+        return self.slack[0] >= -EPSILON
+
+    def insertion_delay(self, position, address_index):
+        """(arrival at the new stop, minutes added to every later stop) when inserting before route[position]"""
+        dist = self.router.distances.distance
+        travel_time = self.router.travel_time
+        if position:
+            before = self.addresses[position - 1]
+            leave = self.arrivals[position - 1]
+        else:
+            before = self.router.hub
+            leave = self.departure_time
+        after = self.addresses[position] if position < len(self.addresses) else self.router.hub
+        arrival = leave + travel_time(dist(before, address_index))
+        delay = arrival + travel_time(dist(address_index, after)) - (leave + travel_time(dist(before, after)))
+        return arrival, delay
+
+    def can_insert(self, position, address_index, deadline=None):
+        """True if inserting a stop before route[position] keeps every deadline, itself included"""
+        arrival, delay = self.insertion_delay(position, address_index)
+        if deadline is not None and arrival > deadline + EPSILON:
+            return False
+        return delay <= self.slack[position] + EPSILON
+
+    # --- RANGE QUERIES ---
+    # These assume the route is on time as it stands (see is_on_time) and
+    # answer whether it still is after the change.
+
+    def _tables(self):
+        if self._ranges is None:
+            self._ranges = (_RangeMin([due - arrival for due, arrival in zip(self.due, self.arrivals)]),
+                            _RangeMin([due + arrival for due, arrival in zip(self.due, self.arrivals)]))
+        return self._ranges
+
+    def _leg(self, start, end):
+        """Driving minutes between route positions (-1 and len(route) are the hub)"""
+        hub = self.router.hub
+        last = len(self.addresses)
+        before = self.addresses[start] if 0 <= start < last else hub
+        after = self.addresses[end] if 0 <= end < last else hub
+        return self.router.travel_time(self.router.distances.distance(before, after))
+
+    def _leaves(self, position):
+        """When the truck leaves route[position], or the hub for -1"""
+        return self.arrivals[position] if position >= 0 else self.departure_time
+
+    def _shift_ok(self, first, last, shift):
+        """Whether route[first:last] can all arrive shift minutes later"""
+        return shift <= self._tables()[0].query(first, last) + EPSILON
+
+    def can_reverse(self, first, last):
+        """True if visiting route[first..last] (inclusive) backwards keeps every deadline"""
+        ahead, behind = self._tables()
+        arrivals = self.arrivals
+        # route[m] in the reversed block is reached at reached + arrivals[last] - arrivals[m]
+        reached = self._leaves(first - 1) + self._leg(first - 1, last)
+        if behind.query(first, last + 1) < reached + arrivals[last] - EPSILON:
+            return False
+        if last + 1 == len(arrivals):
+            return True
+        resume = reached + arrivals[last] - arrivals[first] + self._leg(first, last + 1)
+        return resume - arrivals[last + 1] <= self.slack[last + 1] + EPSILON
+
+    def can_relocate(self, first, last, after):
+        """
+        True if moving route[first..last] (inclusive, order kept) to just
+        after route[after] keeps every deadline; after is -1 for the start
+        of the route and must lie outside first - 1..last.
+        """
+        arrivals = self.arrivals
+        end = len(arrivals)
+        if after < first:
+            # Block moves earlier; the stops it jumps over shift later
+            block = self._leaves(after) + self._leg(after, first) - arrivals[first]
+            if not self._shift_ok(first, last + 1, block):
+                return False
+            skipped = arrivals[last] + block + self._leg(last, after + 1) - arrivals[after + 1]
+            if not self._shift_ok(after + 1, first, skipped):
+                return False
+            if last + 1 == end:
+                return True
+            rest = arrivals[first - 1] + skipped + self._leg(first - 1, last + 1) - arrivals[last + 1]
+            return rest <= self.slack[last + 1] + EPSILON
+        # Block moves later; the stops it jumps over arrive earlier
+        skipped = self._leaves(first - 1) + self._leg(first - 1, last + 1) - arrivals[last + 1]
+        if not self._shift_ok(last + 1, after + 1, skipped):
+            return False
+        block = arrivals[after] + skipped + self._leg(after, first) - arrivals[first]
+        if not self._shift_ok(first, last + 1, block):
+            return False
+        if after + 1 == end:
+            return True
+        rest = arrivals[last] + block + self._leg(last, after + 1) - arrivals[after + 1]
+        return rest <= self.slack[after + 1] + EPSILON
+
+    def segment_on_time(self, first, last, departure_time):
+        """
+        True if a trip of its own visiting route[first:last] in order,
+        leaving the hub at departure_time, meets every deadline. The
+        schedule's own departure time does not matter.
+        """
+        if last <= first:
+            return True
+        shift = departure_time + self._leg(-1, first) - self.arrivals[first]
+        return self._shift_ok(first, last, shift)
+
+
+def lateness_report(timeline, deadlines):
+    """
+    Summarize deadline performance per truck from a DeliveryTimeline.
+    deadlines maps package_id -> minutes. Returns [TruckLateness] sorted by
+    truck. A package that is never delivered is reported as undelivered on
+    the truck that loaded it, or in a final row with truck_id None if no
+    truck did.
+    """
+    totals = {}
+    for package_id, deadline in deadlines.items():
+        truck_id = timeline.package_truck(package_id)
+        count, late, late_minutes, min_slack, undelivered = totals.get(truck_id, (0, [], 0.0, INFINITY, []))
+        delivered = timeline.delivery_time(package_id)
+        if delivered is None:
+            slack = -INFINITY
+            undelivered = undelivered + [package_id]
+        else:
+            slack = deadline - delivered
+        if slack < -EPSILON:
+            late = late + [package_id]
+            if delivered is not None:
+                late_minutes -= slack
+        totals[truck_id] = (count + 1, late, late_minutes, min(min_slack, slack), undelivered)
+    return [TruckLateness(truck_id, count, tuple(sorted(late)), late_minutes, min_slack, tuple(sorted(undelivered)))
+            for truck_id, (count, late, late_minutes, min_slack, undelivered)
+            in sorted(totals.items(), key=lambda item: (item[0] is None, item[0] or 0))]
@@ -0,0 +1,125 @@
+# Event-sourced delivery timeline for WGUPS status queries
+
+from bisect import bisect_right
+from collections import namedtuple
+from package import PackageStatus
+
+TRUCK_RETURNED = 'Returned to Hub'
+
+# time is minutes since midnight; status is a PackageStatus, or a truck
+# event such as TRUCK_RETURNED when package_id is None
+DeliveryEvent = namedtuple('DeliveryEvent', ['time', 'package_id', 'truck_id', 'status', 'miles'])
+
+
+class DeliveryTimeline:
+    """
+    Immutable, time-sorted log of every event in one simulated day.
+    Events are indexed per package and per truck, so a point-in-time query
+    is a binary search over that package's (or truck's) events instead of
+    a replay of the whole day.
+    """
+
+    def __init__(self, events):
+        self.events = tuple(sorted(events, key=lambda e: (e.time, e.truck_id, e.package_id or 0)))
+
+        package_events = {}
+        truck_events = {}
+        for event in self.events:
+            if event.package_id is not None:
+                package_events.setdefault(event.package_id, []).append(event)
+            truck_events.setdefault(event.truck_id, []).append(event)
+
+        # Per package: parallel tuples of event times and events
+        self._package_index = {
+            package_id: (tuple(e.time for e in evs), tuple(evs))
+            for package_id, evs in package_events.items()
+        }
+
+        # Per truck: event times, cumulative miles after each event, and the events
+        self._truck_index = {}
+        for truck_id, evs in truck_events.items():
+            cumulative = []
+            total = 0.0
+            for event in evs:
+                total += event.miles
+                cumulative.append(total)
+            self._truck_index[truck_id] = (tuple(e.time for e in evs), tuple(cumulative), tuple(evs))
+
+    def package_event_at(self, package_id, query_time):
+        """Return the latest event for a package at or before query_time, or None"""
+        entry = self._package_index.get(package_id)
+        if entry is None:
+            return None
+        times, events = entry
+        position = bisect_right(times, query_time)
+        return events[position - 1] if position else None
+
+    def package_events(self, package_id):
+        """Every event for a package in time order"""
+        entry = self._package_index.get(package_id)
+        return entry[1] if entry else ()
+
+    def sweep(self, queries):
+        """
+        Answer many point-in-time queries in one forward pass over the log.
+        queries are (time, package_id, ...) tuples sorted by time; yields
+        (query, latest event for that package at or before its time, or None).
+        """
+        events = self.events
+        count = len(events)
+        position = 0
+        latest = {}
+        for query in queries:
+            query_time = query[0]
+            while position < count and events[position].time <= query_time:
+                event = events[position]
+                if event.package_id is not None:
+                    latest[event.package_id] = event
+                position += 1
+            yield query, latest.get(query[1])
+
+    def package_truck(self, package_id):
+        """Return the truck a package travels on, or None if it never leaves the hub"""
+        entry = self._package_index.get(package_id)
+        return entry[1][0].truck_id if entry else None
+
+    def delivery_time(self, package_id):
+        """Return the time a package is delivered during the day, or None"""
+        entry = self._package_index.get(package_id)
+        if entry is None:
+            return None
+        for event in entry[1]:
+            if event.status is PackageStatus.DELIVERED:
+                return event.time
+        return None
+
+    def truck_ids(self):
+        return sorted(self._truck_index)
+
+    def truck_miles_at(self, truck_id, query_time):
+        """Return the miles a truck has driven by query_time"""
+        entry = self._truck_index.get(truck_id)
+        if entry is None:
+            return 0.0
+        times, cumulative, _ = entry
+        position = bisect_right(times, query_time)
+        return cumulative[position - 1] if position else 0.0
+
+    def truck_event_at(self, truck_id, query_time):
+        """Return the latest event for a truck at or before query_time, or None"""
+        entry = self._truck_index.get(truck_id)
+        if entry is None:
+            return None
+        times, _, events = entry
+        position = bisect_right(times, query_time)
+        return events[position - 1] if position else None
+
+    def total_miles_at(self, query_time):
+        return sum(self.truck_miles_at(truck_id, query_time) for truck_id in self._truck_index)
+
+    def end_time(self, default=0):
+        """Time of the last event (past 1440 if the day ran beyond midnight), or default if empty"""
+        return self.events[-1].time if self.events else default
+
+    def total_miles(self):
+        return sum(cumulative[-1] for _, cumulative, _ in self._truck_index.values())
@@ -1,48 +1,52 @@
-# Truck class and delivery logic for WGUPS
-
-from datetime import timedelta
-
-class Truck:
-    def __init__(self, truck_id, departure_time, address_index=0, capacity=16):
-        self.id = truck_id
-        self.capacity = capacity
-        self.packages = []
-        self.route = []
-        self.mileage = 0.0
-        self.speed = 18  # miles per hour
-        self.departure_time = departure_time
-        self.current_time = departure_time
-        self.address_index = address_index  # Hub index
-        self.current_location = address_index
-
-    def load_package(self, package):
-        if len(self.packages) < self.capacity:
-            self.packages.append(package)
-            package.truck = self.id
-            return True
-        return False
-
-    def deliver_packages(self, distance_data, address_lookup):
-        # Basic greedy nearest neighbor approach
-        unvisited = self.packages[:]
-        while unvisited:
-            next_package = min(
-                unvisited,
-                key=lambda p: distance_data[self.current_location][address_lookup[p.address]]
-            )
-            travel_distance = distance_data[self.current_location][address_lookup[next_package.address]]
-            travel_time = timedelta(hours=travel_distance / self.speed)
-
-            self.current_time += travel_time
-            self.mileage += travel_distance
-            self.current_location = address_lookup[next_package.address]
-
-            next_package.status = "Delivered"
-            next_package.delivery_time = self.current_time
-            unvisited.remove(next_package)
-
-        # Return to hub
-        return_distance = distance_data[self.current_location][0]
-        self.mileage += return_distance
-        self.current_time += timedelta(hours=return_distance / self.speed)
-        self.current_location = 0  # back at hub
+# Truck class and delivery logic for WGUPS
+
+from package import PackageStatus
+
+class Truck:
+    def __init__(self, truck_id, departure_time, address_index=0, capacity=16):
+        self.id = truck_id
+        self.capacity = capacity
+        self.packages = []
+        self.route = []
+        self.mileage = 0.0
+        self.speed = 18  # miles per hour
+        self.departure_time = departure_time  # minutes since midnight
+        self.current_time = departure_time
+        self.address_index = address_index  # Hub index
+        self.current_location = address_index
+
+    def load_package(self, package):
+        if len(self.packages) < self.capacity:
+            self.packages.append(package)
+            package.truck = self.id
+            return True
+        return False
+
+    def deliver_packages(self, distance_data, address_lookup, candidates=None):
+        # Basic greedy nearest neighbor approach; distance_data is a distance.DistanceMatrix.
+        # Packages are bucketed by address index once, so each stop is one decision;
+        # candidates is an optional candidates.CandidateIndex for k-nearest lookups.
+        unvisited = {}
+        for package in self.packages:
+            unvisited.setdefault(address_lookup[package.address], []).append(package)
+        while unvisited:
+            if candidates is not None:
+                next_index, travel_distance = candidates.nearest(self.current_location, unvisited)
+            else:
+                next_index, travel_distance = distance_data.nearest(self.current_location, list(unvisited))
+            travel_time = travel_distance / self.speed * 60  # minutes
+
+            self.current_time += travel_time
+            self.mileage += travel_distance
+            self.current_location = next_index
+
+            # Deliver every package for this address at the same stop
+            for package in unvisited.pop(next_index):
+                package.status = PackageStatus.DELIVERED
+                package.delivery_time = int(self.current_time)
+
+        # Return to hub
+        return_distance = distance_data.distance(self.current_location, self.address_index)
+        self.mileage += return_distance
+        self.current_time += return_distance / self.speed * 60
+        self.current_location = self.address_index  # back at hub
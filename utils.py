@@ -1,43 +1,84 @@
-# Utility functions for time and status formatting
-
-from datetime import datetime, timedelta
-
-def str_to_time(timestr):
-    """
-    Convert a string 'HH:MM' or 'HH:MM AM/PM' to a datetime.time object.
-    """
-    try:
-        return datetime.strptime(timestr, '%H:%M').time()
-    except ValueError:
-        return datetime.strptime(timestr, '%I:%M %p').time()
-
-def add_minutes_to_time(time_obj, minutes):
-    """
-    Adds minutes to a datetime.time object, returns a new datetime.time.
-    """
-    full_datetime = datetime.combine(datetime.today(), time_obj) + timedelta(minutes=minutes)
-    return full_datetime.time()
-
-def time_to_str(time_obj):
-    """
-    Format a datetime.time object as a string HH:MM AM/PM.
-    """
-    return time_obj.strftime('%I:%M %p').lstrip('0')
-
-def format_package_status(package):
-    """
-    Returns a string describing the status of a package, including delivery time if applicable.
-    package is expected to have fields:
-    - id
-    - address
-    - deadline
-    - city
-    - zip_code
-    - weight
-    - status (At Hub / En Route / Delivered)
-    - delivery_time (None or datetime.time)
-    """
-    status_str = f"Package {package['id']} to {package['address']} - Deadline: {package['deadline']} - Status: {package['status']}"
-    if package['delivery_time']:
-        status_str += f" at {time_to_str(package['delivery_time'])}"
-    return status_str
+# Utility functions for time and status formatting
+
+import re
+from functools import lru_cache
+
+MINUTES_PER_DAY = 24 * 60
+# 'H:MM' (24-hour) or 'H:MM AM/PM', with or without a space before AM/PM,
+# optionally followed by '+N' for N days after the first midnight
+CLOCK_RULE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*([AaPp][Mm])?\s*(?:\+(\d+))?\s*$')
+
+# Times are integer (or float) minutes since midnight of the first day of the
+# run, so a day that runs past midnight just keeps counting past 1440.
+# Strings are parsed once and cached, and minutes are only formatted for output.
+
+@lru_cache(maxsize=4096)
+def parse_clock(text):
+    """
+    Parse '9:15 AM', '9:15am', '13:05' or '1:10 AM +1' (the next day) into
+    minutes since midnight without going through strptime. Results are
+    cached, so repeated strings cost one dict lookup. Raises ValueError for
+    anything else.
+    """
+    match = CLOCK_RULE.match(text)
+    if not match:
+        raise ValueError(f"Invalid time {text!r}; expected HH:MM AM/PM")
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    if minute > 59:
+        raise ValueError(f"Invalid time {text!r}")
+    if meridiem:
+        if not 1 <= hour <= 12:
+            raise ValueError(f"Invalid time {text!r}")
+        hour = hour % 12 + (12 if meridiem.upper() == 'PM' else 0)
+    elif hour > 23:
+        raise ValueError(f"Invalid time {text!r}")
+    days = int(match.group(4) or 0)
+    return days * MINUTES_PER_DAY + hour * 60 + minute
+
+def str_to_minutes(timestr):
+    """
+    Convert a string 'HH:MM' or 'HH:MM AM/PM' to minutes since midnight.
+    """
+    return parse_clock(timestr)
+
+def parse_deadline(deadline):
+    """
+    Convert a manifest deadline ('10:30 AM' or 'EOD') to minutes since
+    midnight, or None for end of day.
+    """
+    deadline = deadline.strip()
+    if deadline.upper() == 'EOD':
+        return None
+    return str_to_minutes(deadline)
+
+@lru_cache(maxsize=4096)
+def _format_minutes(minutes):
+    days, minutes = divmod(minutes, MINUTES_PER_DAY)
+    hour, minute = divmod(minutes, 60)
+    text = f"{hour % 12 or 12}:{minute:02d} {'PM' if hour >= 12 else 'AM'}"
+    return f"{text} +{days}" if days else text
+
+def minutes_to_str(minutes):
+    """
+    Format minutes since midnight as a string HH:MM AM/PM, with '+N' for
+    times N days after the first midnight. Fractional minutes are truncated.
+    """
+    return _format_minutes(int(minutes))
+
+def format_package_status(package):
+    """
+    Returns a string describing the status of a package, including delivery time if applicable.
+    package is expected to have attributes:
+    - id
+    - address
+    - deadline
+    - city
+    - zip_code
+    - weight
+    - status (package.PackageStatus)
+    - delivery_time (None or minutes since midnight)
+    """
+    status_str = f"Package {package.id} to {package.address} - Deadline: {package.deadline} - Status: {package.status}"
+    if package.delivery_time is not None:
+        status_str += f" at {minutes_to_str(package.delivery_time)}"
+    return status_str